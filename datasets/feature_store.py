@@ -0,0 +1,136 @@
+"""
+Persistent per-file feature cache for the participant recordings.
+
+Features are stored per (extractor name, extractor version) namespace, one
+.npy per source file keyed by the SHA-1 of the CSV's content:
+
+    datasets/.cache/features/<extractor>-<version>/<sha1>.npy
+
+A file is only re-extracted when its content changes or when the extractor's
+version string is bumped, so adding p26 costs one file's worth of feature
+extraction. Hashing reads the whole CSV, so hashes are memoised in
+hashes.json by path, size and mtime; an untouched file is never re-read.
+
+Bump the extractor's FEATURE_VERSION whenever its output changes.
+"""
+import hashlib
+import json
+import os
+import numpy as np
+import pandas as pd
+from mwl_loader import load_recordings, recording_files
+
+DATASETS_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURE_STORE_DIR = os.path.join(DATASETS_DIR, ".cache", "features")
+HASH_INDEX = "hashes.json"
+
+
+def content_hash(filepath, chunk_size=1 << 20):
+    digest = hashlib.sha1()
+    with open(filepath, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class FeatureStore:
+    """Feature vectors of one extractor version, keyed by source-file content hash."""
+
+    def __init__(self, extractor_name, version, store_dir=FEATURE_STORE_DIR):
+        self.store_dir = store_dir
+        self.folder = os.path.join(store_dir, f"{extractor_name}-{version}")
+        self._hash_index_path = os.path.join(store_dir, HASH_INDEX)
+        self._hashes = self._read_hash_index()
+        self._hashes_dirty = False
+
+    def _read_hash_index(self):
+        try:
+            with open(self._hash_index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def file_hash(self, filepath):
+        filepath = os.path.abspath(filepath)
+        st = os.stat(filepath)
+        known = self._hashes.get(filepath)
+        if known and known["size"] == st.st_size and known["mtime_ns"] == st.st_mtime_ns:
+            return known["sha1"]
+        sha1 = content_hash(filepath)
+        self._hashes[filepath] = {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha1": sha1}
+        self._hashes_dirty = True
+        return sha1
+
+    def _path(self, filepath):
+        return os.path.join(self.folder, f"{self.file_hash(filepath)}.npy")
+
+    def get(self, filepath):
+        path = self._path(filepath)
+        if not os.path.exists(path):
+            return None
+        try:
+            return np.load(path)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, filepath, features):
+        os.makedirs(self.folder, exist_ok=True)
+        path = self._path(filepath)
+        tmp = path + ".tmp.npy"
+        np.save(tmp, np.asarray(features, dtype=np.float64))
+        os.replace(tmp, path)
+
+    def flush(self):
+        """Persist newly computed file hashes."""
+        if not self._hashes_dirty:
+            return
+        os.makedirs(self.store_dir, exist_ok=True)
+        tmp = self._hash_index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self._hashes, f)
+        os.replace(tmp, self._hash_index_path)
+        self._hashes_dirty = False
+
+
+def load_features(high_path, low_path, extractor, version, name=None, participants=None,
+                  store_dir=FEATURE_STORE_DIR):
+    """
+    extractor(DataFrame) for every participant recording, via the feature store.
+
+    Returns (filename, label, features, cached) in load_recordings order.
+    Only files without stored features for this extractor version are loaded
+    and extracted; empty recordings are skipped as before.
+    """
+    store = FeatureStore(name or extractor.__name__, version, store_dir)
+    files = recording_files(high_path, low_path, participants)
+
+    features = {}
+    missing = set()
+    for filepath, _ in files:
+        stored = store.get(filepath)
+        if stored is None:
+            missing.add(os.path.basename(filepath))
+        else:
+            features[os.path.basename(filepath)] = (stored, True)
+
+    if missing:
+        wanted = sorted({int(f[1:-5]) for f in missing})
+        for filename, label, data in load_recordings(high_path, low_path, participants=wanted):
+            if filename not in missing:
+                continue
+            df = pd.DataFrame(data)
+            if df.empty:
+                continue
+            computed = np.asarray(extractor(df), dtype=np.float64)
+            folder = high_path if label == 1 else low_path
+            store.put(os.path.join(folder, filename), computed)
+            features[filename] = (computed, False)
+    store.flush()
+
+    results = []
+    for filepath, label in files:
+        filename = os.path.basename(filepath)
+        if filename in features:
+            vector, cached = features[filename]
+            results.append((filename, label, vector, cached))
+    return results
@@ -1,9 +1,9 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
@@ -14,60 +14,39 @@ from scipy.fft import fft
 import warnings
 warnings.filterwarnings('ignore')
 
+# Shared loader lives in datasets/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from feature_store import load_features
+from order_stats import sorted_percentile
+from model_eval import EvaluationCache, evaluate_parallel
+
 # Paths for GSR data
 high_path = "High_MWL"
 low_path = "Low_MWL"
 
+# Feature store namespace; bump FEATURE_VERSION whenever extract_gsr_features output changes
+FEATURE_SET = "gsr_advanced"
+FEATURE_VERSION = "1"
+
+# Machine-readable results of the last evaluate_models run
+EVAL_SUMMARY_PATH = "evaluation_summary.json"
+
 def load_and_prepare_data(high_path, low_path):
     """
     Load GSR data from High_MWL_GSR and Low_MWL_GSR folders and prepare features/labels
+    (p2h.csv to p25h.csv = High MWL, p2l.csv to p25l.csv = Low MWL).
+    Files are parsed in parallel and cached by the shared loader; features of
+    unchanged files come from the feature store instead of being recomputed.
     """
     X, y = [], []
     
-    # Load High MWL GSR files (p2h.csv to p25h.csv)
-    for i in range(2, 26):  # p2 to p25
-        filename = f"p{i}h.csv"
-        filepath = os.path.join(high_path, filename)
-        
-        if os.path.exists(filepath):
-            try:
-                # Read CSV, skip header rows if they contain text
-                df = pd.read_csv(filepath, header=None)
-                
-                # Remove non-numeric rows (like "Trial 3:3back,Trial 5:3back")
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                
-                if not df.empty:
-                    # For GSR data, we might want to use statistical features
-                    # instead of just flattening all data points
-                    features = extract_gsr_features(df)
-                    X.append(features)
-                    y.append(1)  # High MWL = 1
-                    print(f"Loaded High MWL GSR: {filename}, Features: {len(features)}")
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
-    
-    # Load Low MWL GSR files (p2l.csv to p25l.csv)
-    for i in range(2, 26):
-        filename = f"p{i}l.csv"
-        filepath = os.path.join(low_path, filename)
-        
-        if os.path.exists(filepath):
-            try:
-                # Read CSV, skip header rows if they contain text
-                df = pd.read_csv(filepath, header=None)
-                
-                # Remove non-numeric rows
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                
-                if not df.empty:
-                    # Extract statistical features for GSR data
-                    features = extract_gsr_features(df)
-                    X.append(features)
-                    y.append(0)  # Low MWL = 0
-                    print(f"Loaded Low MWL GSR: {filename}, Features: {len(features)}")
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
+    # For GSR data, we use statistical features instead of just flattening all data points
+    for filename, label, features, cached in load_features(high_path, low_path, extract_gsr_features,
+                                                           FEATURE_VERSION, name=FEATURE_SET):
+        X.append(features)
+        y.append(label)  # High MWL = 1, Low MWL = 0
+        source = "cached" if cached else "extracted"
+        print(f"Loaded {'High' if label == 1 else 'Low'} MWL GSR: {filename}, Features: {len(features)} ({source})")
     
     return np.array(X), np.array(y)
 
@@ -96,15 +75,17 @@ def extract_gsr_features(df):
             column_data = savgol_filter(column_data, window_length=5, polyorder=2)
         
         # --- Basic statistics ---
+        # One sort gives min, max, median and both quartiles
+        sorted_data = np.sort(column_data)
         col_features = [
             np.mean(column_data),
             np.std(column_data),
-            np.min(column_data),
-            np.max(column_data),
-            np.median(column_data),
-            np.percentile(column_data, 25),
-            np.percentile(column_data, 75),
-            np.ptp(column_data),  # range
+            sorted_data[0],
+            sorted_data[-1],
+            sorted_percentile(sorted_data, 50),
+            sorted_percentile(sorted_data, 25),
+            sorted_percentile(sorted_data, 75),
+            sorted_data[-1] - sorted_data[0],  # range
         ]
         
         # --- Temporal features ---
@@ -163,11 +144,6 @@ def evaluate_models(X, y):
         X, y, test_size=0.2, random_state=42, stratify=y
     )
     
-    # Scale the features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    
     # Define models to evaluate
     models = {
         'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000),
@@ -184,47 +160,26 @@ def evaluate_models(X, y):
         'Neural Network': MLPClassifier(random_state=42, max_iter=1000, hidden_layer_sizes=(100, 50))
     }
     
-    results = {}
-    
     print("Model Evaluation Results:")
     print("=" * 60)
     
-    for name, model in models.items():
-        try:
-            # Train and predict
-            if name in ['SVM', 'K-Nearest Neighbors', 'Neural Network', 'Logistic Regression']:
-                model.fit(X_train_scaled, y_train)
-                y_pred = model.predict(X_test_scaled)
-                
-                # Cross-validation with scaled data
-                cv_scores = cross_val_score(model, scaler.transform(X), y, cv=5)
-            else:
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-                
-                # Cross-validation
-                cv_scores = cross_val_score(model, X, y, cv=5)
-            
-            # Calculate metrics
-            accuracy = accuracy_score(y_test, y_pred)
-            mean_cv_score = cv_scores.mean()
-            std_cv_score = cv_scores.std()
-            
-            results[name] = {
-                'accuracy': accuracy,
-                'mean_cv_score': mean_cv_score,
-                'std_cv_score': std_cv_score,
-                'cv_scores': cv_scores,
-                'model': model  # Store the trained model temporarily
-            }
-            
-            print(f"\n{name}:")
-            print(f"  Test Accuracy: {accuracy:.4f}")
-            print(f"  Cross-validation: {mean_cv_score:.4f} (+/- {std_cv_score * 2:.4f})")
-            
-        except Exception as e:
-            print(f"\n{name} - Error: {e}")
-            results[name] = None
+    def report(name, result):
+        print(f"\n{name}:")
+        print(f"  Test Accuracy: {result['accuracy']:.4f}")
+        print(f"  Cross-validation: {result['mean_cv_score']:.4f} (+/- {result['std_cv_score'] * 2:.4f})")
+    
+    # Hold-out fits and CV folds of every model run in parallel; results print as each model finishes.
+    # Fitted results are cached on disk, so unchanged models are not retrained on the next run.
+    results, _ = evaluate_parallel(
+        models, X, y,
+        scaled=['SVM', 'K-Nearest Neighbors', 'Neural Network', 'Logistic Regression'],
+        cv=5,
+        on_result=report,
+        summary_path=EVAL_SUMMARY_PATH,
+        dataset="gsr",
+        cache=EvaluationCache(),
+        feature_set=f"{FEATURE_SET}-{FEATURE_VERSION}"
+    )
     
     return results, X_train, X_test, y_train, y_test, models
 
@@ -247,25 +202,9 @@ def print_detailed_results(results, X_test, y_test, models, X, y):
     print(f"\nBest Model: {best_model_name}")
     print(f"Best Accuracy: {best_result['accuracy']:.4f}")
     
-    # Print classification report for best model
-    best_model = models[best_model_name]
-    
-    # Create a new train/test split for consistency
-    X_train, X_test_new, y_train, y_test_new = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    
-    # Scale if needed
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test_new)
-    
-    if best_model_name in ['SVM', 'K-Nearest Neighbors', 'Neural Network', 'Logistic Regression']:
-        best_model.fit(X_train_scaled, y_train)
-        y_pred = best_model.predict(X_test_scaled)
-    else:
-        best_model.fit(X_train, y_train)
-        y_pred = best_model.predict(X_test_new)
+    # Hold-out predictions come from the evaluation run (or its cache); no refit needed
+    y_pred = best_result['y_pred']
+    y_test_new = best_result['y_test']
     
     print(f"\nClassification Report for {best_model_name}:")
     print(classification_report(y_test_new, y_pred, target_names=['Low MWL', 'High MWL']))
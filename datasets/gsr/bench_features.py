@@ -0,0 +1,166 @@
+# Benchmark: per-column extract_gsr_features (old) vs the single-sort versions
+# in trainRF.py and accuracy.py, on every participant file in High_MWL/Low_MWL.
+# Run from the datasets/gsr folder:  python bench_features.py [repeats]
+import glob
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.signal import find_peaks, savgol_filter
+from scipy.fft import fft
+import trainRF
+import accuracy
+
+
+# ---------------- Old per-column implementations (reference) ----------------
+def legacy_basic_features(df):
+    features = []
+    for col in df.columns:
+        column_data = df[col].dropna()
+        if len(column_data) > 0:
+            col_features = [
+                np.mean(column_data),
+                np.std(column_data),
+                np.min(column_data),
+                np.max(column_data),
+                np.median(column_data),
+                np.percentile(column_data, 25),
+                np.percentile(column_data, 75),
+                np.ptp(column_data),
+            ]
+            if len(column_data) > 1:
+                differences = np.diff(column_data)
+                col_features.extend([
+                    np.mean(np.abs(differences)),
+                    np.std(differences),
+                    np.max(np.abs(differences)),
+                ])
+            else:
+                col_features.extend([0, 0, 0])
+            features.extend(col_features)
+    if df.shape[1] > 1:
+        try:
+            correlation = df.corr().values[np.triu_indices(df.shape[1], k=1)]
+            features.extend(correlation)
+        except:
+            pass
+        column_means = df.mean()
+        if len(column_means) > 1:
+            mean_differences = [column_means[i] - column_means[j]
+                                for i in range(len(column_means))
+                                for j in range(i+1, len(column_means))]
+            features.extend(mean_differences)
+    return features
+
+
+def legacy_advanced_features(df):
+    features = []
+
+    # Process each column separately
+    for col in df.columns:
+        column_data = df[col].dropna().values
+
+        if len(column_data) == 0:
+            # Pad if empty
+            features.extend([0]*20)
+            continue
+
+        # --- Smooth signal to reduce noise ---
+        if len(column_data) >= 5:
+            column_data = savgol_filter(column_data, window_length=5, polyorder=2)
+
+        # --- Basic statistics ---
+        col_features = [
+            np.mean(column_data),
+            np.std(column_data),
+            np.min(column_data),
+            np.max(column_data),
+            np.median(column_data),
+            np.percentile(column_data, 25),
+            np.percentile(column_data, 75),
+            np.ptp(column_data),  # range
+        ]
+
+        # --- Temporal features ---
+        diffs = np.diff(column_data)
+        col_features.extend([
+            np.mean(np.abs(diffs)),
+            np.std(diffs),
+            np.max(np.abs(diffs)),
+            np.sqrt(np.mean(column_data**2)),  # RMS
+        ])
+
+        # --- Peak features (SCR) ---
+        peaks, properties = find_peaks(column_data, height=np.mean(column_data))
+        peak_heights = properties['peak_heights'] if 'peak_heights' in properties else []
+        col_features.extend([
+            len(peaks),  # number of peaks
+            np.mean(peak_heights) if len(peak_heights) > 0 else 0,
+            np.max(peak_heights) if len(peak_heights) > 0 else 0
+        ])
+
+        # --- Frequency domain features ---
+        fft_vals = np.abs(fft(column_data))[:len(column_data)//2]  # take half
+        # Take mean and max of FFT magnitudes
+        col_features.extend([
+            np.mean(fft_vals),
+            np.max(fft_vals)
+        ])
+
+        features.extend(col_features)
+
+    # --- Cross-column features ---
+    if df.shape[1] > 1:
+        # Correlation between columns
+        try:
+            correlation = df.corr().values[np.triu_indices(df.shape[1], k=1)]
+            features.extend(correlation)
+        except:
+            pass
+
+        # Mean differences between columns
+        column_means = df.mean()
+        if len(column_means) > 1:
+            mean_diffs = [column_means[i] - column_means[j]
+                          for i in range(len(column_means))
+                          for j in range(i+1, len(column_means))]
+            features.extend(mean_diffs)
+
+    return features
+
+
+def time_fn(fn, frames, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        out = [fn(df) for df in frames]
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def bit_identical(a, b):
+    a = np.asarray(a, dtype=float)
+    b = np.asarray(b, dtype=float)
+    return a.shape == b.shape and np.array_equal(a.view(np.int64), b.view(np.int64))
+
+
+if __name__ == "__main__":
+    repeats = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    files = sorted(glob.glob("High_MWL/*.csv") + glob.glob("Low_MWL/*.csv"))
+    frames = [pd.read_csv(f, header=None).apply(pd.to_numeric, errors='coerce').dropna() for f in files]
+    print(f"Files: {len(files)} ({len(files) // 2} participants x 2 conditions), rows each: {len(frames[0])}")
+
+    pairs = [
+        ("trainRF.extract_gsr_features", legacy_basic_features, trainRF.extract_gsr_features),
+        ("accuracy.extract_gsr_features", legacy_advanced_features, accuracy.extract_gsr_features),
+    ]
+    for name, old_fn, new_fn in pairs:
+        old_t, old_out = time_fn(old_fn, frames, repeats)
+        new_t, new_out = time_fn(new_fn, frames, repeats)
+        same = all(bit_identical(a, b) for a, b in zip(old_out, new_out))
+        print(f"\n{name}")
+        print(f"  per-column loop : {old_t * 1000:8.1f} ms")
+        print(f"  single sort     : {new_t * 1000:8.1f} ms")
+        print(f"  speed-up        : {old_t / new_t:8.2f}x")
+        print(f"  bit-identical   : {same}")
@@ -1,5 +1,5 @@
 import os
-import pandas as pd
+import sys
 import numpy as np
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.preprocessing import StandardScaler
@@ -9,38 +9,33 @@ import warnings
 import joblib
 warnings.filterwarnings('ignore')
 
+# Shared loader lives in datasets/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from feature_store import load_features
+from order_stats import sorted_percentile
+from windowing import windowed_dataset, group_holdout_split, group_cv
+
 # Paths for GSR data
 high_path = "High_MWL"
 low_path = "Low_MWL"
 
+# Windowed mode: GSR_WINDOW=256 GSR_HOP=128 python trainRF.py turns every recording into
+# many samples (extract_gsr_features per window) and splits by participant.
+# 0 keeps the original one-sample-per-recording behaviour.
+WINDOW = int(os.environ.get("GSR_WINDOW", 0))
+HOP = int(os.environ.get("GSR_HOP", 0)) or None
+
+# Feature store namespace; bump FEATURE_VERSION whenever extract_gsr_features output changes
+FEATURE_SET = "gsr_basic"
+FEATURE_VERSION = "1"
+
 def load_and_prepare_data(high_path, low_path):
     X, y = [], []
-    for i in range(2, 26):
-        filename = f"p{i}h.csv"
-        filepath = os.path.join(high_path, filename)
-        if os.path.exists(filepath):
-            try:
-                df = pd.read_csv(filepath, header=None)
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                if not df.empty:
-                    features = extract_gsr_features(df)
-                    X.append(features)
-                    y.append(1)
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
-    for i in range(2, 26):
-        filename = f"p{i}l.csv"
-        filepath = os.path.join(low_path, filename)
-        if os.path.exists(filepath):
-            try:
-                df = pd.read_csv(filepath, header=None)
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                if not df.empty:
-                    features = extract_gsr_features(df)
-                    X.append(features)
-                    y.append(0)
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
+    # Only new or changed recordings are re-extracted; the rest come from the feature store
+    for filename, label, features, _ in load_features(high_path, low_path, extract_gsr_features,
+                                                      FEATURE_VERSION, name=FEATURE_SET):
+        X.append(features)
+        y.append(label)
     return np.array(X), np.array(y)
 
 def extract_gsr_features(df):
@@ -48,15 +43,17 @@ def extract_gsr_features(df):
     for col in df.columns:
         column_data = df[col].dropna()
         if len(column_data) > 0:
+            # One sort gives min, max, median and both quartiles
+            sorted_data = np.sort(column_data.to_numpy())
             col_features = [
                 np.mean(column_data),
                 np.std(column_data),
-                np.min(column_data),
-                np.max(column_data),
-                np.median(column_data),
-                np.percentile(column_data, 25),
-                np.percentile(column_data, 75),
-                np.ptp(column_data),
+                sorted_data[0],
+                sorted_data[-1],
+                sorted_percentile(sorted_data, 50),
+                sorted_percentile(sorted_data, 25),
+                sorted_percentile(sorted_data, 75),
+                sorted_data[-1] - sorted_data[0],
             ]
             if len(column_data) > 1:
                 differences = np.diff(column_data)
@@ -82,10 +79,17 @@ def extract_gsr_features(df):
             features.extend(mean_differences)
     return features
 
-def evaluate_random_forest(X, y):
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+def evaluate_random_forest(X, y, groups=None):
+    if groups is None:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+        cv = 5
+    else:
+        # Windows of one participant must not end up on both sides of a split
+        train_idx, test_idx = group_holdout_split(groups)
+        X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+        cv = group_cv(groups)
 
     model = RandomForestClassifier(
         random_state=42,
@@ -100,7 +104,7 @@ def evaluate_random_forest(X, y):
     y_pred = model.predict(X_test)
 
     accuracy = accuracy_score(y_test, y_pred)
-    cv_scores = cross_val_score(model, X, y, cv=5)
+    cv_scores = cross_val_score(model, X, y, cv=cv)
     mean_cv_score = cv_scores.mean()
     std_cv_score = cv_scores.std()
 
@@ -140,8 +144,13 @@ def predict_random_samples(model, X, y, accuracy, n=5, show_all_features=False):
         print(f"  Prediction: {pred_label}  |  Model Accuracy: {accuracy * 100:.2f}%")
 
 if __name__ == "__main__":
-    print("Loading GSR data...")
-    X, y = load_and_prepare_data(high_path, low_path)
+    groups = None
+    if WINDOW:
+        print(f"Loading GSR data in {WINDOW}-sample windows (hop {HOP or WINDOW})...")
+        X, y, groups = windowed_dataset(high_path, low_path, WINDOW, HOP, featurizer="gsr")
+    else:
+        print("Loading GSR data...")
+        X, y = load_and_prepare_data(high_path, low_path)
     if len(X) == 0:
         print("No data loaded. Please check your file paths and data files.")
     else:
@@ -151,7 +160,7 @@ if __name__ == "__main__":
         print(f"Low MWL samples: {np.sum(y == 0)}")
         print(f"Feature dimension: {X.shape[1]}")
 
-        model, test_acc, cv_acc = evaluate_random_forest(X, y)
+        model, test_acc, cv_acc = evaluate_random_forest(X, y, groups)
         predict_random_samples(model, X, y, test_acc, n=5)
 
         # ---- Save trained model ----
@@ -1,9 +1,8 @@
 # accuracy_boost.py - HAPPY, SAD, ANGRY, NEUTRAL
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler, LabelEncoder
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.preprocessing import LabelEncoder
+from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier, AdaBoostClassifier
@@ -11,9 +10,18 @@ from sklearn.neighbors import KNeighborsClassifier
 from sklearn.neural_network import MLPClassifier
 from catboost import CatBoostClassifier
 from xgboost import XGBClassifier
+import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+# Shared evaluation runner lives in datasets/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from model_eval import EvaluationCache, evaluate_parallel
+
+# Machine-readable results of the last evaluate_models run
+EVAL_SUMMARY_PATH = "evaluation_summary3.json"
+
 # ==============================
 # Load and prepare the dataset
 # ==============================
@@ -45,14 +53,6 @@ def load_heart_rate_data(filepath, sample_size=57268):
 # Evaluate ML Models
 # ==============================
 def evaluate_models(X, y):
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-
     models = {
         'Logistic Regression': LogisticRegression(random_state=42, max_iter=1000),
         'SVM': SVC(kernel='linear', random_state=42, max_iter=10000),
@@ -72,40 +72,28 @@ def evaluate_models(X, y):
         )
     }
 
-    results = {}
     print("\nModel Evaluation Results:")
     print("=" * 60)
 
-    for name, model in models.items():
-        try:
-            # Scale features for certain models
-            if name in ['SVM', 'K-Nearest Neighbors', 'Neural Network', 'CatBoost', 'XGBoost']:
-                model.fit(X_train_scaled, y_train)
-                y_pred = model.predict(X_test_scaled)
-                cv_scores = cross_val_score(model, scaler.transform(X), y, cv=3)
-            else:
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-                cv_scores = cross_val_score(model, X, y, cv=3)
-
-            accuracy = accuracy_score(y_test, y_pred)
-            mean_cv = np.mean(cv_scores)
-            std_cv = np.std(cv_scores)
-
-            results[name] = {
-                'accuracy': accuracy,
-                'cv_mean': mean_cv,
-                'cv_std': std_cv,
-                'model': model
-            }
-
-            print(f"\n{name}:")
-            print(f"  Test Accuracy: {accuracy:.4f}")
-            print(f"  CV Mean: {mean_cv:.4f} (+/- {std_cv * 2:.4f})")
-
-        except Exception as e:
-            print(f"\n{name} - Error: {e}")
-            results[name] = None
+    def report(name, result):
+        result['cv_mean'] = result['mean_cv_score']
+        result['cv_std'] = result['std_cv_score']
+        print(f"\n{name}:")
+        print(f"  Test Accuracy: {result['accuracy']:.4f}")
+        print(f"  CV Mean: {result['cv_mean']:.4f} (+/- {result['cv_std'] * 2:.4f})")
+
+    # Hold-out fits and CV folds of every model run in parallel; results print as each model finishes.
+    # Fitted results are cached on disk, so unchanged models are not retrained on the next run.
+    results, scaler = evaluate_parallel(
+        models, X, y,
+        scaled=['SVM', 'K-Nearest Neighbors', 'Neural Network', 'CatBoost', 'XGBoost'],
+        cv=3,
+        on_result=report,
+        summary_path=EVAL_SUMMARY_PATH,
+        dataset="heartbeat",
+        cache=EvaluationCache(),
+        feature_set="heart_rate"
+    )
 
     return results, scaler
 
@@ -127,18 +115,9 @@ def print_best_model_report(results, X, y, scaler, label_encoder):
     print(f"\nBest Model: {best_model_name}")
     print(f"Best Test Accuracy: {best_result['accuracy']:.4f}")
 
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-
-    if best_model_name in ['SVM', 'K-Nearest Neighbors', 'Neural Network', 'CatBoost', 'XGBoost']:
-        best_model.fit(X_train_scaled, y_train)
-        y_pred = best_model.predict(X_test_scaled)
-    else:
-        best_model.fit(X_train, y_train)
-        y_pred = best_model.predict(X_test)
+    # Hold-out predictions come from the evaluation run (or its cache); no refit needed
+    y_pred = best_result['y_pred']
+    y_test = best_result['y_test']
 
     print("\nClassification Report:")
     print(classification_report(y_test, y_pred, target_names=label_encoder.classes_))
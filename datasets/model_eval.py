@@ -0,0 +1,268 @@
+"""
+Parallel model-zoo evaluation shared by the accuracy scripts.
+
+The old evaluate_models loops trained one model at a time: a hold-out fit,
+then cross_val_score refitting it k more times. Here every (model, hold-out)
+and (model, CV fold) pair is an independent task on a process pool. The same
+split and folds are used as before (train_test_split with the scripts' seed,
+cross_val_score's StratifiedKFold), so scores are unchanged.
+
+Oversubscription: with W workers on C cores each worker gets C // W threads.
+BLAS/OpenMP pools are capped with threadpoolctl in every worker, and models
+with their own threading (n_jobs, CatBoost thread_count) are set to the same
+budget. Configure with EVAL_WORKERS / EVAL_THREADS or the function arguments.
+
+Results are reported per model as soon as all of its tasks are done, and a
+JSON summary can be written for later comparison.
+
+EvaluationCache keeps each model's outcome on disk (hold-out model and
+predictions, fold scores and predictions, optionally the fold models) keyed
+by dataset, feature set, model name, model params, the data itself and the
+split settings. Re-running a script, the best-model report and the
+visualizations then read those results instead of refitting.
+"""
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import joblib
+import numpy as np
+import sklearn
+from sklearn.base import clone
+from sklearn.metrics import accuracy_score
+from sklearn.model_selection import check_cv, train_test_split
+from sklearn.preprocessing import StandardScaler
+from threadpoolctl import threadpool_limits
+
+# Per-process data, set once by _init_worker instead of pickled into every task
+_data = {}
+
+EVAL_CACHE_DIR = os.path.join(".cache", "evaluations")
+
+
+class EvaluationCache:
+    """Fitted results per (dataset, feature set, model, params, data, split), stored with joblib."""
+
+    def __init__(self, cache_dir=EVAL_CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    @staticmethod
+    def data_fingerprint(X, y):
+        digest = hashlib.sha1()
+        for array in (X, y):
+            array = np.ascontiguousarray(array)
+            digest.update(f"{array.dtype}{array.shape}".encode())
+            digest.update(array.tobytes())
+        return digest.hexdigest()
+
+    @staticmethod
+    def key(dataset, feature_set, name, model, data_fingerprint, split):
+        params = sorted((k, repr(v)) for k, v in model.get_params().items())
+        raw = repr((dataset, feature_set, name, type(model).__name__, params,
+                    data_fingerprint, split, sklearn.__version__))
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.joblib")
+
+    def get(self, key):
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return joblib.load(path)
+        except Exception:
+            return None
+
+    def put(self, key, result):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self._path(key) + ".tmp"
+        joblib.dump(result, tmp)
+        os.replace(tmp, self._path(key))
+
+
+def default_workers():
+    return int(os.environ.get("EVAL_WORKERS", 0)) or os.cpu_count() or 1
+
+
+def default_threads(workers):
+    return int(os.environ.get("EVAL_THREADS", 0)) or max(1, (os.cpu_count() or 1) // workers)
+
+
+def limit_model_threads(model, threads):
+    """Pin a model's own parallelism to the worker's thread budget."""
+    params = model.get_params()
+    for key in ("n_jobs", "nthread"):
+        if key in params:
+            model.set_params(**{key: threads})
+    if type(model).__name__.startswith("CatBoost"):
+        # Workers would otherwise all write training logs into the same catboost_info/
+        model.set_params(thread_count=threads, allow_writing_files=False)
+    return model
+
+
+def _init_worker(X, X_scaled, y, threads):
+    _data.update(X=X, X_scaled=X_scaled, y=y, threads=threads)
+    threadpool_limits(limits=threads)
+
+
+def _run_task(name, fold, model, scaled, train_idx, test_idx, keep_model):
+    """Fit one clone on train_idx and score it on test_idx; fold is None for the hold-out split."""
+    X = _data["X_scaled"] if scaled else _data["X"]
+    y = _data["y"]
+    model = limit_model_threads(clone(model), _data["threads"])
+    start = time.perf_counter()
+    model.fit(X[train_idx], y[train_idx])
+    y_pred = model.predict(X[test_idx])
+    return {
+        "fold": fold,
+        "score": accuracy_score(y[test_idx], y_pred),
+        "y_pred": y_pred,
+        "model": model if keep_model else None,
+        "seconds": time.perf_counter() - start
+    }
+
+
+def write_summary(path, results, errors, **meta):
+    summary = dict(meta)
+    summary["models"] = {}
+    for name, result in results.items():
+        if result is None:
+            summary["models"][name] = {"error": str(errors.get(name, "failed"))}
+            continue
+        summary["models"][name] = {
+            "accuracy": float(result["accuracy"]),
+            "mean_cv_score": float(result["mean_cv_score"]),
+            "std_cv_score": float(result["std_cv_score"]),
+            "cv_scores": [float(s) for s in result["cv_scores"]],
+            "fit_seconds": round(result["fit_seconds"], 3),
+            "cached": bool(result.get("cached"))
+        }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def evaluate_parallel(models, X, y, scaled=(), cv=5, test_size=0.2, random_state=42,
+                      workers=None, threads_per_worker=None, on_result=None,
+                      summary_path=None, dataset=None, cache=None, feature_set=None,
+                      keep_fold_models=False):
+    """
+    Hold-out accuracy and k-fold CV for every model in `models` (name -> estimator).
+
+    Models named in `scaled` see StandardScaler features (scaler fit on the
+    training split, as in the original scripts). on_result(name, result) is
+    called as each model finishes. Returns (results, scaler); results[name] is
+    None for models that failed, otherwise a dict with accuracy, cv_scores,
+    mean_cv_score, std_cv_score, the fitted hold-out model, its y_pred and
+    y_test on the test split, per-fold (test_idx, y_pred) in fold_predictions,
+    fold_models (None unless keep_fold_models) and fit_seconds.
+
+    With an EvaluationCache, models whose key is already stored are not
+    refitted (result["cached"] is True) and new results are stored.
+    """
+    X = np.asarray(X)
+    y = np.asarray(y)
+    train_idx, test_idx = train_test_split(np.arange(len(y)), test_size=test_size,
+                                           random_state=random_state, stratify=y)
+    scaler = StandardScaler().fit(X[train_idx])
+    X_scaled = scaler.transform(X) if scaled else None
+    folds = list(check_cv(cv, y, classifier=True).split(X, y))
+
+    results = {}
+    errors = {}
+    keys = {}
+    if cache is not None:
+        fingerprint = EvaluationCache.data_fingerprint(X, y)
+        for name, model in models.items():
+            split = (name in scaled, cv if isinstance(cv, int) else repr(cv), test_size, random_state)
+            keys[name] = EvaluationCache.key(dataset, feature_set, name, model, fingerprint, split)
+            cached = cache.get(keys[name])
+            if cached is not None and (cached["fold_models"] is not None or not keep_fold_models):
+                cached["cached"] = True
+                results[name] = cached
+                if on_result is not None:
+                    on_result(name, cached)
+
+    tasks = []
+    for name, model in models.items():
+        if name in results:
+            continue
+        tasks.append((name, None, model, name in scaled, train_idx, test_idx, True))
+        for k, (fold_train, fold_test) in enumerate(folds):
+            tasks.append((name, k, model, name in scaled, fold_train, fold_test, keep_fold_models))
+    workers = max(1, min(workers or default_workers(), len(tasks) or 1))
+    threads = threads_per_worker or default_threads(workers)
+
+    pending = {name: 1 + len(folds) for name in models}
+    partial = {name: {"cv_scores": np.zeros(len(folds)), "fit_seconds": 0.0,
+                      "fold_predictions": [None] * len(folds), "fold_models": [None] * len(folds)}
+               for name in models}
+
+    def collect(name, outcome):
+        if isinstance(outcome, Exception):
+            errors.setdefault(name, outcome)
+        else:
+            entry = partial[name]
+            entry["fit_seconds"] += outcome["seconds"]
+            if outcome["fold"] is None:
+                entry.update(accuracy=outcome["score"], model=outcome["model"], y_pred=outcome["y_pred"])
+            else:
+                k = outcome["fold"]
+                entry["cv_scores"][k] = outcome["score"]
+                entry["fold_predictions"][k] = (folds[k][1], outcome["y_pred"])
+                entry["fold_models"][k] = outcome["model"]
+        pending[name] -= 1
+        if pending[name]:
+            return
+        if name in errors:
+            print(f"\n{name} - Error: {errors[name]}")
+            results[name] = None
+            return
+        entry = partial[name]
+        results[name] = {
+            "accuracy": entry["accuracy"],
+            "mean_cv_score": entry["cv_scores"].mean(),
+            "std_cv_score": entry["cv_scores"].std(),
+            "cv_scores": entry["cv_scores"],
+            "model": entry["model"],
+            "y_pred": entry["y_pred"],
+            "y_test": y[test_idx],
+            "fold_predictions": entry["fold_predictions"],
+            "fold_models": entry["fold_models"] if keep_fold_models else None,
+            "fit_seconds": entry["fit_seconds"],
+            "cached": False
+        }
+        if cache is not None:
+            cache.put(keys[name], results[name])
+        if on_result is not None:
+            on_result(name, results[name])
+
+    start = time.perf_counter()
+    if tasks and workers == 1:
+        _data.update(X=X, X_scaled=X_scaled, y=y, threads=threads)
+        with threadpool_limits(limits=threads):
+            for task in tasks:
+                try:
+                    outcome = _run_task(*task)
+                except Exception as e:
+                    outcome = e
+                collect(task[0], outcome)
+    elif tasks:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(X, X_scaled, y, threads)) as pool:
+            futures = {pool.submit(_run_task, *task): task[0] for task in tasks}
+            for future in as_completed(futures):
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = e
+                collect(futures[future], outcome)
+    wall_seconds = time.perf_counter() - start
+
+    results = {name: results.get(name) for name in models}
+    if summary_path:
+        write_summary(summary_path, results, errors, dataset=dataset, n_samples=int(len(y)),
+                      n_features=int(X.shape[1]), cv=len(folds), workers=workers,
+                      threads_per_worker=threads, wall_seconds=round(wall_seconds, 3))
+    return results, scaler
@@ -0,0 +1,190 @@
+"""
+Shared loader for the High_MWL / Low_MWL participant recordings (GSR and PPG).
+
+Every pXX[h|l].csv has one text header row ("Trial 3:3back,Trial 5:3back")
+followed by ~76,800 numeric rows. Instead of reading everything as text and
+running pd.to_numeric over the whole frame, the header lines are skipped up
+front and the rest is parsed straight to float64. Parsing is spread over a
+process pool, and each parsed recording is cached as a column-major .npy
+(one contiguous block per trial column) in a .cache folder next to the CSV,
+keyed by the CSV's size and mtime. A second run only memory-loads the cache.
+"""
+import os
+import glob
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+PARTICIPANTS = range(2, 26)  # p2 to p25 as shipped; loaders discover files, so new ones are included
+CACHE_DIR_NAME = ".cache"
+
+
+def _count_header_lines(filepath, max_lines=10):
+    """Number of leading lines that are not purely numeric."""
+    count = 0
+    with open(filepath, encoding="utf-8", errors="replace") as f:
+        for line in f:
+            if count >= max_lines:
+                break
+            try:
+                [float(v) for v in line.strip().split(",") if v.strip()]
+                break
+            except ValueError:
+                count += 1
+    return count
+
+
+def parse_csv(filepath):
+    """
+    Parse one recording to a float64 array (rows x trial columns).
+    Same result as read_csv + apply(pd.to_numeric, errors='coerce') + dropna().
+    """
+    skip = _count_header_lines(filepath)
+    try:
+        data = pd.read_csv(filepath, header=None, skiprows=skip, dtype=np.float64, engine="c").to_numpy()
+    except ValueError:
+        # Stray text further down the file: fall back to the slow, forgiving path
+        df = pd.read_csv(filepath, header=None)
+        data = df.apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+    return data[~np.isnan(data).any(axis=1)]
+
+
+def _cache_path(filepath):
+    st = os.stat(filepath)
+    folder = os.path.join(os.path.dirname(filepath), CACHE_DIR_NAME)
+    name = os.path.basename(filepath)
+    return folder, name, os.path.join(folder, f"{name}.{st.st_size}.{st.st_mtime_ns}.npy")
+
+
+def read_cached(filepath):
+    """Cached array for filepath if the CSV is unchanged since it was cached, else None."""
+    _, _, path = _cache_path(filepath)
+    if os.path.exists(path):
+        try:
+            return np.load(path).T  # stored (columns, rows)
+        except (OSError, ValueError):
+            return None
+    return None
+
+
+def write_cache(filepath, data):
+    folder, name, path = _cache_path(filepath)
+    os.makedirs(folder, exist_ok=True)
+    for stale in glob.glob(os.path.join(folder, glob.escape(name) + ".*.npy")):
+        os.remove(stale)
+    tmp = path + ".tmp.npy"
+    np.save(tmp, np.ascontiguousarray(data.T))
+    os.replace(tmp, path)
+
+
+def read_recording(filepath, use_cache=True):
+    if use_cache:
+        data = read_cached(filepath)
+        if data is not None:
+            return data
+    data = parse_csv(filepath)
+    if use_cache:
+        write_cache(filepath, data)
+    return data
+
+
+def discover_participants(*folders):
+    """Participant numbers of every pN[h|l].csv in the given folders, in numeric order."""
+    found = set()
+    for folder in folders:
+        for path in glob.glob(os.path.join(folder, "p*.csv")):
+            stem = os.path.basename(path)[1:-5]
+            if stem.isdigit():
+                found.add(int(stem))
+    return sorted(found)
+
+
+def recording_files(high_path, low_path, participants=None):
+    """
+    (filepath, label) for every existing file, High MWL (1) first, then Low MWL (0).
+    participants=None takes every pN file present, so a new p26 is picked up
+    without code changes.
+    """
+    if participants is None:
+        participants = discover_participants(high_path, low_path)
+    files = []
+    for folder, suffix, label in ((high_path, "h", 1), (low_path, "l", 0)):
+        for i in participants:
+            filepath = os.path.join(folder, f"p{i}{suffix}.csv")
+            if os.path.exists(filepath):
+                files.append((filepath, label))
+    return files
+
+
+def _from_store(files):
+    """Zero-copy views from the memmap signal store if it holds every file unchanged, else None."""
+    from signal_store import SignalStore  # signal_store builds on this module
+    store = SignalStore.open_if_built()
+    if store is None:
+        return None
+    results = []
+    for filepath, label in files:
+        filepath = os.path.abspath(filepath)
+        signal = os.path.basename(os.path.dirname(os.path.dirname(filepath)))
+        name = os.path.basename(filepath)
+        key = (signal, int(name[1:-5]), "high" if label == 1 else "low")
+        if store.source_path(*key) != filepath or not store.is_current(*key):
+            return None
+        results.append((name, label, store.recording(*key)))
+    return results
+
+
+def load_recordings(high_path, low_path, participants=None, workers=None, use_cache=True,
+                    use_store=True):
+    """
+    Load every participant recording.
+
+    Returns a list of (filename, label, data) in the same order the old
+    per-script loops used (p2h..p25h, then p2l..p25l); data is a float64
+    array of shape (rows, trial columns). If the memmap signal store
+    (signal_store.py) is built and current, data are read-only views into
+    it; otherwise files come from the .npy cache or are parsed. Files that
+    fail to parse are reported and skipped.
+    """
+    files = recording_files(high_path, low_path, participants)
+    if use_store and files:
+        stored = _from_store(files)
+        if stored is not None:
+            return stored
+
+    arrays = {}
+    missing = []
+    for filepath, _ in files:
+        data = read_cached(filepath) if use_cache else None
+        if data is None:
+            missing.append(filepath)
+        else:
+            arrays[filepath] = data
+
+    if missing:
+        if len(missing) == 1 or workers == 1:
+            parsed = []
+            for filepath in missing:
+                try:
+                    parsed.append(parse_csv(filepath))
+                except Exception as e:
+                    parsed.append(e)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(parse_csv, filepath) for filepath in missing]
+                parsed = []
+                for future in futures:
+                    try:
+                        parsed.append(future.result())
+                    except Exception as e:
+                        parsed.append(e)
+        for filepath, data in zip(missing, parsed):
+            if isinstance(data, Exception):
+                print(f"Error loading {filepath}: {data}")
+                continue
+            if use_cache:
+                write_cache(filepath, data)
+            arrays[filepath] = data
+
+    return [(os.path.basename(filepath), label, arrays[filepath])
+            for filepath, label in files if filepath in arrays]
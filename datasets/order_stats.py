@@ -0,0 +1,35 @@
+"""
+Percentiles of data that is already sorted, shared by the GSR feature code
+(trainRF.py, accuracy.py, windowing.py) and the server's streaming features.
+
+One sort gives min, max, median and both quartiles; sorted_percentile then
+reads the quartiles with numpy's own index and interpolation arithmetic, so
+results are bit-identical to np.percentile(method="linear") and, for q=50,
+to np.median.
+"""
+import math
+import numpy as np
+
+
+def sorted_percentile(sorted_values, q, axis=None):
+    """
+    q-th percentile of sorted data. axis=None reads a 1-D sequence by index
+    (a list, an array or anything with len() and [i]); otherwise every slice
+    of an array sorted along `axis` is reduced.
+    """
+    if axis is None:
+        n = len(sorted_values)
+        at = sorted_values.__getitem__
+    else:
+        n = sorted_values.shape[axis]
+        at = lambda i: np.take(sorted_values, i, axis=axis)
+    if q == 50:
+        mid = n // 2
+        return at(mid) if n % 2 else (at(mid - 1) + at(mid)) / 2
+    idx = (n - 1) * (q / 100)
+    lo = int(math.floor(idx))
+    hi = min(lo + 1, n - 1)
+    t = idx - lo
+    a, b = at(lo), at(hi)
+    diff_b_a = b - a
+    return b - diff_b_a * (1 - t) if t >= 0.5 else a + diff_b_a * t
@@ -1,9 +1,9 @@
 import os
+import sys
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split, cross_val_score
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
+from sklearn.model_selection import train_test_split
+from sklearn.metrics import classification_report, confusion_matrix
 from sklearn.linear_model import LogisticRegression
 from sklearn.svm import SVC
 from sklearn.ensemble import RandomForestClassifier, GradientBoostingClassifier
@@ -12,57 +12,47 @@ from sklearn.neural_network import MLPClassifier
 import warnings
 warnings.filterwarnings('ignore')
 
+# Shared loader lives in datasets/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mwl_loader import load_recordings
+from model_eval import EvaluationCache, evaluate_parallel
+from feature_store import load_features
+from ppg_features import extract_ppg_features
+
 # Paths
 high_path = "High_MWL"
 low_path = "Low_MWL"
 
-def load_and_prepare_data(high_path, low_path):
+# Machine-readable results of the last evaluate_models run
+EVAL_SUMMARY_PATH = "evaluation_summary.json"
+
+# PPG_REPRESENTATION=compact uses ppg_features.py (heart rate, IBI, HRV, spectrum and pulse
+# morphology: 18 values per trial) instead of every raw sample flattened (153,600 per recording).
+REPRESENTATION = os.environ.get("PPG_REPRESENTATION", "flat")
+# Feature store namespace; bump FEATURE_VERSION whenever extract_ppg_features output changes
+FEATURE_SET = "ppg_compact"
+FEATURE_VERSION = "1"
+
+def load_and_prepare_data(high_path, low_path, representation=REPRESENTATION):
     """
     Load data from High_MWL and Low_MWL folders and prepare features/labels
+    (flattened samples, or the compact ppg_features vector for "compact")
     """
     X, y = [], []
     
-    # Load High MWL files (p2h.csv to p25h.csv)
-    for i in range(2, 26):  # p2 to p25
-        filename = f"p{i}h.csv"
-        filepath = os.path.join(high_path, filename)
-        
-        if os.path.exists(filepath):
-            try:
-                # Read CSV, skip header rows if they contain text
-                df = pd.read_csv(filepath, header=None)
-                
-                # Remove non-numeric rows (like "Trial 3:3back,Trial 5:3back")
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                
-                if not df.empty:
-                    # Flatten the data to create features
-                    features = df.values.flatten()
-                    X.append(features)
-                    y.append(1)  # High MWL = 1
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
-    
-    # Load Low MWL files (p2l.csv to p25l.csv)
-    for i in range(2, 26):
-        filename = f"p{i}l.csv"
-        filepath = os.path.join(low_path, filename)
-        
-        if os.path.exists(filepath):
-            try:
-                # Read CSV, skip header rows if they contain text
-                df = pd.read_csv(filepath, header=None)
-                
-                # Remove non-numeric rows
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                
-                if not df.empty:
-                    # Flatten the data to create features
-                    features = df.values.flatten()
-                    X.append(features)
-                    y.append(0)  # Low MWL = 0
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
+    if representation == "compact":
+        for filename, label, features, _ in load_features(high_path, low_path, extract_ppg_features,
+                                                          FEATURE_VERSION, name=FEATURE_SET):
+            X.append(features)
+            y.append(label)
+        return np.array(X), np.array(y)
+    
+    for filename, label, data in load_recordings(high_path, low_path):
+        if data.size:
+            # Flatten the data to create features
+            features = data.flatten()
+            X.append(features)
+            y.append(label)  # High MWL = 1, Low MWL = 0
     
     return np.array(X), np.array(y)
 
@@ -75,11 +65,6 @@ def evaluate_models(X, y):
         X, y, test_size=0.2, random_state=42, stratify=y
     )
     
-    # Scale the features
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test)
-    
     # Define models to evaluate
     models = {
         'Logistic Regression': LogisticRegression(random_state=42),
@@ -100,47 +85,26 @@ def evaluate_models(X, y):
         'Neural Network': MLPClassifier(random_state=42, max_iter=1000)
     }
     
-    results = {}
-    
     print("Model Evaluation Results:")
     print("=" * 60)
     
-    for name, model in models.items():
-        try:
-            # Train and predict
-            if name in ['SVM', 'K-Nearest Neighbors', 'Neural Network']:
-                model.fit(X_train_scaled, y_train)
-                y_pred = model.predict(X_test_scaled)
-                
-                # Cross-validation with scaled data
-                cv_scores = cross_val_score(model, scaler.transform(X), y, cv=5)
-            else:
-                model.fit(X_train, y_train)
-                y_pred = model.predict(X_test)
-                
-                # Cross-validation
-                cv_scores = cross_val_score(model, X, y, cv=5)
-            
-            # Calculate metrics
-            accuracy = accuracy_score(y_test, y_pred)
-            mean_cv_score = cv_scores.mean()
-            std_cv_score = cv_scores.std()
-            
-            results[name] = {
-                'accuracy': accuracy,
-                'mean_cv_score': mean_cv_score,
-                'std_cv_score': std_cv_score,
-                'cv_scores': cv_scores,
-                'model': model  # Store the trained model temporarily
-            }
-            
-            print(f"\n{name}:")
-            print(f"  Test Accuracy: {accuracy:.4f}")
-            print(f"  Cross-validation: {mean_cv_score:.4f} (+/- {std_cv_score * 2:.4f})")
-            
-        except Exception as e:
-            print(f"\n{name} - Error: {e}")
-            results[name] = None
+    def report(name, result):
+        print(f"\n{name}:")
+        print(f"  Test Accuracy: {result['accuracy']:.4f}")
+        print(f"  Cross-validation: {result['mean_cv_score']:.4f} (+/- {result['std_cv_score'] * 2:.4f})")
+    
+    # Hold-out fits and CV folds of every model run in parallel; results print as each model finishes.
+    # Fitted results are cached on disk, so unchanged models are not retrained on the next run.
+    results, _ = evaluate_parallel(
+        models, X, y,
+        scaled=['SVM', 'K-Nearest Neighbors', 'Neural Network'],
+        cv=5,
+        on_result=report,
+        summary_path=EVAL_SUMMARY_PATH,
+        dataset="ppg",
+        cache=EvaluationCache(),
+        feature_set=f"{FEATURE_SET}-{FEATURE_VERSION}" if REPRESENTATION == "compact" else "flattened"
+    )
     
     return results, X_train, X_test, y_train, y_test, models
 
@@ -163,25 +127,9 @@ def print_detailed_results(results, X_test, y_test, models, X, y):
     print(f"\nBest Model: {best_model_name}")
     print(f"Best Accuracy: {best_result['accuracy']:.4f}")
     
-    # Print classification report for best model
-    best_model = models[best_model_name]
-    
-    # Create a new train/test split for consistency
-    X_train, X_test_new, y_train, y_test_new = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
-    
-    # Scale if needed
-    scaler = StandardScaler()
-    X_train_scaled = scaler.fit_transform(X_train)
-    X_test_scaled = scaler.transform(X_test_new)
-    
-    if best_model_name in ['SVM', 'K-Nearest Neighbors', 'Neural Network']:
-        best_model.fit(X_train_scaled, y_train)
-        y_pred = best_model.predict(X_test_scaled)
-    else:
-        best_model.fit(X_train, y_train)
-        y_pred = best_model.predict(X_test_new)
+    # Hold-out predictions come from the evaluation run (or its cache); no refit needed
+    y_pred = best_result['y_pred']
+    y_test_new = best_result['y_test']
     
     print(f"\nClassification Report for {best_model_name}:")
     print(classification_report(y_test_new, y_pred, target_names=['Low MWL', 'High MWL']))
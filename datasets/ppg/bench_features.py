@@ -0,0 +1,67 @@
+# Benchmark: flattened raw samples vs compact ppg_features vectors for the PPG
+# Random Forest (trainRf.py settings): feature extraction, training plus 5-fold
+# CV time, pickled model size and accuracy, on every participant file.
+# Run from the datasets/ppg folder:  python bench_features.py
+import io
+import contextlib
+import pickle
+import time
+import numpy as np
+from sklearn.base import clone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.model_selection import cross_val_score, train_test_split
+import trainRf
+
+MODEL = RandomForestClassifier(
+    random_state=42,
+    n_estimators=200,
+    max_depth=None,
+    min_samples_split=2,
+    min_samples_leaf=1,
+    bootstrap=True
+)
+
+
+def load(representation):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        X, y = trainRf.load_and_prepare_data(trainRf.high_path, trainRf.low_path, representation)
+    return X, y, time.perf_counter() - start
+
+
+def train_and_score(X, y):
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42, stratify=y)
+    model = clone(MODEL)
+    start = time.perf_counter()
+    model.fit(X_train, y_train)
+    fit_t = time.perf_counter() - start
+    accuracy = model.score(X_test, y_test)
+
+    start = time.perf_counter()
+    cv_scores = cross_val_score(clone(MODEL), X, y, cv=5)
+    cv_t = time.perf_counter() - start
+    return {
+        "fit_s": fit_t,
+        "cv_s": cv_t,
+        "model_kb": len(pickle.dumps(model)) / 1024,
+        "accuracy": accuracy,
+        "cv_mean": cv_scores.mean()
+    }
+
+
+if __name__ == "__main__":
+    rows = {}
+    for representation in ("flat", "compact"):
+        X, y, load_t = load(representation)
+        stats = train_and_score(X, y)
+        stats.update(load_s=load_t, features=X.shape[1], x_mb=X.nbytes / 1e6)
+        rows[representation] = stats
+
+    print(f"Samples: {len(y)} (High {np.sum(y == 1)}, Low {np.sum(y == 0)})\n")
+    print(f"{'':<22} {'flat':>12} {'compact':>12} {'ratio':>8}")
+    for key, label in (("features", "features / sample"), ("x_mb", "X size (MB)"), ("load_s", "load + extract (s)"),
+                       ("fit_s", "fit (s)"), ("cv_s", "5-fold CV (s)"), ("model_kb", "model pickle (KB)"),
+                       ("accuracy", "test accuracy"), ("cv_mean", "CV mean")):
+        flat, compact = rows["flat"][key], rows["compact"][key]
+        ratio = f"{flat / compact:7.1f}x" if key not in ("accuracy", "cv_mean") and compact else ""
+        print(f"{label:<22} {flat:>12.3f} {compact:>12.3f} {ratio:>8}")
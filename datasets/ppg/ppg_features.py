@@ -0,0 +1,141 @@
+"""
+Compact PPG features: a recording becomes a short, fixed-length vector
+instead of 153,600 raw samples.
+
+Per trial column (PPG sampled at 256 Hz, the rate the dominant ~1.2 Hz
+pulse peak implies):
+
+    heart rate      mean HR, std HR, beat count
+    inter-beat      mean IBI, SDNN, RMSSD, pNN50
+    HRV spectrum    LF power, HF power, LF/HF (IBI series resampled at 4 Hz)
+    signal spectrum dominant pulse frequency, cardiac-band (0.5-4 Hz) share
+                    of total power
+    morphology      pulse amplitude mean/std, rise time mean/std
+    level           raw mean, raw std
+
+Columns are concatenated, so two trials give 2 x 18 features.
+"""
+import numpy as np
+from scipy.integrate import trapezoid
+from scipy.interpolate import interp1d
+from scipy.signal import butter, find_peaks, sosfiltfilt, welch
+
+FS = 256  # Hz
+FEATURE_NAMES = [
+    "hr_mean", "hr_std", "beats",
+    "ibi_mean", "sdnn", "rmssd", "pnn50",
+    "lf_power", "hf_power", "lf_hf",
+    "pulse_freq", "cardiac_power_ratio",
+    "amp_mean", "amp_std", "rise_mean", "rise_std",
+    "raw_mean", "raw_std"
+]
+MIN_SECONDS = 2        # shorter traces have no measurable beats: column_features returns zeros
+MIN_IBI_S = 60 / 200   # 200 bpm
+MAX_IBI_S = 60 / 35    # 35 bpm
+TACHOGRAM_FS = 4.0
+
+_bandpass = butter(3, [0.5, 8.0], btype="bandpass", fs=FS, output="sos")
+
+
+def _band_power(freqs, power, lo, hi):
+    band = (freqs >= lo) & (freqs < hi)
+    return float(trapezoid(power[band], freqs[band])) if band.sum() > 1 else 0.0
+
+
+def _hrv_spectrum(beat_times, ibi):
+    # Evenly resampled tachogram -> Welch PSD -> LF / HF power
+    if len(ibi) < 8 or beat_times[-1] - beat_times[0] < 30:
+        return 0.0, 0.0, 0.0
+    grid = np.arange(beat_times[0], beat_times[-1], 1 / TACHOGRAM_FS)
+    tachogram = interp1d(beat_times, ibi, kind="linear")(grid)
+    freqs, power = welch(tachogram - tachogram.mean(), fs=TACHOGRAM_FS, nperseg=min(256, len(grid)))
+    lf = _band_power(freqs, power, 0.04, 0.15)
+    hf = _band_power(freqs, power, 0.15, 0.40)
+    return lf, hf, lf / hf if hf > 0 else 0.0
+
+
+def detect_beats(signal, fs=FS):
+    """
+    Band-pass filter a PPG trace (at least MIN_SECONDS, not flat) and find its
+    systolic peaks. Returns (filtered, peaks, ibi, beat_times): inter-beat
+    intervals outside MIN_IBI_S..MAX_IBI_S are dropped, beat_times (s) are
+    the peaks that close each kept interval.
+    """
+    filtered = sosfiltfilt(_bandpass, signal)
+    # Systolic peaks: at most one per MIN_IBI_S, prominent relative to the signal spread
+    peaks, _ = find_peaks(filtered, distance=int(MIN_IBI_S * fs), prominence=0.3 * filtered.std())
+    ibi_all = np.diff(peaks) / fs
+    valid = (ibi_all >= MIN_IBI_S) & (ibi_all <= MAX_IBI_S)
+    return filtered, peaks, ibi_all[valid], peaks[1:][valid] / fs
+
+
+def column_features(signal, fs=FS):
+    """The 18 features of one PPG trace."""
+    signal = np.asarray(signal, dtype=np.float64)
+    raw_mean, raw_std = float(signal.mean()), float(signal.std())
+    if len(signal) < fs * MIN_SECONDS or raw_std == 0:
+        return [0.0] * 16 + [raw_mean, raw_std]
+
+    filtered, peaks, ibi, beat_times = detect_beats(signal, fs)
+
+    freqs, power = welch(filtered, fs=fs, nperseg=min(len(filtered), fs * 8))
+    cardiac = (freqs >= 0.5) & (freqs <= 4.0)
+    pulse_freq = float(freqs[cardiac][power[cardiac].argmax()]) if cardiac.any() else 0.0
+    total = power.sum()
+    cardiac_ratio = float(power[cardiac].sum() / total) if total > 0 else 0.0
+
+    if len(ibi) >= 2:
+        hr = 60 / ibi
+        successive = np.diff(ibi)
+        hr_feats = [float(hr.mean()), float(hr.std()), float(len(peaks))]
+        ibi_feats = [float(ibi.mean()), float(ibi.std() * 1000),
+                     float(np.sqrt(np.mean(successive ** 2)) * 1000),
+                     float(np.mean(np.abs(successive) > 0.05))]
+        lf, hf, lf_hf = _hrv_spectrum(beat_times, ibi)
+    else:
+        hr_feats = [0.0, 0.0, float(len(peaks))]
+        ibi_feats = [0.0] * 4
+        lf = hf = lf_hf = 0.0
+
+    # Morphology: trough before each peak -> pulse amplitude and rise time
+    amplitudes, rise_times = [], []
+    for prev, peak in zip(peaks[:-1], peaks[1:]):
+        trough = prev + int(np.argmin(filtered[prev:peak]))
+        amplitudes.append(filtered[peak] - filtered[trough])
+        rise_times.append((peak - trough) / fs)
+    if amplitudes:
+        morph = [float(np.mean(amplitudes)), float(np.std(amplitudes)),
+                 float(np.mean(rise_times)), float(np.std(rise_times))]
+    else:
+        morph = [0.0] * 4
+
+    return hr_feats + ibi_feats + [lf, hf, lf_hf, pulse_freq, cardiac_ratio] + morph + [raw_mean, raw_std]
+
+
+def extract_ppg_features(df, fs=FS):
+    """Compact feature vector for one recording (DataFrame or array, one trial per column)."""
+    values = df.to_numpy(dtype=np.float64) if hasattr(df, "to_numpy") else np.asarray(df, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    features = []
+    for col in range(values.shape[1]):
+        column = values[:, col]
+        features.extend(column_features(column[~np.isnan(column)], fs))
+    return features
+
+
+def feature_names(n_columns):
+    return [f"trial{c + 1}_{name}" for c in range(n_columns) for name in FEATURE_NAMES]
+
+
+def window_ppg_features(windows, fs=FS):
+    """
+    extract_ppg_features for each (window, columns) slice of a windowing.sliding_windows view.
+    Raises ValueError for windows shorter than MIN_SECONDS, whose features would all be zero.
+    """
+    if windows.shape[1] < fs * MIN_SECONDS:
+        raise ValueError(f"Compact PPG features need windows of at least {fs * MIN_SECONDS} samples "
+                         f"({MIN_SECONDS} s at {fs} Hz), got {windows.shape[1]}")
+    if len(windows) == 0:
+        return np.empty((0, len(FEATURE_NAMES) * windows.shape[2]))
+    return np.array([extract_ppg_features(window, fs) for window in windows], dtype=np.float64)
@@ -1,5 +1,6 @@
+import json
 import os
-import pandas as pd
+import sys
 import numpy as np
 from sklearn.model_selection import train_test_split, cross_val_score
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
@@ -9,61 +10,88 @@ import joblib
 
 warnings.filterwarnings('ignore')
 
+# Shared loader lives in datasets/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from mwl_loader import load_recordings
+from windowing import windowed_dataset, group_holdout_split, group_cv
+from feature_store import load_features
+from ppg_features import FS, FEATURE_NAMES, MIN_SECONDS, extract_ppg_features, window_ppg_features
+
 # Paths for PPG data
 high_path = "High_MWL"
 low_path = "Low_MWL"
 
+# Windowed mode: PPG_WINDOW=7680 PPG_HOP=3840 python trainRf.py turns every recording into
+# many samples (one flattened or compact vector per 30 s window) and splits by participant.
+# Compact windows need at least 2 s (512 samples) to find beats, and 30 s for the HRV
+# spectrum (LF/HF). 0 keeps the original one-sample-per-recording behaviour.
+WINDOW = int(os.environ.get("PPG_WINDOW", 0))
+HOP = int(os.environ.get("PPG_HOP", 0)) or None
+
+# PPG_REPRESENTATION=compact uses ppg_features.py (heart rate, IBI, HRV, spectrum and pulse
+# morphology: 18 values per trial) instead of every raw sample flattened (153,600 per recording).
+REPRESENTATION = os.environ.get("PPG_REPRESENTATION", "flat")
+# Feature store namespace; bump FEATURE_VERSION whenever extract_ppg_features output changes
+FEATURE_SET = "ppg_compact"
+FEATURE_VERSION = "1"
+
+
+def model_path(window=WINDOW, representation=REPRESENTATION):
+    """
+    File a trained variant is saved to. Only the flat whole-recording model is
+    best_ppg_model.pkl, the file the servers load as the "ppg" model; the others
+    are served through a models.json entry (see servers/registry.py).
+    """
+    name = "best_ppg"
+    if representation == "compact":
+        name += "_compact"
+    if window:
+        name += f"_window{window}"
+    return f"{name}_model.pkl"
+
 
-def load_and_prepare_data(high_path, low_path):
+def load_and_prepare_data(high_path, low_path, representation=REPRESENTATION):
     """
     Load PPG data from High_MWL and Low_MWL folders and prepare features/labels.
-    Each CSV is flattened into a 1D feature vector.
+    Each CSV is flattened into a 1D feature vector, or reduced to the compact
+    ppg_features vector when representation is "compact".
     """
     X, y = [], []
 
-    # Load High MWL PPG files (p2h.csv to p25h.csv)
-    for i in range(2, 26):
-        filename = f"p{i}h.csv"
-        filepath = os.path.join(high_path, filename)
-        if os.path.exists(filepath):
-            try:
-                df = pd.read_csv(filepath, header=None)
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                if not df.empty:
-                    # Flatten the signal data into a feature vector
-                    features = df.values.flatten()
-                    X.append(features)
-                    y.append(1)  # High MWL = 1
-                    print(f"Loaded High MWL PPG: {filename}, Features: {len(features)}")
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
-
-    # Load Low MWL PPG files (p2l.csv to p25l.csv)
-    for i in range(2, 26):
-        filename = f"p{i}l.csv"
-        filepath = os.path.join(low_path, filename)
-        if os.path.exists(filepath):
-            try:
-                df = pd.read_csv(filepath, header=None)
-                df = df.apply(pd.to_numeric, errors='coerce').dropna()
-                if not df.empty:
-                    features = df.values.flatten()
-                    X.append(features)
-                    y.append(0)  # Low MWL = 0
-                    print(f"Loaded Low MWL PPG: {filename}, Features: {len(features)}")
-            except Exception as e:
-                print(f"Error loading {filepath}: {e}")
+    if representation == "compact":
+        for filename, label, features, cached in load_features(high_path, low_path, extract_ppg_features,
+                                                               FEATURE_VERSION, name=FEATURE_SET):
+            X.append(features)
+            y.append(label)
+            source = "cached" if cached else "extracted"
+            print(f"Loaded {'High' if label == 1 else 'Low'} MWL PPG: {filename}, Features: {len(features)} ({source})")
+        return np.array(X), np.array(y)
+
+    for filename, label, data in load_recordings(high_path, low_path):
+        if data.size:
+            # Flatten the signal data into a feature vector
+            features = data.flatten()
+            X.append(features)
+            y.append(label)  # High MWL = 1, Low MWL = 0
+            print(f"Loaded {'High' if label == 1 else 'Low'} MWL PPG: {filename}, Features: {len(features)}")
 
     return np.array(X), np.array(y)
 
 
-def evaluate_random_forest(X, y):
+def evaluate_random_forest(X, y, groups=None):
     """
     Train and evaluate a Random Forest model on the PPG dataset.
     """
-    X_train, X_test, y_train, y_test = train_test_split(
-        X, y, test_size=0.2, random_state=42, stratify=y
-    )
+    if groups is None:
+        X_train, X_test, y_train, y_test = train_test_split(
+            X, y, test_size=0.2, random_state=42, stratify=y
+        )
+        cv = 5
+    else:
+        # Windows of one participant must not end up on both sides of a split
+        train_idx, test_idx = group_holdout_split(groups)
+        X_train, X_test, y_train, y_test = X[train_idx], X[test_idx], y[train_idx], y[test_idx]
+        cv = group_cv(groups)
 
     model = RandomForestClassifier(
         random_state=42,
@@ -78,7 +106,7 @@ def evaluate_random_forest(X, y):
     y_pred = model.predict(X_test)
 
     accuracy = accuracy_score(y_test, y_pred)
-    cv_scores = cross_val_score(model, X, y, cv=5)
+    cv_scores = cross_val_score(model, X, y, cv=cv)
     mean_cv_score = cv_scores.mean()
     std_cv_score = cv_scores.std()
 
@@ -123,8 +151,17 @@ def predict_random_samples(model, X, y, accuracy, n=5, show_all_features=False):
 
 
 if __name__ == "__main__":
-    print("Loading PPG data...")
-    X, y = load_and_prepare_data(high_path, low_path)
+    groups = None
+    if WINDOW and REPRESENTATION == "compact" and WINDOW < FS * MIN_SECONDS:
+        raise SystemExit(f"PPG_WINDOW={WINDOW} is too short for compact features "
+                         f"(minimum {FS * MIN_SECONDS} samples); the features would all be zero.")
+    if WINDOW:
+        print(f"Loading PPG data in {WINDOW}-sample windows (hop {HOP or WINDOW})...")
+        featurizer = window_ppg_features if REPRESENTATION == "compact" else "raw"
+        X, y, groups = windowed_dataset(high_path, low_path, WINDOW, HOP, featurizer=featurizer)
+    else:
+        print("Loading PPG data...")
+        X, y = load_and_prepare_data(high_path, low_path)
 
     if len(X) == 0:
         print("No data loaded. Please check your file paths and data files.")
@@ -137,10 +174,17 @@ if __name__ == "__main__":
         print(f"Low MWL samples: {np.sum(y == 0)}")
         print(f"Feature dimension: {X.shape[1]}")
 
-        model, test_acc, cv_acc = evaluate_random_forest(X, y)
+        model, test_acc, cv_acc = evaluate_random_forest(X, y, groups)
         predict_random_samples(model, X, y, test_acc, n=5)
 
         # ---- Save trained model ----
-        joblib.dump(model, "best_ppg_model.pkl")
+        path = model_path()
+        joblib.dump(model, path)
         print(f"\n✅ Saved Random Forest model")
-        print("File saved: best_ppg_model.pkl")
+        print(f"File saved: {path}")
+        if REPRESENTATION == "compact" or WINDOW:
+            entry = {"kind": "ppg_compact" if REPRESENTATION == "compact" else "ppg",
+                     "model": f"../datasets/ppg/{path}"}
+            if REPRESENTATION == "compact" and WINDOW:
+                entry["recording_samples"] = WINDOW * (X.shape[1] // len(FEATURE_NAMES))
+            print(f"Serve it with a models.json entry: {json.dumps(entry)}")
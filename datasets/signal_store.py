@@ -0,0 +1,163 @@
+"""
+Memory-mapped binary store for every GSR and PPG participant recording.
+
+All recordings are packed into one flat float64 file (signals.f64). Each
+recording is written column after column, so one trial column is a
+contiguous run and a whole recording is a contiguous (columns x rows) block.
+index.json lists every trial column with signal, participant, condition,
+label, trial name, column, offset and length, plus the source CSV's size
+and mtime so stale entries can be detected, and the data file's own size and
+mtime. Both files are written under temporary names and the index replaces
+the old one last, so an interrupted build leaves either the previous store
+or an index that no longer matches the data file; a mismatched store is
+never read.
+
+Readers open the data file with np.memmap and slice it without copying or
+parsing; pages are only read from disk when touched.
+
+Build (run from the datasets/ folder):
+    python signal_store.py
+"""
+import json
+import os
+import numpy as np
+from mwl_loader import load_recordings
+
+DATASETS_DIR = os.path.dirname(os.path.abspath(__file__))
+STORE_DIR = os.path.join(DATASETS_DIR, "signal_store")
+DATA_FILE = "signals.f64"
+INDEX_FILE = "index.json"
+SIGNALS = ("gsr", "ppg")
+
+
+def _trial_names(filepath):
+    with open(filepath, encoding="utf-8", errors="replace") as f:
+        return [name.strip() for name in f.readline().strip().split(",")]
+
+
+def build_store(store_dir=STORE_DIR, signals=SIGNALS):
+    """Pack every participant recording of every signal into one memmap-able file."""
+    os.makedirs(store_dir, exist_ok=True)
+    entries = []
+    offset = 0
+    tmp_path = os.path.join(store_dir, DATA_FILE + ".tmp")
+    tmp_index = os.path.join(store_dir, INDEX_FILE + ".tmp")
+
+    with open(tmp_path, "wb") as out:
+        for signal in signals:
+            high_path = os.path.join(DATASETS_DIR, signal, "High_MWL")
+            low_path = os.path.join(DATASETS_DIR, signal, "Low_MWL")
+            for filename, label, data in load_recordings(high_path, low_path, use_store=False):
+                filepath = os.path.join(high_path if label == 1 else low_path, filename)
+                st = os.stat(filepath)
+                names = _trial_names(filepath)
+                columns = np.ascontiguousarray(data.T, dtype=np.float64)
+                out.write(columns.tobytes())
+                for col, values in enumerate(columns):
+                    entries.append({
+                        "signal": signal,
+                        "participant": int(filename[1:-5]),
+                        "condition": "high" if label == 1 else "low",
+                        "label": label,
+                        "file": os.path.relpath(filepath, DATASETS_DIR).replace(os.sep, "/"),
+                        "source_size": st.st_size,
+                        "source_mtime_ns": st.st_mtime_ns,
+                        "column": col,
+                        "trial": names[col] if col < len(names) else f"column {col}",
+                        "offset": offset,
+                        "length": len(values)
+                    })
+                    offset += len(values)
+
+        out.flush()
+        os.fsync(out.fileno())
+
+    st = os.stat(tmp_path)  # os.replace keeps size and mtime
+    with open(tmp_index, "w", encoding="utf-8") as f:
+        json.dump({"dtype": "float64", "total_length": offset, "data_size": st.st_size,
+                   "data_mtime_ns": st.st_mtime_ns, "entries": entries}, f, indent=1)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(store_dir, DATA_FILE))
+    os.replace(tmp_index, os.path.join(store_dir, INDEX_FILE))
+    return len(entries), offset
+
+
+class SignalStore:
+    """Zero-copy reader over a store written by build_store()."""
+
+    def __init__(self, store_dir=STORE_DIR):
+        with open(os.path.join(store_dir, INDEX_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        self.entries = meta["entries"]
+        data_path = os.path.join(store_dir, DATA_FILE)
+        try:
+            st = os.stat(data_path)
+            self.consistent = (st.st_size == meta.get("data_size")
+                               and st.st_mtime_ns == meta.get("data_mtime_ns"))
+        except OSError:
+            self.consistent = False
+        # An index left over from an interrupted build does not describe the data file
+        self.data = np.memmap(data_path, dtype=meta["dtype"], mode="r",
+                              shape=(meta["total_length"],)) if self.consistent else None
+        self._recordings = {}
+        for entry in self.entries:
+            key = (entry["signal"], entry["participant"], entry["condition"])
+            self._recordings.setdefault(key, []).append(entry)
+
+    @classmethod
+    def open_if_built(cls, store_dir=STORE_DIR):
+        if os.path.exists(os.path.join(store_dir, INDEX_FILE)):
+            store = cls(store_dir)
+            if store.consistent:
+                return store
+        return None
+
+    def trial(self, signal, participant, condition, column):
+        """One trial column as a 1-D read-only view."""
+        entry = self._recordings[(signal, participant, condition)][column]
+        return self.data[entry["offset"]:entry["offset"] + entry["length"]]
+
+    def recording(self, signal, participant, condition):
+        """Whole recording as a (rows, columns) read-only view, no copy."""
+        columns = self._recordings[(signal, participant, condition)]
+        start, length = columns[0]["offset"], columns[0]["length"]
+        block = self.data[start:start + length * len(columns)]
+        return block.reshape(len(columns), length).T
+
+    def source_path(self, signal, participant, condition):
+        """Absolute path of the CSV a recording was built from, or None if it is not stored."""
+        columns = self._recordings.get((signal, participant, condition))
+        if not columns:
+            return None
+        return os.path.abspath(os.path.join(DATASETS_DIR, columns[0]["file"]))
+
+    def is_current(self, signal, participant, condition):
+        """True if the store is intact and the source CSV has not changed since it was built."""
+        if not self.consistent:
+            return False
+        entry = self._recordings[(signal, participant, condition)][0]
+        try:
+            st = os.stat(self.source_path(signal, participant, condition))
+        except OSError:
+            return False
+        return st.st_size == entry["source_size"] and st.st_mtime_ns == entry["source_mtime_ns"]
+
+    def recordings(self, signal):
+        """(filename, label, data) for one signal, same order as mwl_loader.load_recordings."""
+        keys = sorted((k for k in self._recordings if k[0] == signal),
+                      key=lambda k: (k[2] != "high", k[1]))
+        for _, participant, condition in keys:
+            suffix = "h" if condition == "high" else "l"
+            yield (f"p{participant}{suffix}.csv", 1 if condition == "high" else 0,
+                   self.recording(signal, participant, condition))
+
+    def has_current(self, signal):
+        keys = [k for k in self._recordings if k[0] == signal]
+        return bool(keys) and all(self.is_current(*k) for k in keys)
+
+
+if __name__ == "__main__":
+    n_columns, n_values = build_store()
+    size_mb = n_values * 8 / 1e6
+    print(f"✅ Packed {n_columns} trial columns ({n_values:,} samples, {size_mb:.1f} MB) into {STORE_DIR}")
@@ -0,0 +1,137 @@
+"""
+Windowed feature extraction: many training samples per participant recording.
+
+Each recording (rows x trial columns) is cut into fixed-length windows with a
+configurable hop. Windows are strided views (sliding_window_view), never
+copies of the recording; featurizers reduce them a chunk of windows at a
+time, so memory stays bounded by the chunk size however long the recording.
+
+Featurizers map a (n_windows, window, columns) view to a feature matrix:
+
+    gsr   the extract_gsr_features layout (11 stats per column, pairwise
+          correlations, pairwise mean differences), vectorized over windows.
+          With window=256 this is exactly what the server's streaming
+          features (MWL_WINDOW) feed the model.
+    raw   each window's samples flattened, i.e. the PPG scripts' flattened
+          representation applied per window.
+
+windowed_dataset() also returns the participant of every row so train/test
+splits and CV folds can keep a participant's windows together
+(group_holdout_split / group_cv); random splits would leak near-identical
+overlapping windows between train and test.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from sklearn.model_selection import GroupKFold, GroupShuffleSplit
+from mwl_loader import load_recordings
+from order_stats import sorted_percentile
+
+CHUNK_WINDOWS = 1024  # windows materialised at once by a featurizer
+
+
+def sliding_windows(data, window, hop=None):
+    """(n_windows, window, columns) read-only view of a (rows, columns) recording."""
+    data = np.asarray(data)
+    if data.ndim == 1:
+        data = data[:, None]
+    hop = hop or window
+    if len(data) < window:
+        return np.empty((0, window, data.shape[1]), dtype=data.dtype)
+    return sliding_window_view(data, window, axis=0)[::hop].transpose(0, 2, 1)
+
+
+def _gsr_chunk(windows):
+    # (n, window, columns) -> contiguous (n, columns, window): every reduction runs along the last axis
+    values = np.ascontiguousarray(windows.transpose(0, 2, 1), dtype=np.float64)
+    n, columns, length = values.shape
+    means = values.mean(axis=-1)
+    stds = values.std(axis=-1)
+    sorted_values = np.sort(values, axis=-1)
+    stats = [
+        means,
+        stds,
+        sorted_values[..., 0],
+        sorted_values[..., -1],
+        sorted_percentile(sorted_values, 50, axis=-1),
+        sorted_percentile(sorted_values, 25, axis=-1),
+        sorted_percentile(sorted_values, 75, axis=-1),
+        sorted_values[..., -1] - sorted_values[..., 0],
+    ]
+    if length > 1:
+        differences = np.diff(values, axis=-1)
+        abs_diffs = np.abs(differences)
+        stats.extend([abs_diffs.mean(axis=-1), differences.std(axis=-1), abs_diffs.max(axis=-1)])
+    else:
+        stats.extend([np.zeros((n, columns))] * 3)
+    features = [np.stack(stats, axis=-1).reshape(n, columns * len(stats))]
+
+    if columns > 1:
+        i, j = np.triu_indices(columns, k=1)
+        centred = values - means[..., None]
+        cov = np.einsum("nkw,nkw->nk", centred[:, i], centred[:, j]) / length
+        denom = stds[:, i] * stds[:, j]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            corr = np.where(denom > 0, cov / denom, np.nan)
+        features.extend([corr, means[:, i] - means[:, j]])
+    return np.hstack(features)
+
+
+def window_gsr_features(windows, chunk=CHUNK_WINDOWS):
+    """extract_gsr_features for every window; NaN correlations (flat windows) become 0 as on the server."""
+    if len(windows) == 0:
+        return np.empty((0, 0))
+    parts = [_gsr_chunk(windows[start:start + chunk]) for start in range(0, len(windows), chunk)]
+    return np.nan_to_num(np.vstack(parts))
+
+
+def window_raw_features(windows, chunk=CHUNK_WINDOWS):
+    """Each window's samples flattened row by row, like data.flatten() on a whole recording."""
+    # Reshaping the strided view copies it in one go; fill the output a chunk at a time instead
+    features = np.empty((len(windows), windows.shape[1] * windows.shape[2]), dtype=windows.dtype)
+    for start in range(0, len(windows), chunk):
+        part = windows[start:start + chunk]
+        features[start:start + len(part)] = part.reshape(len(part), -1)
+    return features
+
+
+FEATURIZERS = {
+    "gsr": window_gsr_features,
+    "raw": window_raw_features
+}
+
+
+def participant_of(filename):
+    return int(filename[1:-5])
+
+
+def windowed_dataset(high_path, low_path, window, hop=None, featurizer="gsr", participants=None):
+    """
+    One feature matrix per recording, stacked: returns X, y, groups.
+
+    groups[i] is the participant number of row i; a participant's High and
+    Low recordings share a group.
+    """
+    featurize = FEATURIZERS[featurizer] if isinstance(featurizer, str) else featurizer
+    X, y, groups = [], [], []
+    for filename, label, data in load_recordings(high_path, low_path, participants=participants):
+        features = featurize(sliding_windows(data, window, hop))
+        if len(features) == 0:
+            continue
+        X.append(features)
+        y.append(np.full(len(features), label))
+        groups.append(np.full(len(features), participant_of(filename)))
+    if not X:
+        return np.empty((0, 0)), np.empty(0, dtype=int), np.empty(0, dtype=int)
+    return np.vstack(X), np.concatenate(y), np.concatenate(groups)
+
+
+def group_holdout_split(groups, test_size=0.2, random_state=42):
+    """(train_idx, test_idx) with every participant entirely on one side."""
+    splitter = GroupShuffleSplit(n_splits=1, test_size=test_size, random_state=random_state)
+    return next(splitter.split(np.zeros(len(groups)), groups=groups))
+
+
+def group_cv(groups, n_splits=5):
+    """CV folds that never split a participant across train and test."""
+    n_splits = min(n_splits, len(np.unique(groups)))
+    return list(GroupKFold(n_splits=n_splits).split(np.zeros(len(groups)), groups=groups))
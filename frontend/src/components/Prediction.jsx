@@ -1,4 +1,4 @@
-import React, { useEffect, useState } from "react";
+import React, { useEffect, useRef, useState } from "react";
 import { doc, getDoc, updateDoc } from "firebase/firestore";
 import { db } from "../firebase";
 
@@ -7,7 +7,18 @@ const Prediction = () => {
   const [edaAverage, setEdaAverage] = useState(null);
   const [error, setError] = useState(null);
 
+  const lastAverageUpdate = useRef(0);
+
   const ELDERLY_DOC_ID = "pbMm29stjBct5TxxK0bQ";
+  const SERVER_URL = "http://localhost:5000";
+  // Live results. Use an endpoint that sees every reading:
+  //   - `python main.py` or `python async_server.py`: SERVER_URL/stream
+  //   - gunicorn (several workers): the async server's /stream, e.g.
+  //     VITE_STREAM_URL=http://localhost:5001/stream for ASYNC_PORT=5001, with
+  //     STATE_BACKEND=manager on both so it relays every worker's results.
+  //     A gunicorn worker's own /stream holds one request thread per dashboard.
+  const STREAM_URL = import.meta.env.VITE_STREAM_URL || `${SERVER_URL}/stream`;
+  const AVERAGE_INTERVAL_MS = 5000; // same cadence as the old /latest polling
 
   const updateEdaAverage = async (gsrValue) => {
     try {
@@ -28,28 +39,33 @@ const Prediction = () => {
     }
   };
 
-  const fetchLatestData = async () => {
-    try {
-      const response = await fetch("http://localhost:5000/latest");
-      if (!response.ok) throw new Error("No data available yet.");
-      const jsonData = await response.json();
-      setData(jsonData);
+  // Each event carries only the keys that changed (e.g. gsr_value, emotion, mwl)
+  const handleReading = (event) => {
+    const update = JSON.parse(event.data);
+    setData((prev) => ({ ...prev, ...update }));
+    setError(null);
 
-      await updateEdaAverage(jsonData.gsr_value);
-    } catch (err) {
-      setError(err.message);
+    const now = Date.now();
+    if (update.gsr_value != null && now - lastAverageUpdate.current >= AVERAGE_INTERVAL_MS) {
+      lastAverageUpdate.current = now;
+      updateEdaAverage(update.gsr_value);
     }
   };
 
   useEffect(() => {
-    fetchLatestData();
-    const interval = setInterval(fetchLatestData, 5000);
-    return () => clearInterval(interval);
+    // Pushed by the server (STREAM_URL); EventSource reconnects on its own
+    const source = new EventSource(STREAM_URL);
+    source.addEventListener("reading", handleReading);
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED)
+        setError("Lost connection to the server.");
+    };
+    return () => source.close();
   }, []);
 
   if (error)
     return <p className="text-red-500 text-center mt-10">Error: {error}</p>;
-  if (!data)
+  if (!data || !data.emotion)
     return (
       <p className="text-gray-500 text-center mt-10">
         Loading latest GSR data...
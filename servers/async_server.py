@@ -0,0 +1,427 @@
+"""
+Asyncio ingestion API (aiohttp) for large device fleets.
+
+The Flask server spends one request thread per connection. Here a single
+event loop holds every connection (keep-alive HTTP or one WebSocket per
+device) and does the cheap I/O: JSON parsing, the per-device MWL feature
+window, responses, n8n forwarding. The CPU-bound sklearn work goes to a
+bounded executor (INGEST_EXECUTOR=thread or process, INGEST_WORKERS
+slots). It goes through AsyncBatcher, which coalesces concurrent readings
+into one predict_readings call, just like MicroBatcher does for Flask. While
+every slot is busy, new readings pile up into the next, larger batch. Once
+INGEST_MAX_PENDING readings are queued or in flight, new ones get 429 with
+Retry-After.
+
+The per-device state (feature windows, latest results, history) is touched
+on a small dedicated thread pool (ASYNC_STATE_WORKERS threads): with
+STATE_BACKEND=manager every update and /latest is a socket round trip to
+the shared store, which must not stall the event loop.
+
+The models, feature windows and n8n forwarder are main.py's. Run from the
+servers/ folder:
+    python async_server.py
+"""
+import asyncio
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from aiohttp import web, WSMsgType
+from main import (registry, n8n_forwarder, predict_readings, update_window_features, broadcaster, feed_relay,
+                  publish_result, record_readings, latest_for, READY_MODELS, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS,
+                  SSE_KEEPALIVE_S, shutdown, start_draining, shutting_down)
+from broadcast import sse_frame, CLOSED
+from server_log import get_logger, logging_stats
+from metrics import metrics, StageTimer, REQUESTS, REQUEST_ERRORS, REQUEST_SECONDS, CONTENT_TYPE
+from profiler import PROFILING_ENABLED, PROFILE_SECONDS, PROFILE_INTERVAL_MS, profile_to_file, install_signal_handler
+
+ASYNC_HOST = os.environ.get("ASYNC_HOST", "0.0.0.0")
+ASYNC_PORT = int(os.environ.get("ASYNC_PORT", 5000))
+INGEST_EXECUTOR = os.environ.get("INGEST_EXECUTOR", "thread")  # "thread" or "process"
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_MAX_PENDING = int(os.environ.get("INGEST_MAX_PENDING", 1000))
+ASYNC_STATE_WORKERS = int(os.environ.get("ASYNC_STATE_WORKERS", 4))
+RETRY_AFTER_S = 1
+
+log = get_logger("async")
+
+
+class Overloaded(Exception):
+    """Raised by AsyncBatcher.submit when max_pending readings are already waiting."""
+
+
+def predict_in_worker(readings):
+    # Runs in the executor; forked process workers pick up manifest changes themselves
+    registry.maybe_reload()
+    return predict_readings(readings)
+
+
+class AsyncBatcher:
+    """
+    asyncio counterpart of MicroBatcher. submit() awaits its own future; the
+    run() task collects up to max_batch_size items (or max_wait_ms) per batch
+    and dispatches each batch to the executor, at most `slots` at a time.
+    """
+
+    def __init__(self, predict_fn, executor, slots, max_batch_size=32, max_wait_ms=5.0, max_pending=1000):
+        self.predict_fn = predict_fn
+        self.executor = executor
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.max_pending = int(max_pending)
+        self.slots = asyncio.Semaphore(max(1, int(slots)))
+        self.queue = asyncio.Queue()
+        self.pending = 0
+        self._tasks = set()
+
+        # ---------- Metrics ----------
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.max_seen_batch_size = 0
+        self.failed_batches = 0
+        self.failed_items = 0
+
+    async def submit(self, item):
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise Overloaded()
+        self.pending += 1
+        future = asyncio.get_running_loop().create_future()
+        self.queue.put_nowait((item, future))
+        try:
+            return await future
+        finally:
+            self.pending -= 1
+
+    async def run(self):
+        while True:
+            await self.slots.acquire()
+            try:
+                batch = await self._collect()
+            except BaseException:
+                self.slots.release()
+                raise
+            task = asyncio.create_task(self._dispatch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _dispatch(self, batch):
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                results = list(await loop.run_in_executor(self.executor, self.predict_fn, [item for item, _ in batch]))
+                if len(results) != len(batch):
+                    raise ValueError(f"{len(results)} results for {len(batch)} readings")
+            except Exception:
+                # Retry one at a time (still within this slot) so a bad reading fails only its own request
+                self.failed_batches += 1
+                for item, future in batch:
+                    try:
+                        result = (await loop.run_in_executor(self.executor, self.predict_fn, [item]))[0]
+                    except Exception as e:
+                        self.failed_items += 1
+                        if not future.done():
+                            future.set_exception(e)
+                    else:
+                        if not future.done():
+                            future.set_result(result)
+            else:
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+        finally:
+            self.slots.release()
+            self.batches += 1
+            self.items += len(batch)
+            self.max_seen_batch_size = max(self.max_seen_batch_size, len(batch))
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "max_pending": self.max_pending,
+            "pending": self.pending,
+            "in_flight_batches": len(self._tasks),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "max_seen_batch_size": self.max_seen_batch_size,
+            "rejected": self.rejected,
+            "failed_batches": self.failed_batches,
+            "failed_items": self.failed_items
+        }
+
+
+def make_executor(kind=INGEST_EXECUTOR, workers=INGEST_WORKERS):
+    if kind == "process":
+        # Forked workers inherit the loaded (gc-frozen) registry instead of unpickling it again
+        return ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("fork"))
+    return ThreadPoolExecutor(workers, thread_name_prefix="inference")
+
+
+# ---------------- Readings ----------------
+def parse_reading(data):
+    """(gsr_value, device_id, timestamp) or raises ValueError."""
+    if not isinstance(data, dict) or 'gsr_value' not in data:
+        raise ValueError("Invalid or missing data")
+    try:
+        gsr_value = float(data['gsr_value'])
+    except (TypeError, ValueError):
+        raise ValueError("gsr_value must be numeric")
+    if not math.isfinite(gsr_value):
+        raise ValueError("gsr_value must be a finite number")
+    timestamp = data.get('timestamp') or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return gsr_value, data.get('device_id', 'default'), timestamp
+
+
+async def ingest(app, data, endpoint="/data"):
+    """Predict one reading; returns the response body. Raises ValueError / Overloaded."""
+    stages = StageTimer(endpoint)
+    gsr_value, device_id, timestamp = parse_reading(data)
+    stages.mark("parse")
+    loop = asyncio.get_running_loop()
+    window_features = await loop.run_in_executor(app["state_executor"], update_window_features, device_id, data)
+    stages.mark("features")
+    emotion_result, mwl_result = await app["batcher"].submit((gsr_value, timestamp, window_features))
+    stages.mark("inference")
+
+    reading = {"gsr_value": gsr_value, "emotion": emotion_result, "mwl": mwl_result}
+    await loop.run_in_executor(app["state_executor"], record_readings, [(device_id, reading)])
+    result = {"device_id": device_id, **reading}
+    stages.mark("record")
+
+    # ---------- Fan-out (queued, non-blocking) ----------
+    if not n8n_forwarder.send({
+        "device_id": device_id,
+        "timestamp": timestamp,
+        "gsr_value": gsr_value,
+        "emotion_prediction": emotion_result["prediction"],
+        "emotion_confidence": emotion_result["confidence"],
+        "mwl_prediction": mwl_result["prediction"],
+        "mwl_confidence": mwl_result["confidence"]
+    }):
+        log.warning("n8n queue full, payload spooled/dropped", extra={"data": {"device_id": device_id}})
+    stages.mark("forward")
+    publish_result(device_id, result)
+    for listener in app["listeners"]:
+        task = asyncio.create_task(listener(device_id, result))
+        app["notify_tasks"].add(task)
+        task.add_done_callback(app["notify_tasks"].discard)
+    stages.mark("publish")
+    return result
+
+
+def add_listener(app, listener):
+    """Register `async def listener(device_id, result)`; each new result is delivered as its own task."""
+    app["listeners"].append(listener)
+
+
+def error(message, status):
+    headers = {"Retry-After": str(RETRY_AFTER_S)} if status == 429 else None
+    return web.json_response({"status": "error", "message": message}, status=status, headers=headers)
+
+
+# ---------------- Routes ----------------
+async def post_data(request):
+    try:
+        data = await request.json()
+        return web.json_response(await ingest(request.app, data))
+    except json.JSONDecodeError:
+        return error("Invalid JSON", 400)
+    except ValueError as e:
+        return error(str(e), 400)
+    except Overloaded:
+        return error("Inference queue full, retry later", 429)
+    except Exception as e:
+        log.exception("Server error", extra={"data": {"path": request.path}})
+        return error(str(e), 500)
+
+
+async def device_socket(request):
+    """
+    One long-lived connection per device: each text message is a reading
+    ({"gsr_value": 1.2}); each reply is its result or an error with "status".
+    """
+    ws = web.WebSocketResponse(heartbeat=30)
+    await ws.prepare(request)
+    device_id = request.query.get("device")
+    async for msg in ws:
+        if msg.type != WSMsgType.TEXT:
+            continue
+        try:
+            data = json.loads(msg.data)
+            if device_id and isinstance(data, dict):
+                data.setdefault("device_id", device_id)
+            await ws.send_json(await ingest(request.app, data, "/ws"))
+        except (json.JSONDecodeError, ValueError) as e:
+            await ws.send_json({"status": "error", "code": 400, "message": str(e)})
+        except Overloaded:
+            await ws.send_json({"status": "error", "code": 429, "message": "Inference queue full, retry later",
+                                "retry_after": RETRY_AFTER_S})
+        except ConnectionResetError:
+            break
+        except Exception as e:
+            # Keep the device connected; only this reading failed
+            log.exception("Server error", extra={"data": {"path": request.path, "device_id": device_id}})
+            await ws.send_json({"status": "error", "code": 500, "message": str(e)})
+    return ws
+
+
+async def stream(request):
+    """Server-sent events, as main.py's /stream; a parked coroutine per idle viewer."""
+    device_id = request.query.get("device")
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream", "Cache-Control": "no-cache",
+                                           "X-Accel-Buffering": "no"})
+    await response.prepare(request)
+    if feed_relay is not None:
+        feed_relay.ensure_running()
+    subscription = broadcaster.subscribe_async(device_id)
+    try:
+        await response.write(b"retry: 3000\n\n")
+        snapshot = await asyncio.get_running_loop().run_in_executor(request.app["state_executor"], latest_for,
+                                                                     device_id)
+        if snapshot is not None:
+            await response.write(sse_frame(snapshot, "reading"))
+        while True:
+            frame = await subscription.get(SSE_KEEPALIVE_S)
+            if frame is CLOSED:
+                break  # too slow; the client reconnects
+            await response.write(frame if frame is not None else b": keepalive\n\n")
+    except ConnectionResetError:
+        pass
+    finally:
+        broadcaster.unsubscribe(subscription)
+    return response
+
+
+async def get_latest(request):
+    result = await asyncio.get_running_loop().run_in_executor(request.app["state_executor"], latest_for,
+                                                              request.query.get("device"))
+    if result is None:
+        return error("No data yet", 404)
+    return web.json_response(result)
+
+
+async def get_ready(request):
+    missing = [name for name in READY_MODELS if registry.get(name) is None]
+    if missing or shutting_down.is_set():
+        return web.json_response({"status": "not ready", "missing_models": missing,
+                                  "shutting_down": shutting_down.is_set()}, status=503)
+    return web.json_response({"status": "ready", "pid": os.getpid()})
+
+
+async def get_ingest_metrics(request):
+    return web.json_response({"executor": INGEST_EXECUTOR, "workers": INGEST_WORKERS,
+                              **request.app["batcher"].stats(), "n8n": n8n_forwarder.stats(),
+                              "logging": logging_stats()})
+
+
+async def get_metrics(request):
+    return web.Response(text=metrics.render(), headers={"Content-Type": CONTENT_TYPE})
+
+
+async def sample_profile(request):
+    """As main.py's /admin/profile; the sampler runs on its own thread so the loop keeps serving."""
+    try:
+        seconds = float(request.query.get("seconds", PROFILE_SECONDS))
+        interval_ms = float(request.query.get("interval_ms", PROFILE_INTERVAL_MS))
+    except ValueError:
+        return error("seconds and interval_ms must be numeric", 400)
+    try:
+        result = await asyncio.get_running_loop().run_in_executor(
+            None, profile_to_file, seconds, interval_ms, request.query.get("idle", "1") != "0")
+    except RuntimeError as e:
+        return error(str(e), 409)
+    return web.json_response({"status": "success", "pid": os.getpid(), **result})
+
+
+@web.middleware
+async def count_requests(request, handler):
+    endpoint = request.match_info.route.resource.canonical if request.match_info.route.resource else "unmatched"
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await handler(request)
+        status = response.status
+        return response
+    except web.HTTPException as e:
+        status = e.status
+        raise
+    finally:
+        REQUESTS.inc(endpoint=endpoint, method=request.method, status=status)
+        if status >= 500:
+            REQUEST_ERRORS.inc(endpoint=endpoint)
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+
+
+# ---------------- App ----------------
+async def on_startup(app):
+    app["executor"] = make_executor()
+    app["state_executor"] = ThreadPoolExecutor(ASYNC_STATE_WORKERS, thread_name_prefix="state")
+    app["batcher"] = AsyncBatcher(predict_in_worker, app["executor"], INGEST_WORKERS,
+                                  max_batch_size=BATCH_MAX_SIZE, max_wait_ms=BATCH_MAX_WAIT_MS,
+                                  max_pending=INGEST_MAX_PENDING)
+    app["batcher_task"] = asyncio.create_task(app["batcher"].run())
+    metrics.gauge("async_pending_readings", "Readings queued or in flight in the async batcher", (),
+                  lambda: app["batcher"].pending)
+    metrics.gauge("async_rejected_total", "Readings rejected with 429", (),
+                  lambda: app["batcher"].rejected, kind="counter")
+
+
+async def on_shutdown(app):
+    start_draining()
+
+
+async def on_cleanup(app):
+    app["batcher_task"].cancel()
+    app["executor"].shutdown(wait=True)
+    app["state_executor"].shutdown(wait=True)
+    shutdown()
+
+
+def create_app():
+    app = web.Application(client_max_size=1024 ** 2, middlewares=[count_requests])
+    app["listeners"] = []
+    app["notify_tasks"] = set()
+    app.router.add_post("/data", post_data)
+    app.router.add_get("/ws", device_socket)
+    app.router.add_get("/stream", stream)
+    app.router.add_get("/latest", get_latest)
+    app.router.add_get("/ready", get_ready)
+    app.router.add_get("/metrics/ingest", get_ingest_metrics)
+    app.router.add_get("/metrics", get_metrics)
+    if PROFILING_ENABLED:
+        app.router.add_post("/admin/profile", sample_profile)
+    app.on_startup.append(on_startup)
+    app.on_shutdown.append(on_shutdown)
+    app.on_cleanup.append(on_cleanup)
+    return app
+
+
+if __name__ == "__main__":
+    print(f"🚀 Async ingestion server on http://localhost:{ASYNC_PORT}/data "
+          f"({INGEST_EXECUTOR} executor, {INGEST_WORKERS} worker(s), max {INGEST_MAX_PENDING} pending)")
+    if PROFILING_ENABLED:
+        install_signal_handler(log=log)
+    web.run_app(create_app(), host=ASYNC_HOST, port=ASYNC_PORT, print=None)
@@ -0,0 +1,129 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+# How long a request thread waits for its batch before giving up
+SUBMIT_TIMEOUT_S = float(os.environ.get("BATCH_SUBMIT_TIMEOUT_S", 30))
+
+
+class MicroBatcher:
+    """
+    Coalesce concurrent single-item requests into one vectorized call.
+
+    Request threads call submit(item) and block on their own Future. A single
+    worker thread takes the first queued item, keeps collecting until it has
+    max_batch_size items or max_wait_ms has passed, then calls
+    predict_fn(items) once and hands result i back to request i. If the
+    batch call raises, its items are retried one at a time, so a bad item
+    fails only its own request.
+    """
+
+    def __init__(self, predict_fn, max_batch_size=32, max_wait_ms=5.0, name="batcher"):
+        self.predict_fn = predict_fn
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.name = name
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+
+        # ---------- Metrics ----------
+        self.batches = 0
+        self.items = 0
+        self.last_batch_size = 0
+        self.max_seen_batch_size = 0
+        self.batch_size_counts = {}
+        self.failed_batches = 0
+        self.failed_items = 0
+
+    # ---------------- Public API ----------------
+    def submit(self, item, timeout=SUBMIT_TIMEOUT_S):
+        """Queue one item and wait for its result (TimeoutError after `timeout` seconds)."""
+        return self.submit_async(item).result(timeout=timeout)
+
+    def submit_async(self, item):
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "queue_depth": self.queue_depth(),
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0,
+            "last_batch_size": self.last_batch_size,
+            "max_seen_batch_size": self.max_seen_batch_size,
+            "batch_size_counts": dict(sorted(self.batch_size_counts.items())),
+            "failed_batches": self.failed_batches,
+            "failed_items": self.failed_items
+        }
+
+    # ---------------- Worker ----------------
+    def _ensure_worker(self):
+        # Threads do not survive fork(), so a forked worker process starts its own.
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue()
+                self._worker_pid = pid
+                self._worker = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [item for item, _ in batch]
+            try:
+                results = list(self.predict_fn(items))
+                if len(results) != len(items):
+                    raise ValueError(f"{self.name}: {len(results)} results for {len(items)} items")
+            except Exception:
+                self.failed_batches += 1
+                self._run_one_by_one(batch)
+            else:
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+
+            size = len(batch)
+            self.batches += 1
+            self.items += size
+            self.last_batch_size = size
+            self.max_seen_batch_size = max(self.max_seen_batch_size, size)
+            self.batch_size_counts[size] = self.batch_size_counts.get(size, 0) + 1
+
+    def _run_one_by_one(self, batch):
+        # Isolate the item(s) that broke the batch; the others still get answers
+        for item, future in batch:
+            try:
+                future.set_result(self.predict_fn([item])[0])
+            except Exception as e:
+                self.failed_items += 1
+                future.set_exception(e)
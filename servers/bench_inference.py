@@ -0,0 +1,54 @@
+# Micro-benchmark: predict + predict_proba (old /data path) vs a single predict_proba pass.
+# Run from the servers/ folder:  python bench_inference.py [n_requests]
+import sys
+import time
+import joblib
+import numpy as np
+from inference import MWL_LABELS, predict_single_pass, mwl_input
+
+MODEL_PATH = "../datasets/gsr/best_gsr_model.pkl"
+
+
+def old_path(model, input_data):
+    pred_val = model.predict(input_data)[0]
+    pred_label = "High MWL" if pred_val == 1 else "Low MWL"
+    proba = model.predict_proba(input_data)[0]
+    return pred_label, proba[pred_val] * 100
+
+
+def new_path(model, input_data):
+    result = predict_single_pass(model, input_data, MWL_LABELS)[0]
+    return result["prediction"], result["confidence"]
+
+
+def time_per_request(fn, model, inputs):
+    start = time.perf_counter()
+    for input_data in inputs:
+        fn(model, input_data)
+    return (time.perf_counter() - start) / len(inputs) * 1000
+
+
+if __name__ == "__main__":
+    n_requests = int(sys.argv[1]) if len(sys.argv) > 1 else 300
+
+    model = joblib.load(MODEL_PATH)
+    rng = np.random.default_rng(42)
+    inputs = [mwl_input(model, [v]) for v in rng.uniform(0.0, 3.3, n_requests)]
+
+    # Same answers either way
+    for input_data in inputs[:50]:
+        old_label, old_conf = old_path(model, input_data)
+        new_label, new_conf = new_path(model, input_data)
+        assert old_label == new_label and np.isclose(old_conf, new_conf)
+
+    # Warm-up, then measure
+    time_per_request(old_path, model, inputs[:20])
+    time_per_request(new_path, model, inputs[:20])
+    old_ms = time_per_request(old_path, model, inputs)
+    new_ms = time_per_request(new_path, model, inputs)
+
+    print(f"Model: {MODEL_PATH} ({model.n_estimators} trees, {model.n_features_in_} features)")
+    print(f"Requests: {n_requests}")
+    print(f"predict + predict_proba : {old_ms:.3f} ms/request")
+    print(f"single predict_proba    : {new_ms:.3f} ms/request")
+    print(f"Speed-up                : {old_ms / new_ms:.2f}x")
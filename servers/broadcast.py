@@ -0,0 +1,196 @@
+"""
+Fan-out of new results to live subscribers (server-sent events).
+
+One publisher, many subscribers: publish() encodes the event once as an SSE
+frame and hands the same bytes to every subscriber of that device (plus
+those subscribed to all devices). Each subscriber has a bounded queue; a
+subscriber whose queue is full is too slow to keep up, so it is dropped
+(its stream ends and EventSource reconnects, starting from a fresh
+snapshot) instead of growing memory or slowing the publisher.
+
+Subscription blocks a request thread (Flask); AsyncSubscription is woken
+through its event loop (aiohttp). While the sensor is idle a subscriber
+costs one parked thread or coroutine and a keep-alive comment every
+SSE_KEEPALIVE_S seconds.
+
+publish() only reaches subscribers in the same process. With several
+processes sharing state (STATE_BACKEND=manager), a FeedRelay thread in each
+process republishes the shared store's change feed instead, so a /stream
+client sees every worker's results whichever worker it is connected to.
+"""
+import asyncio
+import json
+import os
+import queue
+import threading
+import time
+
+SUBSCRIBER_QUEUE = 64
+CLOSED = object()  # sentinel: the subscriber was dropped
+
+
+def sse_frame(data, event=None):
+    lines = [f"event: {event}"] if event else []
+    lines.append("data: " + json.dumps(data, separators=(",", ":")))
+    return ("\n".join(lines) + "\n\n").encode()
+
+
+class Subscription:
+    """Blocking subscriber queue for a request thread."""
+
+    def __init__(self, device_id=None, maxsize=SUBSCRIBER_QUEUE):
+        self.device_id = device_id
+        self.queue = queue.Queue(maxsize)
+        self.closed = False
+
+    def deliver(self, frame):
+        try:
+            self.queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            return False
+
+    def close(self):
+        self.closed = True
+        with self.queue.mutex:
+            self.queue.queue.clear()
+        self.queue.put_nowait(CLOSED)
+
+    def get(self, timeout):
+        """Next frame, None after `timeout` seconds of silence, or CLOSED."""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class AsyncSubscription:
+    """Subscriber queue owned by an asyncio loop; publish() may run on any thread."""
+
+    def __init__(self, device_id=None, maxsize=SUBSCRIBER_QUEUE):
+        self.device_id = device_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue()
+        self.maxsize = maxsize
+        self.pending = 0  # frames handed over but not yet consumed
+        self.closed = False
+
+    def deliver(self, frame):
+        if self.pending >= self.maxsize:
+            return False
+        self.pending += 1
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, frame)
+        return True
+
+    def close(self):
+        self.closed = True
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, CLOSED)
+
+    async def get(self, timeout):
+        try:
+            frame = await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        if frame is not CLOSED:
+            self.pending -= 1
+        return frame
+
+
+class Broadcaster:
+    def __init__(self, maxsize=SUBSCRIBER_QUEUE):
+        self.maxsize = maxsize
+        self._subscribers = {}  # device_id (None = all devices) -> set of subscriptions
+        self._lock = threading.Lock()
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, device_id=None):
+        return self._add(Subscription(device_id, self.maxsize))
+
+    def subscribe_async(self, device_id=None):
+        return self._add(AsyncSubscription(device_id, self.maxsize))
+
+    def _add(self, subscription):
+        with self._lock:
+            self._subscribers.setdefault(subscription.device_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.device_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.device_id]
+
+    def publish(self, device_id, data, event="reading"):
+        """Send `data` to the subscribers of device_id and of all devices; returns how many got it."""
+        with self._lock:
+            targets = list(self._subscribers.get(device_id, ())) + list(self._subscribers.get(None, ()))
+        if not targets:
+            return 0
+        frame = sse_frame(data, event)
+        delivered = 0
+        for subscription in targets:
+            if subscription.deliver(frame):
+                delivered += 1
+            else:
+                self.unsubscribe(subscription)
+                subscription.close()
+                self.dropped += 1
+        self.published += 1
+        return delivered
+
+    def stats(self):
+        with self._lock:
+            subscribers = sum(len(s) for s in self._subscribers.values())
+            devices = sorted(str(d) for d in self._subscribers if d is not None)
+        return {"subscribers": subscribers, "filtered_devices": devices,
+                "published": self.published, "dropped_slow_consumers": self.dropped}
+
+
+class FeedRelay:
+    """
+    Republish a cross-process change feed to this process's subscribers.
+    fetch(after, timeout) long-polls the feed and returns
+    (seq, [(device_id, data), ...]); one thread per process calls it,
+    started by the first subscriber.
+    """
+
+    def __init__(self, broadcaster, fetch, timeout=15.0, event="reading"):
+        self.broadcaster = broadcaster
+        self.fetch = fetch
+        self.timeout = timeout
+        self.event = event
+        self._lock = threading.Lock()
+        self._worker = None
+        self._worker_pid = None
+        self.relayed = 0
+        self.errors = 0
+
+    def ensure_running(self):
+        # Threads do not survive fork(); each worker process starts its own.
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                self._worker_pid = pid
+                self._worker = threading.Thread(target=self._run, name="feed-relay", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        after = None
+        while True:
+            try:
+                after, events = self.fetch(after, self.timeout)
+            except Exception:
+                self.errors += 1
+                time.sleep(1.0)
+                continue
+            for device_id, data in events:
+                self.broadcaster.publish(device_id, data, self.event)
+            self.relayed += len(events)
+
+    def stats(self):
+        return {"relayed": self.relayed, "relay_errors": self.errors}
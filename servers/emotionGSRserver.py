@@ -1,103 +1,74 @@
-from flask import Flask, request, jsonify
+# EMOTION SERVER
+# Thin wrapper over the shared model registry: main.py mounts these routes at
+# /emotion (one process, one copy of the model); run this file directly for
+# the old standalone server on port 5001.
+from flask import Flask, Blueprint, request, jsonify
 from flask_cors import CORS
 from datetime import datetime
-import joblib
-import numpy as np
-import traceback
+from registry import registry
+from server_log import setup_logging, get_logger, log_sampled
+from state_store import LocalStateStore
 
-app = Flask(__name__)
-CORS(app)  # Enable CORS for React or other frontends
+emotion_api = Blueprint("emotion", __name__)
+log = get_logger("emotion")
 
-# ---------------- Load Model & Scaler ----------------
-try:
-    model = joblib.load("../datasets/emotion/best_model_emotion.pkl")
-    scaler = joblib.load("../datasets/emotion/scaler_emotion.pkl")
-    print("✅ Loaded emotion model and scaler successfully.")
-except Exception as e:
-    print(f"❌ Failed to load model or scaler: {e}")
-    model = None
-    scaler = None
-
-# ---------------- Latest Reading ----------------
-latest_reading = {
-    "gsr_value": None,
-    "prediction": None,
-    "confidence": None,
-    "timestamp": None
-}
+# ---------------- Latest Reading (per device) ----------------
+latest_readings = LocalStateStore(history=0)
 
 # ---------------- Receive GSR Data ----------------
-@app.route('/data', methods=['POST'])
+@emotion_api.route('/data', methods=['POST'])
 def receive_data():
-    global latest_reading
-
     try:
         data = request.get_json()
         if not data or 'gsr_value' not in data:
             return jsonify({"status": "error", "message": "Invalid or missing data"}), 400
 
         gsr_value = float(data['gsr_value'])
+        device_id = data.get('device_id', 'default')
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        if model is None or scaler is None:
+        entry = registry.get("emotion", request.args.get("version"))
+        if entry is None:
             return jsonify({"status": "error", "message": "Model or scaler not loaded"}), 500
 
-        # --- Prepare Input ---
-        input_data = np.array([[gsr_value]])
-
-        # Check scaler input dimensions
-        try:
-            input_scaled = scaler.transform(input_data)
-        except Exception as e:
-            # Auto-fix: if shape mismatch, repeat gsr_value to match scaler feature size
-            expected_features = getattr(scaler, 'n_features_in_', 1)
-            print(f"⚠️ Input shape mismatch. Expected {expected_features} features, got 1.")
-            input_data = np.array([[gsr_value] * expected_features])
-            input_scaled = scaler.transform(input_data)
-
-        # --- Prediction ---
-        prediction_val = model.predict(input_scaled)[0]
-        pred_label = str(prediction_val)  # e.g., Calm, Stressed, Sad, etc.
-
-        # --- Confidence ---
-        if hasattr(model, "predict_proba"):
-            proba = model.predict_proba(input_scaled)[0]
-            try:
-                class_index = list(model.classes_).index(prediction_val)
-                confidence_val = proba[class_index] * 100
-            except:
-                confidence_val = np.max(proba) * 100
-        else:
-            confidence_val = None
+        # --- Prediction + Confidence (single predict_proba pass) ---
+        result = entry.predict([gsr_value])[0]
+        pred_label = result["prediction"]  # e.g., Calm, Stressed, Sad, etc.
+        confidence_val = result["confidence"]
 
         # --- Save Latest Reading ---
-        latest_reading = {
+        latest_readings.update(device_id, {
             "gsr_value": gsr_value,
             "prediction": pred_label,
             "confidence": confidence_val,
             "timestamp": timestamp
-        }
+        })
 
-        # --- Print Log ---
-        if confidence_val:
-            print(f"[{timestamp}] 📡 GSR: {gsr_value:.3f} → 🧠 {pred_label} ({confidence_val:.1f}%)")
-        else:
-            print(f"[{timestamp}] 📡 GSR: {gsr_value:.3f} → 🧠 {pred_label}")
+        # --- Log (sampled) ---
+        log_sampled(log, "GSR reading", device_id=device_id, gsr_value=gsr_value,
+                    prediction=pred_label, confidence=confidence_val)
 
-        return jsonify(latest_reading), 200
+        return jsonify(latest_readings.latest(device_id)), 200
 
     except Exception as e:
-        print("⚠️ Server Error:\n", traceback.format_exc())
+        log.exception("Server error", extra={"data": {"path": request.path}})
         return jsonify({"status": "error", "message": str(e)}), 500
 
 # ---------------- Latest Data Endpoint ----------------
-@app.route('/latest', methods=['GET'])
+@emotion_api.route('/latest', methods=['GET'])
 def get_latest():
-    if latest_reading["gsr_value"] is None:
+    # ?device=<id>; default: the device that posted last
+    latest_reading = latest_readings.latest(request.args.get('device'))
+    if latest_reading is None:
         return jsonify({"status": "error", "message": "No data yet"}), 404
     return jsonify(latest_reading), 200
 
 # ---------------- Run Server ----------------
 if __name__ == '__main__':
+    app = Flask(__name__)
+    CORS(app)  # Enable CORS for React or other frontends
+    app.register_blueprint(emotion_api)
+    setup_logging()
+    registry.load()
     print("🚀 Emotion Flask server running... waiting for ESP32 data.")
     app.run(host='0.0.0.0', port=5001)
@@ -0,0 +1,281 @@
+import glob
+import json
+import os
+import queue
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from server_log import get_logger
+
+try:
+    import fcntl  # POSIX: gunicorn workers share one spool file
+except ImportError:
+    fcntl = None
+
+log = get_logger("forwarder")
+
+
+class WebhookForwarder:
+    """
+    Forward payloads to a webhook from a background thread.
+
+    send() only puts the payload on a bounded queue, so the caller never waits
+    on the network. The worker drains the queue in batches (a JSON array per
+    POST) over one pooled keep-alive session and retries failures with
+    exponential backoff. When the queue is full or retries run out, payloads
+    are appended to overflow_path (JSON lines) if one is set, otherwise
+    dropped; spooled payloads are replayed once the webhook answers again.
+
+    Several worker processes may share one overflow_path: appends and the
+    hand-over of the spool to a replaying worker happen under a file lock
+    (overflow_path + ".lock"), and each worker replays from its own
+    overflow_path.<pid>-<id>.replay, so a spooled payload is replayed once.
+    Lines that are not valid JSON are skipped and counted as corrupt.
+    """
+
+    def __init__(self, url, max_queue=1000, batch_size=50, flush_interval=1.0, timeout=3,
+                 max_retries=5, backoff_base=0.5, backoff_max=30.0, overflow_path=None):
+        self.url = url
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.overflow_path = overflow_path
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._spool_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        self._session = None
+        self._next_replay = 0.0
+
+        # ---------- Metrics ----------
+        self.sent = 0
+        self.failed_attempts = 0
+        self.dropped = 0
+        self.spooled = 0
+        self.replayed = 0
+        self.corrupt = 0
+        self.errors = 0
+
+    # ---------------- Public API ----------------
+    def send(self, payload):
+        """Queue one payload. Never blocks; returns False if it had to be spooled or dropped."""
+        self._ensure_worker()
+        try:
+            self._queue.put_nowait(payload)
+            return True
+        except queue.Full:
+            self._overflow([payload])
+            return False
+
+    def send_many(self, payloads):
+        return all([self.send(p) for p in payloads])
+
+    def queue_depth(self):
+        return self._queue.qsize()
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth(),
+            "max_queue": self.max_queue,
+            "sent": self.sent,
+            "failed_attempts": self.failed_attempts,
+            "dropped": self.dropped,
+            "spooled": self.spooled,
+            "replayed": self.replayed,
+            "corrupt": self.corrupt,
+            "errors": self.errors
+        }
+
+    def close(self, timeout=5.0):
+        """Stop the worker after it has tried to flush what is queued."""
+        self._stop.set()
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+
+    # ---------------- Worker ----------------
+    def _ensure_worker(self):
+        # Threads and sockets do not survive fork(); each process gets its own.
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                self._session = self._make_session()
+                self._stop.clear()
+                self._worker_pid = pid
+                self._worker = threading.Thread(target=self._run, name="webhook-forwarder", daemon=True)
+                self._worker.start()
+
+    def _make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def _collect(self):
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                self._step()
+            except Exception:
+                # Never let one bad spool or payload kill the forwarder thread
+                self.errors += 1
+                log.exception("n8n forwarder error")
+                self._next_replay = time.monotonic() + self.backoff_max
+
+    def _step(self):
+        batch = self._collect()
+        if batch:
+            if self._post_with_retry(batch):
+                self._replay_spool()
+            else:
+                self._overflow(batch)
+                self._next_replay = time.monotonic() + self.backoff_max
+        elif not self._stop.is_set():
+            self._replay_spool()
+
+    def _post(self, batch):
+        response = self._session.post(self.url, json=batch, timeout=self.timeout)
+        response.raise_for_status()
+
+    def _post_with_retry(self, batch):
+        for attempt in range(self.max_retries + 1):
+            try:
+                self._post(batch)
+                self.sent += len(batch)
+                return True
+            except Exception as e:
+                self.failed_attempts += 1
+                if attempt == self.max_retries or self._stop.is_set():
+                    log.warning("n8n delivery failed", extra={"data": {"payloads": len(batch), "error": str(e)}})
+                    return False
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                time.sleep(delay * random.uniform(0.5, 1.0))
+        return False
+
+    # ---------------- Disk Overflow ----------------
+    def _spool_locked(self):
+        """Thread lock plus, where available, an exclusive lock shared with other processes."""
+        return _SpoolLock(self._spool_lock, self.overflow_path + ".lock")
+
+    def _overflow(self, payloads):
+        if not self.overflow_path:
+            self.dropped += len(payloads)
+            return
+        try:
+            lines = "".join(json.dumps(payload) + "\n" for payload in payloads)
+            with self._spool_locked(), open(self.overflow_path, "a", encoding="utf-8") as f:
+                f.write(lines)
+            self.spooled += len(payloads)
+        except (OSError, TypeError, ValueError):
+            self.dropped += len(payloads)
+
+    def _claim_spool(self):
+        """Move the shared spool (or a dead worker's replay file) to this worker's replay file."""
+        mine = f"{self.overflow_path}.{os.getpid()}-{id(self):x}.replay"
+        with self._spool_locked():
+            if os.path.exists(mine):
+                return mine
+            for stale in glob.glob(glob.escape(self.overflow_path) + ".*.replay"):
+                pid = stale[len(self.overflow_path) + 1:].split("-", 1)[0].split(".", 1)[0]
+                if not pid.isdigit() or not _pid_alive(int(pid)):
+                    os.replace(stale, mine)
+                    return mine
+            if os.path.exists(self.overflow_path):
+                os.replace(self.overflow_path, mine)
+                return mine
+        return None
+
+    def _replay_spool(self):
+        if not self.overflow_path or time.monotonic() < self._next_replay:
+            return
+        replay_path = self._claim_spool()
+        if replay_path is None:
+            return
+        payloads, corrupt = [], 0
+        with open(replay_path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    payloads.append(json.loads(line))
+                except ValueError:
+                    corrupt += 1
+        if corrupt:
+            self.corrupt += corrupt
+            log.warning("Skipped corrupt n8n spool lines", extra={"data": {"lines": corrupt, "path": replay_path}})
+
+        for i in range(0, len(payloads), self.batch_size):
+            batch = payloads[i:i + self.batch_size]
+            if not self._post_with_retry(batch):
+                self._overflow(payloads[i:])
+                self._next_replay = time.monotonic() + self.backoff_max
+                break
+            self.replayed += len(batch)
+        try:
+            os.remove(replay_path)
+        except FileNotFoundError:
+            pass
+
+
+class _SpoolLock:
+    def __init__(self, thread_lock, path):
+        self.thread_lock = thread_lock
+        self.path = path
+        self._file = None
+
+    def __enter__(self):
+        self.thread_lock.acquire()
+        if fcntl is not None:
+            try:
+                self._file = open(self.path, "a")
+                fcntl.flock(self._file, fcntl.LOCK_EX)
+            except BaseException:
+                self.__exit__()
+                raise
+        return self
+
+    def __exit__(self, *exc):
+        try:
+            if self._file is not None:
+                self._file.close()  # releases the flock
+                self._file = None
+        finally:
+            self.thread_lock.release()
+
+
+def _pid_alive(pid):
+    if pid == os.getpid():
+        return True
+    if os.name != "posix":
+        return False  # a single server process there (gunicorn is POSIX-only)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
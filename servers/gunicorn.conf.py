@@ -0,0 +1,59 @@
+# Gunicorn settings for the inference server (Linux/macOS; on Windows use `python main.py`).
+#     gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Prefork + threads: each worker process runs WEB_THREADS request threads that
+# share the process's micro-batchers, so concurrent readings still coalesce
+# into one predict_proba call. SIGTERM is a graceful shutdown: workers stop
+# accepting, finish in-flight requests within WEB_GRACEFUL_TIMEOUT seconds,
+# and flush the n8n queue on exit. GET /ready fails from the moment a worker
+# receives the signal, not only once it has stopped serving.
+import multiprocessing
+import os
+import signal
+
+chdir = os.path.dirname(os.path.abspath(__file__))  # flat imports and model paths
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("WEB_THREADS", 8))
+worker_class = "gthread"
+preload_app = True  # load the models once in the master, share them copy-on-write
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("WEB_KEEPALIVE", 5))
+accesslog = os.environ.get("WEB_ACCESS_LOG")  # "-" for stdout; off by default
+
+
+def when_ready(server):
+    server.log.info(f"🚀 Inference server ready: {workers} worker(s) x {threads} thread(s) on {bind}")
+
+
+def post_worker_init(worker):
+    # The worker resets signal handlers after the fork; SIGUSR2 <pid> then profiles that worker
+    from main import PROFILING_ENABLED, log
+    from profiler import install_signal_handler
+    from wsgi import start_draining
+    if PROFILING_ENABLED:
+        install_signal_handler(log=log)
+
+    # Graceful stop (SIGTERM): start failing /ready, then let gunicorn drain as usual
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def drain(signum, frame):
+        start_draining()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_int(worker):
+    # SIGINT / SIGQUIT: quick shutdown, but stop reporting ready all the same
+    from wsgi import start_draining
+    start_draining()
+
+
+def worker_exit(server, worker):
+    # Serving has stopped; flush the n8n queue and the time-series writer
+    from wsgi import shutdown
+    shutdown()
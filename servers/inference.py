@@ -0,0 +1,106 @@
+import os
+import sys
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets", "ppg"))
+from ppg_features import FEATURE_NAMES as PPG_FEATURE_NAMES, extract_ppg_features
+
+# ---------------- Label Maps ----------------
+MWL_LABELS = {0: "Low MWL", 1: "High MWL"}
+
+# The PPG model was trained on whole recordings of this many trial columns
+# (CSV columns), flattened row by row. Each trial is 5 minutes at 256 Hz.
+PPG_TRIAL_COLUMNS = 2
+PPG_TRIAL_SAMPLES = 76800
+
+
+def encoder_labels(label_encoder):
+    """Label map for a model trained on LabelEncoder-encoded targets (0 -> 'angry', ...)."""
+    return {i: str(cls) for i, cls in enumerate(label_encoder.classes_)}
+
+
+def class_labels(model, label_map=None):
+    """Display label for each entry in model.classes_, in column order."""
+    label_map = label_map or {}
+    return [label_map.get(cls, str(cls)) for cls in model.classes_]
+
+
+def predict_single_pass(model, X, label_map=None):
+    """
+    Predict every row of X with one predict_proba pass.
+
+    The label is the argmax column of the probability row, which is exactly
+    what predict() returns for the sklearn classifiers we ship, so there is
+    no need to walk the trees a second time. Returns one dict per row with
+    "prediction", "confidence" (percent, unrounded) and "all_percentages".
+    """
+    if not hasattr(model, "predict_proba"):
+        return [
+            {"prediction": label_map.get(p, str(p)) if label_map else str(p),
+             "confidence": None, "all_percentages": None}
+            for p in model.predict(X)
+        ]
+
+    labels = class_labels(model, label_map)
+    probas = model.predict_proba(X)
+    best = probas.argmax(axis=1)
+
+    return [
+        {
+            "prediction": labels[idx],
+            "confidence": float(proba[idx]) * 100,
+            "all_percentages": {label: round(float(p) * 100, 1) for label, p in zip(labels, proba)}
+        }
+        for idx, proba in zip(best, probas)
+    ]
+
+
+# ---------------- Input Builders ----------------
+def emotion_input(scaler, gsr_values):
+    """Scale GSR readings for the emotion model, repeating them if the scaler wants more columns."""
+    input_data = np.asarray(gsr_values, dtype=float).reshape(-1, 1)
+    expected_features = getattr(scaler, 'n_features_in_', 1)
+    if expected_features != 1:
+        input_data = np.repeat(input_data, expected_features, axis=1)
+    return scaler.transform(input_data)
+
+
+def mwl_input(model, gsr_values):
+    """Expand each GSR reading to the number of features the MWL model expects."""
+    input_data = np.asarray(gsr_values, dtype=float).reshape(-1, 1)
+    return np.repeat(input_data, model.n_features_in_, axis=1)
+
+
+def heartbeat_input(scaler, heart_rates):
+    """Scale heart-rate values (bpm) for the heartbeat emotion model."""
+    return scaler.transform(np.asarray(heart_rates, dtype=float).reshape(-1, 1))
+
+
+def ppg_input(model, recordings):
+    """
+    Lay out buffered PPG streams like the training recordings.
+
+    Each row of `recordings` holds at least model.n_features_in_ samples; the
+    latest ones are split into PPG_TRIAL_COLUMNS consecutive trials (one per
+    CSV column) and flattened row by row, as data.flatten() did in training.
+    """
+    recordings = np.atleast_2d(np.asarray(recordings, dtype=float))
+    n_features = model.n_features_in_
+    rows = n_features // PPG_TRIAL_COLUMNS
+    latest = recordings[:, recordings.shape[1] - n_features:]
+    return latest.reshape(len(latest), PPG_TRIAL_COLUMNS, rows).transpose(0, 2, 1).reshape(len(latest), n_features)
+
+
+def ppg_compact_input(model, recordings, recording_samples):
+    """
+    Compact PPG features (datasets/ppg/ppg_features.py) of buffered PPG streams,
+    for models trained with PPG_REPRESENTATION=compact. The latest
+    recording_samples samples of each row are split into one consecutive trial
+    per 18 model features, and each trial is reduced as extract_ppg_features
+    reduced a CSV column.
+    """
+    recordings = np.atleast_2d(np.asarray(recordings, dtype=float))
+    columns = model.n_features_in_ // len(PPG_FEATURE_NAMES)
+    rows = recording_samples // columns
+    latest = recordings[:, recordings.shape[1] - rows * columns:]
+    return np.array([extract_ppg_features(row.reshape(columns, rows).T) for row in latest], dtype=np.float64)
@@ -0,0 +1,240 @@
+# Load generator: thousands of virtual ESP32 devices posting GSR readings, for
+# capacity planning of the ingestion server (main.py under gunicorn, or
+# async_server.py). testdata.py simulates one device with random values; here
+# every device replays a real GSR trace from datasets/gsr (a random recording,
+# trial column and starting point, stepped at the device's send rate), and all
+# devices share one asyncio event loop and one pooled keep-alive connector.
+#
+# Each device sends `rate` readings per second. Gaps between sends are drawn
+# from a gamma distribution with coefficient of variation `burstiness`:
+# 0 = a fixed period (an ESP32 loop), 1 = Poisson, >1 = clustered bursts.
+# With --batch B a device buffers B readings and posts them together to
+# /data/batch. A device whose previous request is still in flight falls
+# behind its schedule. The report counts those late readings, because latency
+# alone hides a saturated server (coordinated omission).
+#
+# Run from the servers/ folder against a running server:
+#     python loadgen.py --devices 2000 --rate 0.5 --duration 60
+#     python loadgen.py --devices 5000 --batch 10 --burstiness 2 --json report.json
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import numpy as np
+import aiohttp
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets"))
+from mwl_loader import recording_files, read_recording
+
+GSR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets", "gsr")
+TRACE_HZ = 256  # sampling rate of the shipped recordings
+LOADGEN_URL = os.environ.get("LOADGEN_URL", "http://127.0.0.1:5000")
+
+
+# ---------------- Traces ----------------
+def load_traces(max_recordings=8, seed=0):
+    """Trial columns of up to max_recordings GSR recordings (High and Low MWL mixed), as 1-D arrays."""
+    files = recording_files(os.path.join(GSR_DIR, "High_MWL"), os.path.join(GSR_DIR, "Low_MWL"))
+    if not files:
+        raise FileNotFoundError(f"No GSR recordings under {GSR_DIR}")
+    rng = np.random.default_rng(seed)
+    chosen = rng.choice(len(files), size=min(max_recordings, len(files)), replace=False)
+    traces = []
+    for i in chosen:
+        data = read_recording(files[i][0])
+        traces.extend(np.ascontiguousarray(data[:, c]) for c in range(data.shape[1]))
+    return traces
+
+
+class TraceCursor:
+    """One device's position in a trace; each reading advances by the time since the last one."""
+
+    def __init__(self, trace, rng):
+        self.trace = trace
+        self.position = float(rng.integers(len(trace)))
+
+    def next(self, elapsed_s):
+        self.position = (self.position + elapsed_s * TRACE_HZ) % len(self.trace)
+        return round(float(self.trace[int(self.position)]), 4)
+
+
+# ---------------- Statistics ----------------
+class Stats:
+    def __init__(self):
+        self.latencies = []  # ms, successful requests
+        self.statuses = {}   # status code or error name -> count
+        self.requests = 0
+        self.readings = 0
+        self.late = 0
+        self.lag_s = 0.0
+        self.in_flight = 0
+        self.unfinished = 0
+
+    def record(self, status, latency_ms, readings):
+        self.requests += 1
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if status == 200:
+            self.latencies.append(latency_ms)
+            self.readings += readings
+
+    def summary(self, elapsed):
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        errors = self.requests - self.statuses.get(200, 0)
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": self.requests,
+            "readings_ok": self.readings,
+            "requests_per_s": round(self.requests / elapsed, 1) if elapsed else 0.0,
+            "readings_per_s": round(self.readings / elapsed, 1) if elapsed else 0.0,
+            "error_rate": round(errors / self.requests, 4) if self.requests else 0.0,
+            "statuses": {str(k): v for k, v in sorted(self.statuses.items(), key=lambda kv: str(kv[0]))},
+            "p50_ms": round(float(np.percentile(latencies, 50)), 2),
+            "p95_ms": round(float(np.percentile(latencies, 95)), 2),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 2),
+            "max_ms": round(float(latencies.max()), 2),
+            "unfinished": self.unfinished,
+            "late_readings": self.late,
+            "avg_lag_ms": round(self.lag_s / self.late * 1000, 1) if self.late else 0.0
+        }
+
+
+# ---------------- Devices ----------------
+def gaps(rng, rate, burstiness):
+    """Seconds until the next reading: mean 1/rate, coefficient of variation `burstiness`."""
+    mean = 1.0 / rate
+    if burstiness <= 0:
+        return lambda: mean
+    shape = 1.0 / burstiness ** 2
+    return lambda: rng.gamma(shape, mean / shape)
+
+
+async def post(session, url, body, stats, readings, timeout):
+    start = time.perf_counter()
+    stats.in_flight += 1
+    try:
+        async with session.post(url, json=body, timeout=timeout) as response:
+            await response.read()
+            status = response.status
+    except asyncio.TimeoutError:
+        status = "timeout"
+    except aiohttp.ClientError as e:
+        status = type(e).__name__
+    finally:
+        stats.in_flight -= 1
+    stats.record(status, (time.perf_counter() - start) * 1000, readings)
+
+
+async def device(index, session, args, traces, stats, end):
+    rng = np.random.default_rng(args.seed * 100003 + index)
+    cursor = TraceCursor(traces[rng.integers(len(traces))], rng)
+    next_gap = gaps(rng, args.rate, args.burstiness)
+    device_id = f"{args.prefix}-{index}"
+    timeout = aiohttp.ClientTimeout(total=args.timeout)
+    loop = asyncio.get_running_loop()
+
+    # Stagger the first reading over one period and the first batch over one
+    # batch, so the fleet does not fire in lockstep
+    due = loop.time() + rng.uniform(0, 1.0 / args.rate)
+    fill = int(rng.integers(1, args.batch + 1))
+    pending, gap = [], 0.0
+    while due < end:
+        delay = due - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        else:
+            stats.late += 1
+            stats.lag_s -= delay
+        pending.append({"gsr_value": cursor.next(gap),
+                        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S")})
+        gap = next_gap()
+        due += gap
+        if len(pending) < fill:
+            continue
+        fill = args.batch
+        if args.batch == 1:
+            await post(session, f"{args.url}/data", {**pending[0], "device_id": device_id}, stats, 1, timeout)
+        else:
+            await post(session, f"{args.url}/data/batch", {"device_id": device_id, "readings": pending},
+                       stats, len(pending), timeout)
+        pending = []
+
+
+async def report_progress(stats, start, interval):
+    previous = 0
+    while True:
+        await asyncio.sleep(interval)
+        elapsed = time.perf_counter() - start
+        recent = stats.latencies[previous:]
+        previous = len(stats.latencies)
+        p95 = np.percentile(recent, 95) if recent else 0.0
+        errors = stats.requests - stats.statuses.get(200, 0)
+        print(f"  {elapsed:6.0f}s  {stats.requests:>9} req  {errors:>6} err  "
+              f"{len(recent) / interval:>8.1f} ok/s  p95 {p95:7.1f} ms  late {stats.late}")
+
+
+async def run(args):
+    traces = load_traces(args.recordings, args.seed)
+    stats = Stats()
+    connector = aiohttp.TCPConnector(limit=args.connections, keepalive_timeout=30)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        loop = asyncio.get_running_loop()
+        end = loop.time() + args.duration
+        start = time.perf_counter()
+        reporter = asyncio.create_task(report_progress(stats, start, args.report_every))
+        devices = [asyncio.create_task(device(i, session, args, traces, stats, end)) for i in range(args.devices)]
+        # Requests still queued or in flight after the drain period are counted, not awaited
+        _, stragglers = await asyncio.wait(devices, timeout=args.duration + args.drain)
+        elapsed = time.perf_counter() - start
+        stats.unfinished = stats.in_flight
+        for task in list(stragglers) + [reporter]:
+            task.cancel()
+        await asyncio.gather(*stragglers, reporter, return_exceptions=True)
+        return stats.summary(elapsed), len(traces)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate many ESP32 GSR devices against the ingestion server")
+    parser.add_argument("--url", default=LOADGEN_URL, help="server base URL (default %(default)s)")
+    parser.add_argument("--devices", type=int, default=1000)
+    parser.add_argument("--rate", type=float, default=0.5, help="readings per second per device (testdata.py: 0.5)")
+    parser.add_argument("--burstiness", type=float, default=0.0,
+                        help="coefficient of variation of the gaps: 0 periodic, 1 Poisson, >1 bursty")
+    parser.add_argument("--batch", type=int, default=1, help="readings per request; >1 posts to /data/batch (main.py only)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds")
+    parser.add_argument("--connections", type=int, default=200, help="pooled keep-alive connections")
+    parser.add_argument("--timeout", type=float, default=10, help="per-request timeout (s)")
+    parser.add_argument("--drain", type=float, default=2, help="seconds to let in-flight requests finish")
+    parser.add_argument("--recordings", type=int, default=8, help="GSR recordings to replay")
+    parser.add_argument("--prefix", default="sim", help="device_id prefix")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--report-every", type=float, default=5, help="progress interval (s)")
+    parser.add_argument("--json", help="also write the summary to this file")
+    args = parser.parse_args()
+    if args.devices < 1 or args.rate <= 0 or args.batch < 1:
+        parser.error("--devices and --batch must be >= 1 and --rate > 0")
+
+    offered = args.devices * args.rate
+    print(f"📡 {args.devices} devices x {args.rate:g} readings/s = {offered:,.0f} readings/s offered "
+          f"({offered / args.batch:,.0f} req/s, batch {args.batch}, burstiness {args.burstiness:g}) "
+          f"→ {args.url} for {args.duration:g}s")
+    summary, traces = asyncio.run(run(args))
+    summary.update(devices=args.devices, rate=args.rate, batch=args.batch, burstiness=args.burstiness,
+                   offered_readings_per_s=offered, traces=traces)
+
+    print(f"\n✅ {summary['requests']} requests in {summary['elapsed_s']}s: "
+          f"{summary['requests_per_s']} req/s, {summary['readings_per_s']} readings/s accepted "
+          f"(offered {offered:,.0f})")
+    print(f"   latency p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+          f"p99 {summary['p99_ms']} ms  max {summary['max_ms']} ms")
+    print(f"   errors {summary['error_rate'] * 100:.2f}%  statuses {summary['statuses']}  "
+          f"unfinished {summary['unfinished']}")
+    print(f"   late readings {summary['late_readings']} (avg {summary['avg_lag_ms']} ms behind schedule)")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+# Load test: requests/sec of the gunicorn server (gunicorn.conf.py) as the
+# worker count grows, on this machine. For each worker count a server is
+# started on LOADTEST_PORT, /ready is awaited, and client processes hammer
+# POST /data for a fixed time over keep-alive sessions. Clients share the
+# machine with the server, so leave cores for them on small hosts.
+# Run from the servers/ folder:  python loadtest.py [worker counts] [seconds]
+#     python loadtest.py 1,2,4 15
+import multiprocessing
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import numpy as np
+import requests
+
+LOADTEST_PORT = int(os.environ.get("LOADTEST_PORT", 5055))
+CLIENT_PROCESSES = int(os.environ.get("LOADTEST_CLIENTS", max(1, multiprocessing.cpu_count() // 2)))
+THREADS_PER_CLIENT = int(os.environ.get("LOADTEST_THREADS", 16))
+BASE_URL = f"http://127.0.0.1:{LOADTEST_PORT}"
+
+
+def start_server(workers):
+    env = {**os.environ, "WEB_WORKERS": str(workers), "WEB_BIND": f"127.0.0.1:{LOADTEST_PORT}",
+           "N8N_WEBHOOK_URL": os.environ.get("N8N_WEBHOOK_URL", "http://127.0.0.1:9/unused")}
+    server = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "wsgi:app"],
+                              env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if requests.get(f"{BASE_URL}/ready", timeout=1).status_code == 200:
+                return server
+        except requests.ConnectionError:
+            pass
+        time.sleep(0.2)
+    server.kill()
+    raise RuntimeError("server did not become ready")
+
+
+def stop_server(server):
+    server.send_signal(signal.SIGTERM)  # graceful shutdown
+    server.wait(timeout=60)
+
+
+def client(duration, seed):
+    """One client process: THREADS_PER_CLIENT keep-alive sessions posting /data; returns latencies (ms) and errors."""
+    latencies, errors = [], [0]
+    lock = threading.Lock()
+    end = time.monotonic() + duration
+
+    def run(thread_seed):
+        rng = np.random.default_rng(thread_seed)
+        session = requests.Session()
+        device_id = f"loadtest-{thread_seed}"
+        local = []
+        while time.monotonic() < end:
+            start = time.perf_counter()
+            try:
+                r = session.post(f"{BASE_URL}/data", json={"gsr_value": float(rng.uniform(0, 3.3)),
+                                                           "device_id": device_id}, timeout=10)
+                ok = r.status_code == 200
+            except requests.RequestException:
+                ok = False
+            if ok:
+                local.append((time.perf_counter() - start) * 1000)
+            else:
+                with lock:
+                    errors[0] += 1
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=run, args=(seed * 1000 + i,)) for i in range(THREADS_PER_CLIENT)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return latencies, errors[0]
+
+
+def measure(workers, duration):
+    server = start_server(workers)
+    try:
+        with multiprocessing.Pool(CLIENT_PROCESSES) as pool:
+            results = pool.starmap(client, [(duration, seed) for seed in range(CLIENT_PROCESSES)])
+    finally:
+        stop_server(server)
+    latencies = np.array([ms for lat, _ in results for ms in lat])
+    return {
+        "workers": workers,
+        "rps": len(latencies) / duration,
+        "p50": np.percentile(latencies, 50) if len(latencies) else 0.0,
+        "p95": np.percentile(latencies, 95) if len(latencies) else 0.0,
+        "errors": sum(err for _, err in results)
+    }
+
+
+if __name__ == "__main__":
+    cpu = multiprocessing.cpu_count()
+    counts = [int(w) for w in sys.argv[1].split(",")] if len(sys.argv) > 1 else sorted({1, max(1, cpu // 2), cpu})
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+
+    print(f"CPU cores: {cpu}, clients: {CLIENT_PROCESSES} process(es) x {THREADS_PER_CLIENT} threads, {duration:.0f}s each\n")
+    print(f"{'workers':>8} {'req/s':>9} {'speedup':>8} {'p50 ms':>8} {'p95 ms':>8} {'errors':>7}")
+    baseline = None
+    for workers in counts:
+        row = measure(workers, duration)
+        baseline = baseline or row["rps"]
+        print(f"{row['workers']:>8} {row['rps']:>9.1f} {row['rps'] / baseline:>7.2f}x "
+              f"{row['p50']:>8.1f} {row['p95']:>8.1f} {row['errors']:>7}")
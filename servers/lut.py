@@ -0,0 +1,170 @@
+"""
+Lookup-table inference for the single-input GSR models.
+
+Both served models are pure functions of one float: the emotion model sees
+only the scaled GSR value, and the MWL model gets that value repeated
+n_features_in_ times. compile_lut() samples a model's predict_proba densely
+over the ESP32 ADC range (0-3.3 V, 4096 points = one per 12-bit ADC code)
+and LookupModel answers with an array index plus linear interpolation
+instead of running the model. Values outside the table fall back to the
+original model.
+
+A table stores the SHA-256 of the model (and scaler) files it was compiled
+from; loading it against other files raises ValueError, so a retrained model
+is never answered from a stale table.
+
+Compile the tables (run from the servers/ folder):
+    python lut.py
+"""
+import hashlib
+import sys
+import joblib
+import numpy as np
+from inference import emotion_input, mwl_input
+
+ADC_MIN_V = 0.0
+ADC_MAX_V = 3.3
+ADC_POINTS = 4096
+
+EMOTION_MODEL_PATH = "../datasets/emotion/best_model_emotion.pkl"
+EMOTION_SCALER_PATH = "../datasets/emotion/scaler_emotion.pkl"
+MWL_MODEL_PATH = "../datasets/gsr/best_gsr_model.pkl"
+EMOTION_LUT_PATH = "../datasets/emotion/emotion_lut.npz"
+MWL_LUT_PATH = "../datasets/gsr/mwl_lut.npz"
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class LookupModel:
+    """predict_proba/classes_ look-alike backed by a precomputed probability table."""
+
+    def __init__(self, lo, hi, table, classes, fallback=None, sources=None):
+        self.lo = float(lo)
+        self.hi = float(hi)
+        self.table = np.ascontiguousarray(table, dtype=np.float64)
+        self.classes_ = np.asarray(classes)
+        self.step = (self.hi - self.lo) / (len(self.table) - 1)
+        self.fallback = fallback  # callable(gsr_values) -> probas, used outside [lo, hi]
+        self.n_features_in_ = 1
+        self.sources = dict(sources or {})  # "model"/"scaler" -> SHA-256 of the file compiled from
+
+    def predict_proba(self, X):
+        values = np.asarray(X, dtype=np.float64).reshape(len(X), -1)[:, 0]
+        pos = (values - self.lo) / self.step
+        in_range = (pos >= 0) & (pos <= len(self.table) - 1)
+
+        pos_c = np.clip(pos, 0, len(self.table) - 1)
+        left = np.minimum(pos_c.astype(np.intp), len(self.table) - 2)
+        frac = (pos_c - left)[:, None]
+        probas = self.table[left] * (1 - frac) + self.table[left + 1] * frac
+
+        if self.fallback is not None and not in_range.all():
+            probas[~in_range] = self.fallback(values[~in_range])
+        return probas
+
+    def predict(self, X):
+        return self.classes_[self.predict_proba(X).argmax(axis=1)]
+
+    def save(self, path):
+        classes = self.classes_.astype(str) if self.classes_.dtype == object else self.classes_
+        hashes = {f"{name}_sha256": digest for name, digest in self.sources.items()}
+        np.savez_compressed(path, lo=self.lo, hi=self.hi, table=self.table, classes=classes, **hashes)
+
+    @classmethod
+    def load(cls, path, fallback=None, sources=None):
+        """
+        sources maps "model"/"scaler" to the files the table must have been
+        compiled from; a missing or different hash raises ValueError.
+        """
+        with np.load(path, allow_pickle=False) as data:
+            stored = {name[:-len("_sha256")]: str(data[name]) for name in data.files if name.endswith("_sha256")}
+            for name, source in (sources or {}).items():
+                if source is not None and stored.get(name) != file_sha256(source):
+                    raise ValueError(f"{path} was not compiled from this {name} ({source}); re-run lut.py")
+            return cls(data["lo"], data["hi"], data["table"], data["classes"], fallback=fallback, sources=stored)
+
+
+# ---------------- Model -> probability function ----------------
+def emotion_proba_fn(model, scaler):
+    return lambda gsr_values: model.predict_proba(emotion_input(scaler, gsr_values))
+
+
+def mwl_proba_fn(model):
+    return lambda gsr_values: model.predict_proba(mwl_input(model, gsr_values))
+
+
+# ---------------- Compiler ----------------
+def compile_lut(proba_fn, classes, lo=ADC_MIN_V, hi=ADC_MAX_V, n_points=ADC_POINTS, sources=None):
+    """sources maps "model"/"scaler" to the files proba_fn was loaded from; their hashes go in the table."""
+    grid = np.linspace(lo, hi, n_points)
+    hashes = {name: file_sha256(path) for name, path in (sources or {}).items()}
+    return LookupModel(lo, hi, proba_fn(grid), classes, fallback=proba_fn, sources=hashes)
+
+
+def check_equivalence(lut, proba_fn, classes, n_samples=20000, seed=0):
+    """
+    Compare the table against the original model on random in-range voltages
+    and on the exact ADC grid. Returns label agreement and worst probability error.
+    """
+    rng = np.random.default_rng(seed)
+    checks = {
+        "random": rng.uniform(lut.lo, lut.hi, n_samples),
+        "adc_grid": np.linspace(lut.lo, lut.hi, len(lut.table))
+    }
+    report = {}
+    for name, values in checks.items():
+        ref = proba_fn(values)
+        got = lut.predict_proba(values.reshape(-1, 1))
+        report[name] = {
+            "label_agreement": float(np.mean(ref.argmax(axis=1) == got.argmax(axis=1))),
+            "max_abs_proba_error": float(np.max(np.abs(ref - got))),
+            "mean_abs_proba_error": float(np.mean(np.abs(ref - got)))
+        }
+    return report
+
+
+def load_lookup_models(emotion_model, emotion_scaler, mwl_model):
+    """Load compiled tables if present; returns (emotion_lut, mwl_lut), either may be None."""
+    emotion_lut = mwl_lut = None
+    try:
+        if emotion_model is not None and emotion_scaler is not None:
+            emotion_lut = LookupModel.load(EMOTION_LUT_PATH, fallback=emotion_proba_fn(emotion_model, emotion_scaler),
+                                           sources={"model": EMOTION_MODEL_PATH, "scaler": EMOTION_SCALER_PATH})
+    except (OSError, ValueError):
+        pass
+    try:
+        if mwl_model is not None:
+            mwl_lut = LookupModel.load(MWL_LUT_PATH, fallback=mwl_proba_fn(mwl_model),
+                                       sources={"model": MWL_MODEL_PATH})
+    except (OSError, ValueError):
+        pass
+    return emotion_lut, mwl_lut
+
+
+def build_and_check(name, proba_fn, classes, out_path, n_points, sources):
+    lut = compile_lut(proba_fn, classes, n_points=n_points, sources=sources)
+    lut.save(out_path)
+    print(f"\n✅ {name}: {len(lut.table)} points × {lut.table.shape[1]} classes → {out_path}")
+    for check, stats in check_equivalence(lut, proba_fn, classes).items():
+        print(f"   {check:<9} label agreement {stats['label_agreement'] * 100:.3f}% | "
+              f"max |Δp| {stats['max_abs_proba_error']:.4f} | mean |Δp| {stats['mean_abs_proba_error']:.5f}")
+
+
+if __name__ == "__main__":
+    n_points = int(sys.argv[1]) if len(sys.argv) > 1 else ADC_POINTS
+
+    emotion_model = joblib.load(EMOTION_MODEL_PATH)
+    emotion_scaler = joblib.load(EMOTION_SCALER_PATH)
+    mwl_model = joblib.load(MWL_MODEL_PATH)
+
+    build_and_check("Emotion LUT", emotion_proba_fn(emotion_model, emotion_scaler),
+                    emotion_model.classes_, EMOTION_LUT_PATH, n_points,
+                    {"model": EMOTION_MODEL_PATH, "scaler": EMOTION_SCALER_PATH})
+    build_and_check("MWL LUT", mwl_proba_fn(mwl_model),
+                    mwl_model.classes_, MWL_LUT_PATH, n_points, {"model": MWL_MODEL_PATH})
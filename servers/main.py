@@ -1,167 +1,906 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, g
 from flask_cors import CORS
 from datetime import datetime
-import joblib
 import numpy as np
-import traceback
-import requests  # <-- for n8n
+import os
+import math
+import atexit
+import threading
+import time
+from inference import predict_single_pass
+from batcher import MicroBatcher, SUBMIT_TIMEOUT_S
+from forwarder import WebhookForwarder  # <-- for n8n
+from broadcast import Broadcaster, FeedRelay, sse_frame, CLOSED
+from state_store import STATE_BACKEND, make_state_store, parse_since
+from timeseries import TimeSeriesStore, TIMESERIES_DIR, flatten_reading, to_columns
+from registry import registry
+from server_log import setup_logging, get_logger, log_sampled, logging_stats
+from metrics import metrics, StageTimer, REQUESTS, REQUEST_ERRORS, REQUEST_SECONDS, CONTENT_TYPE
+from profiler import (PROFILING_ENABLED, PROFILE_SECONDS, PROFILE_INTERVAL_MS, RequestProfiler,
+                      profile_to_file, install_signal_handler)
+from streaming_features import DeviceFeatureEngine, channels_for_features
+from physio import PPGStream
+from mwlGSRserver import mwl_api
+from emotionGSRserver import emotion_api
 
 app = Flask(__name__)
 CORS(app)
+app.register_blueprint(mwl_api, url_prefix="/mwl")
+app.register_blueprint(emotion_api, url_prefix="/emotion")
+
+# ---------------- Logging ----------------
+# Request paths log through server_log's bounded queue: per-reading lines are
+# sampled (LOG_SAMPLE_RATE), warnings/errors are rate-limited per call site.
+setup_logging()
+log = get_logger("main")
+
+# ---------------- Model Registry ----------------
+# Every model, scaler and label encoder is loaded once into the shared registry
+# (registry.py) and looked up by name per batch, so rolling out a new version
+# (edit models.json or POST /models/reload) needs no restart. Loading at import
+# and freezing the GC means prefork workers share the model pages copy-on-write.
+registry.load()
+registry.freeze()
+
+# ---------------- Lookup-table Mode ----------------
+# INFERENCE_MODE=lut answers in-range readings from the tables compiled by lut.py
+# (O(1) index + interpolation) and falls back to the models outside 0-3.3 V.
+INFERENCE_MODE = os.environ.get("INFERENCE_MODE", "model")
+USE_LUT = INFERENCE_MODE == "lut"
+if USE_LUT:
+    luts = {name: registry.get(name) is not None and registry.get(name).lut is not None for name in ("emotion", "mwl")}
+    print(f"✅ Lookup tables: emotion={'on' if luts['emotion'] else 'missing'}, mwl={'on' if luts['mwl'] else 'missing'}")
+
+# ---------------- Streaming MWL Features ----------------
+# The MWL model was trained on extract_gsr_features over multi-channel recordings.
+# Each device gets a sliding window whose features match that layout; until
+# MWL_MIN_READINGS have arrived the old "repeat the reading" input is used.
+# Engines are kept per channel count, so a new MWL version with another
+# layout gets its own windows.
+MWL_WINDOW = int(os.environ.get("MWL_WINDOW", 256))
+MWL_MIN_READINGS = int(os.environ.get("MWL_MIN_READINGS", 30))
+MWL_MAX_DEVICES = int(os.environ.get("MWL_MAX_DEVICES", 1000))  # windows kept; idle ones dropped after MWL_IDLE_S
+MWL_IDLE_S = float(os.environ.get("MWL_IDLE_S", 600))
+mwl_engines = {}
+
+
+def mwl_feature_engine():
+    entry = registry.get("mwl")
+    channels = channels_for_features(entry.model.n_features_in_) if entry else None
+    if not channels:
+        return None
+    engine = mwl_engines.get(channels)
+    if engine is None:
+        engine = mwl_engines.setdefault(channels, DeviceFeatureEngine(
+            channels, window=MWL_WINDOW, min_readings=MWL_MIN_READINGS, max_devices=MWL_MAX_DEVICES, idle_s=MWL_IDLE_S))
+    return engine
+
+
+# ---------------- Streaming PPG ----------------
+# PPG bursts are buffered per device. Heart rate is estimated from the last
+# PPG_HR_WINDOW_S seconds and fed to the heartbeat model; the PPG MWL model
+# needs a whole recording (entry.recording_samples) and then runs at most every
+# PPG_PREDICT_EVERY_S seconds of new signal per device. Buffers grow with the
+# signal received; at most PPG_MAX_DEVICES are kept, idle ones for PPG_IDLE_S.
+PPG_HR_WINDOW_S = float(os.environ.get("PPG_HR_WINDOW_S", 10))
+PPG_PREDICT_EVERY_S = float(os.environ.get("PPG_PREDICT_EVERY_S", 10))
+PPG_MAX_DEVICES = int(os.environ.get("PPG_MAX_DEVICES", 1000))
+PPG_IDLE_S = float(os.environ.get("PPG_IDLE_S", 600))
+
+
+def ppg_recording_samples():
+    entry = registry.get("ppg")
+    return entry.recording_samples if entry else None
+
+
+def make_ppg_stream(samples):
+    return PPGStream(samples, hr_window_s=PPG_HR_WINDOW_S, predict_every_s=PPG_PREDICT_EVERY_S,
+                     max_devices=PPG_MAX_DEVICES, idle_s=PPG_IDLE_S)
+
+
+ppg_stream = make_ppg_stream(ppg_recording_samples())
+
+
+def current_ppg_stream():
+    """ppg_stream, rebuilt (buffers dropped) if a reload changed the PPG model's recording length."""
+    global ppg_stream
+    samples = ppg_recording_samples()
+    if ppg_stream.recording_samples != samples:
+        ppg_stream = make_ppg_stream(samples)
+    return ppg_stream
 
-# ---------------- Load Models & Scalers ----------------
-try:
-    emotion_model = joblib.load("../datasets/emotion/best_model_emotion.pkl")
-    emotion_scaler = joblib.load("../datasets/emotion/scaler_emotion.pkl")
-    print("✅ Loaded emotion model and scaler successfully.")
-except Exception as e:
-    print(f"❌ Failed to load emotion model/scaler: {e}")
-    emotion_model = None
-    emotion_scaler = None
-
-try:
-    mwl_model = joblib.load("../datasets/gsr/best_gsr_model.pkl")
-    print("✅ Loaded MWL model successfully.")
-except Exception as e:
-    print(f"❌ Failed to load MWL model: {e}")
-    mwl_model = None
 
 # ---------------- n8n Webhook ----------------
-N8N_WEBHOOK_URL = "http://localhost:5678/webhook/119c6b94-4113-4370-8aca-4172fa7c423e"
+N8N_WEBHOOK_URL = os.environ.get("N8N_WEBHOOK_URL", "http://localhost:5678/webhook/119c6b94-4113-4370-8aca-4172fa7c423e")
+N8N_OVERFLOW_PATH = os.environ.get("N8N_OVERFLOW_PATH")  # e.g. "n8n_spool.jsonl"; unset = drop on overflow
+
+# Readings are forwarded from a background thread in batches, so /data never waits on n8n.
+n8n_forwarder = WebhookForwarder(N8N_WEBHOOK_URL, overflow_path=N8N_OVERFLOW_PATH)
+
+# ---------------- Live Updates ----------------
+# Every new result is pushed to /stream subscribers (server-sent events), so
+# the dashboard no longer polls /latest. Idle streams only carry a comment
+# every SSE_KEEPALIVE_S seconds. Each Flask /stream holds a request thread,
+# so at most SSE_MAX_STREAMS per process (half the gthread threads by
+# default) are served here; the async server's /stream costs a coroutine and
+# is the one to point dashboards at in production.
+SSE_KEEPALIVE_S = float(os.environ.get("SSE_KEEPALIVE_S", 15))
+SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", max(1, int(os.environ.get("WEB_THREADS", 8)) // 2)))
+broadcaster = Broadcaster()
+
+# ---------------- Readiness & Shutdown ----------------
+# /ready passes once the READY_MODELS are in the registry and fails again as
+# soon as shutdown starts, so a load balancer stops routing to a draining worker.
+READY_MODELS = [m for m in os.environ.get("READY_MODELS", "emotion,mwl").split(",") if m]
+shutting_down = threading.Event()  # set when draining starts, before serving stops
+_flushed = threading.Event()
+
+
+def start_draining():
+    """Fail /ready from now on; in-flight requests still finish (gunicorn SIGTERM)."""
+    shutting_down.set()
+
 
-# ---------------- Latest Reading ----------------
-latest_reading = {
+def shutdown():
+    """Stop reporting ready and flush queued n8n payloads (gunicorn worker_exit / atexit)."""
+    start_draining()
+    if _flushed.is_set():
+        return
+    _flushed.set()
+    n8n_forwarder.close()
+    if timeseries is not None:
+        timeseries.close()
+
+
+atexit.register(shutdown)
+
+# ---------------- Per-device State ----------------
+# Latest result + bounded history per device (state_store.py). With
+# STATE_BACKEND=manager all workers share one store over a local socket.
+state_store = make_state_store()
+
+EMPTY_READING = {
     "gsr_value": None,
     "emotion": {"prediction": None, "confidence": None, "all_percentages": None, "timestamp": None},
-    "mwl": {"prediction": None, "confidence": None, "all_percentages": None, "timestamp": None}
+    "mwl": {"prediction": None, "confidence": None, "all_percentages": None, "timestamp": None},
+    "heart_rate": None,
+    "heartbeat_emotion": {"prediction": None, "confidence": None, "all_percentages": None, "timestamp": None},
+    "ppg_mwl": {"prediction": None, "confidence": None, "all_percentages": None, "timestamp": None}
 }
 
+
+# ---------------- Time-series Persistence ----------------
+# Every reading and its model outputs are appended to the time-partitioned
+# store (timeseries.py) from a background thread with group commit, so the
+# request path never waits on disk. TIMESERIES_DIR="" turns it off.
+timeseries = TimeSeriesStore(TIMESERIES_DIR) if TIMESERIES_DIR else None
+
+
+def record_readings(items):
+    """Store (device_id, reading) pairs: per-device state now, time-series store queued."""
+    state_store.update_many(items)
+    if timeseries is not None:
+        now = time.time()
+        for device_id, reading in items:
+            timeseries.append(flatten_reading(device_id, reading, now))
+
+
+# With STATE_BACKEND=manager every update also goes into the shared store's
+# change feed; each process relays that feed to its own subscribers (started
+# by the first /stream), so a dashboard sees the results of every worker.
+feed_relay = FeedRelay(broadcaster, state_store.changes, SSE_KEEPALIVE_S) if STATE_BACKEND == "manager" else None
+
+
+def publish_result(device_id, data):
+    """Push a new result to /stream subscribers (through the shared feed when there is one)."""
+    if feed_relay is None:
+        broadcaster.publish(device_id, data)
+
+
+def latest_for(device_id=None):
+    """Latest reading of device_id (default: the device that posted last) in the full layout, or None."""
+    latest = state_store.latest(device_id)
+    return {**EMPTY_READING, **latest} if latest else None
+
+
+# ---------------- Batched Inference ----------------
+def empty_result(timestamp):
+    return {"prediction": None, "confidence": None, "all_percentages": None, "timestamp": timestamp}
+
+
+def to_result(prediction, timestamp):
+    confidence = prediction["confidence"]
+    return {
+        "prediction": prediction["prediction"],
+        "confidence": round(confidence, 1) if confidence else None,
+        "all_percentages": prediction["all_percentages"],
+        "timestamp": timestamp
+    }
+
+
+def predict_emotion_batch(gsr_values, timestamps):
+    """Run the emotion scaler/model once over a stacked (n, 1) matrix."""
+    entry = registry.get("emotion")
+    if entry is None:
+        return [empty_result(ts) for ts in timestamps]
+    predictions = entry.predict(gsr_values, use_lut=USE_LUT)
+    return [to_result(p, ts) for p, ts in zip(predictions, timestamps)]
+
+
+def predict_mwl_batch(gsr_values, timestamps, window_features=None):
+    """
+    Run the MWL model once over the stacked readings. Rows with a window
+    feature vector use it; the rest fall back to the repeated-reading input.
+    """
+    entry = registry.get("mwl")
+    if entry is None:
+        return [empty_result(ts) for ts in timestamps]
+
+    # Vectors built for another model version's layout (mid-reload) use the fallback
+    predictions = [None] * len(timestamps)
+    window_rows = [i for i, f in enumerate(window_features or [])
+                   if f is not None and len(f) == entry.model.n_features_in_]
+    if window_rows:
+        start = time.perf_counter()
+        X = np.nan_to_num(np.vstack([window_features[i] for i in window_rows]))
+        built = time.perf_counter()
+        for i, p in zip(window_rows, predict_single_pass(entry.model, X, entry.labels)):
+            predictions[i] = p
+        entry.observe(start, built, len(window_rows))
+
+    other_rows = [i for i, p in enumerate(predictions) if p is None]
+    if other_rows:
+        fallback = entry.predict(gsr_values[other_rows], use_lut=USE_LUT)
+        for i, p in zip(other_rows, fallback):
+            predictions[i] = p
+
+    return [to_result(p, ts) for p, ts in zip(predictions, timestamps)]
+
+
+def update_window_features(device_id, reading):
+    """
+    Feed one reading into its device window; returns MWL features or None.
+    Raises ValueError when gsr_values does not hold one finite number per channel.
+    """
+    engine = mwl_feature_engine()
+    if engine is None:
+        return None
+    try:
+        return engine.update(device_id, reading.get('gsr_values', reading['gsr_value']))
+    except TypeError as e:
+        raise ValueError(str(e)) from e
+
+
+def predict_readings(readings):
+    """Batch callback: readings is a list of (gsr_value, timestamp, window_features) from concurrent /data requests."""
+    gsr_values = np.array([gsr for gsr, _, _ in readings])
+    timestamps = [ts for _, ts, _ in readings]
+    window_features = [features for _, _, features in readings]
+    return list(zip(predict_emotion_batch(gsr_values, timestamps),
+                    predict_mwl_batch(gsr_values, timestamps, window_features)))
+
+
+def predict_heart_rates(readings):
+    """Batch callback: readings is a list of (heart_rate, timestamp); one scaler + predict_proba pass."""
+    timestamps = [ts for _, ts in readings]
+    entry = registry.get("heartbeat")
+    if entry is None:
+        return [empty_result(ts) for ts in timestamps]
+    predictions = entry.predict(np.array([hr for hr, _ in readings]))
+    return [to_result(p, ts) for p, ts in zip(predictions, timestamps)]
+
+
+def predict_ppg_recordings(recordings):
+    """Batch callback: recordings is a list of (samples, timestamp) with a full recording window each."""
+    timestamps = [ts for _, ts in recordings]
+    entry = registry.get("ppg")
+    results = [empty_result(ts) for ts in timestamps]
+    # Recordings buffered for another model version's window length (mid-reload) are skipped
+    rows = [i for i, (samples, _) in enumerate(recordings)
+            if entry is not None and len(samples) == entry.recording_samples]
+    if rows:
+        for i, p in zip(rows, entry.predict(np.vstack([recordings[i][0] for i in rows]))):
+            results[i] = to_result(p, timestamps[i])
+    return results
+
+
+# ---------------- Micro-batching ----------------
+# Concurrent /data requests are queued for up to BATCH_MAX_WAIT_MS (or until
+# BATCH_MAX_SIZE readings are waiting) and answered by one predict_proba call.
+BATCH_MAX_SIZE = int(os.environ.get("BATCH_MAX_SIZE", 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get("BATCH_MAX_WAIT_MS", 5))
+
+inference_batcher = MicroBatcher(predict_readings, max_batch_size=BATCH_MAX_SIZE,
+                                 max_wait_ms=BATCH_MAX_WAIT_MS, name="inference-batcher")
+heartbeat_batcher = MicroBatcher(predict_heart_rates, max_batch_size=BATCH_MAX_SIZE,
+                                 max_wait_ms=BATCH_MAX_WAIT_MS, name="heartbeat-batcher")
+ppg_batcher = MicroBatcher(predict_ppg_recordings, max_batch_size=BATCH_MAX_SIZE,
+                           max_wait_ms=BATCH_MAX_WAIT_MS, name="ppg-batcher")
+
+
 # ---------------- Combined Prediction ----------------
 @app.route('/data', methods=['POST'])
 def predict_data():
-    global latest_reading
+    stages = StageTimer("/data")
     try:
         data = request.get_json()
         if not data or 'gsr_value' not in data:
             return jsonify({"status": "error", "message": "Invalid or missing data"}), 400
 
-        gsr_value = float(data['gsr_value'])
+        try:
+            gsr_value = float(data['gsr_value'])
+        except (TypeError, ValueError):
+            gsr_value = float("nan")
+        if not math.isfinite(gsr_value):
+            return jsonify({"status": "error", "message": "gsr_value must be a finite number"}), 400
+        device_id = data.get('device_id', 'default')
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        stages.mark("parse")
 
-        # ---------- Emotion Prediction ----------
-        emotion_result = {
-            "prediction": None,
-            "confidence": None,
-            "all_percentages": None,
-            "timestamp": timestamp
-        }
+        # ---------- Emotion & MWL Prediction ----------
+        try:
+            window_features = update_window_features(device_id, data)
+        except ValueError as e:
+            return jsonify({"status": "error", "message": f"Invalid gsr_values: {e}"}), 400
+        stages.mark("features")
+        emotion_result, mwl_result = inference_batcher.submit((gsr_value, timestamp, window_features))
+        stages.mark("inference")
 
-        if emotion_model and emotion_scaler:
-            input_data = np.array([[gsr_value]])
-            try:
-                input_scaled = emotion_scaler.transform(input_data)
-            except:
-                expected_features = getattr(emotion_scaler, 'n_features_in_', 1)
-                input_data = np.array([[gsr_value] * expected_features])
-                input_scaled = emotion_scaler.transform(input_data)
-
-            pred_val = emotion_model.predict(input_scaled)[0]
-            pred_label = str(pred_val)
-
-            all_percentages = None
-            confidence_val = None
-
-            if hasattr(emotion_model, "predict_proba"):
-                proba = emotion_model.predict_proba(input_scaled)[0]
-                all_percentages = {
-                    str(cls): round(p * 100, 1)
-                    for cls, p in zip(emotion_model.classes_, proba)
-                }
-                confidence_val = max(proba) * 100
-
-            emotion_result.update({
-                "prediction": pred_label,
-                "confidence": round(confidence_val, 1) if confidence_val else None,
-                "all_percentages": all_percentages
-            })
-
-        # ---------- MWL Prediction ----------
-        mwl_result = {
-            "prediction": None,
-            "confidence": None,
-            "all_percentages": None,
-            "timestamp": timestamp
+        # ---------- Save Latest ----------
+        reading = {"gsr_value": gsr_value, "emotion": emotion_result, "mwl": mwl_result}
+        record_readings([(device_id, reading)])
+        stages.mark("record")
+        publish_result(device_id, {"device_id": device_id, **reading})
+        stages.mark("publish")
+
+        # ---------- Send to n8n (queued, non-blocking) ----------
+        payload = {
+            "timestamp": timestamp,
+            "gsr_value": gsr_value,
+            "emotion_prediction": emotion_result["prediction"],
+            "emotion_confidence": emotion_result["confidence"],
+            "mwl_prediction": mwl_result["prediction"],
+            "mwl_confidence": mwl_result["confidence"]
         }
+        if not n8n_forwarder.send(payload):
+            log.warning("n8n queue full, payload spooled/dropped", extra={"data": {"device_id": device_id}})
+        stages.mark("forward")
+
+        # ---------- Log (sampled) ----------
+        log_sampled(log, "GSR reading", device_id=device_id, gsr_value=gsr_value,
+                    emotion=emotion_result["all_percentages"], mwl=mwl_result["all_percentages"])
+
+        response = jsonify(latest_for(device_id))
+        stages.mark("serialize")
+        return response, 200
 
-        if mwl_model:
-            input_data = np.array([[gsr_value] * mwl_model.n_features_in_])
-            pred_val = mwl_model.predict(input_data)[0]
-            pred_label = "High MWL" if pred_val == 1 else "Low MWL"
+    except Exception as e:
+        log.exception("Server error", extra={"data": {"path": request.path}})
+        return jsonify({"status": "error", "message": str(e)}), 500
 
-            all_percentages = None
-            confidence_val = None
 
-            if hasattr(mwl_model, "predict_proba"):
-                proba = mwl_model.predict_proba(input_data)[0]
-                all_percentages = {
-                    "Low MWL": round(proba[0] * 100, 1),
-                    "High MWL": round(proba[1] * 100, 1)
-                }
-                confidence_val = all_percentages[pred_label]
+@app.route('/data/batch', methods=['POST'])
+def predict_data_batch():
+    """
+    Accept many readings in one request, e.g.
+    {"device_id": "esp32-1", "readings": [{"gsr_value": 1.2, "timestamp": "..."}, ...]}
+    Each reading may carry its own device_id; the top-level one is the default.
+    """
+    stages = StageTimer("/data/batch")
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('readings'), list) or not data['readings']:
+            return jsonify({"status": "error", "message": "Invalid or missing readings"}), 400
+
+        default_device = data.get('device_id')
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            gsr_values = np.array([float(r['gsr_value']) for r in data['readings']])
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Every reading needs a numeric gsr_value"}), 400
+        if not np.isfinite(gsr_values).all():
+            return jsonify({"status": "error", "message": "gsr_value must be a finite number"}), 400
+        device_ids = [r.get('device_id', default_device or 'default') for r in data['readings']]
+        timestamps = [r.get('timestamp') or now for r in data['readings']]
+        stages.mark("parse")
+
+        try:
+            window_features = [update_window_features(device_id, r)
+                               for device_id, r in zip(device_ids, data['readings'])]
+        except ValueError as e:
+            return jsonify({"status": "error", "message": f"Invalid gsr_values: {e}"}), 400
+        stages.mark("features")
 
-            mwl_result.update({
-                "prediction": pred_label,
-                "confidence": confidence_val,
-                "all_percentages": all_percentages
-            })
+        emotion_results = predict_emotion_batch(gsr_values, timestamps)
+        stages.mark("emotion")
+        mwl_results = predict_mwl_batch(gsr_values, timestamps, window_features)
+        stages.mark("mwl")
+
+        results = [
+            {"device_id": device_id, "gsr_value": float(gsr_value), "emotion": emotion, "mwl": mwl}
+            for device_id, gsr_value, emotion, mwl in zip(device_ids, gsr_values, emotion_results, mwl_results)
+        ]
 
         # ---------- Save Latest ----------
-        latest_reading = {
-            "gsr_value": gsr_value,
-            "emotion": emotion_result,
-            "mwl": mwl_result
-        }
+        record_readings([(r["device_id"], {"gsr_value": r["gsr_value"], "emotion": r["emotion"], "mwl": r["mwl"]})
+                         for r in results])
+        stages.mark("record")
+        for r in results:
+            publish_result(r["device_id"], r)
+        stages.mark("publish")
+
+        # ---------- Send to n8n (queued, non-blocking) ----------
+        payloads = [{
+            "device_id": r["device_id"],
+            "timestamp": r["emotion"]["timestamp"],
+            "gsr_value": r["gsr_value"],
+            "emotion_prediction": r["emotion"]["prediction"],
+            "emotion_confidence": r["emotion"]["confidence"],
+            "mwl_prediction": r["mwl"]["prediction"],
+            "mwl_confidence": r["mwl"]["confidence"]
+        } for r in results]
+        if not n8n_forwarder.send_many(payloads):
+            log.warning("n8n queue full, payloads spooled/dropped", extra={"data": {"count": len(payloads)}})
+        stages.mark("forward")
+
+        log_sampled(log, "GSR batch", count=len(results), devices=len(set(device_ids)))
+
+        response = jsonify({"status": "success", "count": len(results), "results": results})
+        stages.mark("serialize")
+        return response, 200
+
+    except Exception as e:
+        log.exception("Server error", extra={"data": {"path": request.path}})
+        return jsonify({"status": "error", "message": str(e)}), 500
+
 
-        # ---------- Send to n8n ----------
+# ---------------- Heart Rate ----------------
+@app.route('/heart_rate', methods=['POST'])
+def predict_heart_rate():
+    """
+    Heart-rate readings (bpm) for the heartbeat emotion model, one or many:
+    {"device_id": "band-1", "heart_rate": 72}
+    {"device_id": "band-1", "readings": [{"heart_rate": 72, "timestamp": "..."}, ...]}
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"status": "error", "message": "Invalid or missing data"}), 400
+
+        device_id = data.get('device_id', 'default')
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        readings = data['readings'] if isinstance(data.get('readings'), list) else [data]
+        try:
+            heart_rates = [float(r['heart_rate']) for r in readings]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Every reading needs a numeric heart_rate"}), 400
+        if not all(math.isfinite(hr) for hr in heart_rates):
+            return jsonify({"status": "error", "message": "heart_rate must be a finite number"}), 400
+        if not heart_rates:
+            return jsonify({"status": "error", "message": "Invalid or missing readings"}), 400
+        timestamps = [r.get('timestamp') or now for r in readings]
+
+        # Queued together, so they share a batch with concurrent requests
+        futures = [heartbeat_batcher.submit_async((hr, ts)) for hr, ts in zip(heart_rates, timestamps)]
+        emotions = [future.result(timeout=SUBMIT_TIMEOUT_S) for future in futures]
+        results = [{"heart_rate": hr, "emotion": emotion} for hr, emotion in zip(heart_rates, emotions)]
+
+        # ---------- Save Latest ----------
+        record_readings([(device_id, {"heart_rate": hr, "heartbeat_emotion": emotion})
+                         for hr, emotion in zip(heart_rates, emotions)])
+        publish_result(device_id, {"device_id": device_id, "heart_rate": heart_rates[-1],
+                                        "heartbeat_emotion": emotions[-1]})
+
+        # ---------- Send to n8n (queued, non-blocking) ----------
+        payloads = [{
+            "device_id": device_id,
+            "timestamp": r["emotion"]["timestamp"],
+            "heart_rate": r["heart_rate"],
+            "heartbeat_emotion_prediction": r["emotion"]["prediction"],
+            "heartbeat_emotion_confidence": r["emotion"]["confidence"]
+        } for r in results]
+        if not n8n_forwarder.send_many(payloads):
+            log.warning("n8n queue full, payloads spooled/dropped", extra={"data": {"count": len(payloads)}})
+
+        log_sampled(log, "Heart rate", device_id=device_id, heart_rate=heart_rates[-1],
+                    emotion=emotions[-1]["prediction"], count=len(results))
+
+        return jsonify({"status": "success", "device_id": device_id, "count": len(results), "results": results}), 200
+
+    except Exception as e:
+        log.exception("Server error", extra={"data": {"path": request.path}})
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# ---------------- PPG Bursts ----------------
+@app.route('/ppg', methods=['POST'])
+def ingest_ppg():
+    """
+    A burst of raw PPG samples at 256 Hz:
+    {"device_id": "esp32-1", "samples": [512.0, 515.3, ...]}
+    Returns the estimated heart rate and its heartbeat-model emotion once
+    PPG_HR_WINDOW_S seconds are buffered, and the PPG MWL prediction once a
+    whole recording window is buffered.
+    """
+    try:
+        data = request.get_json()
+        if not data or not isinstance(data.get('samples'), list) or not data['samples']:
+            return jsonify({"status": "error", "message": "Invalid or missing samples"}), 400
+        stream = current_ppg_stream()
         try:
-            payload = {
-                "timestamp": timestamp,
-                "gsr_value": gsr_value,
-                "emotion_prediction": emotion_result["prediction"],
-                "emotion_confidence": emotion_result["confidence"],
-                "mwl_prediction": mwl_result["prediction"],
-                "mwl_confidence": mwl_result["confidence"]
-            }
-
-            requests.post(N8N_WEBHOOK_URL, json=payload, timeout=3)
-            print("📤 Sent data to n8n")
-
-        except Exception as e:
-            print("⚠️ Failed to send to n8n:", e)
-
-        # ---------- Log ----------
-        print(f"[{timestamp}] 📡 GSR: {gsr_value:.3f}")
-        if emotion_result["all_percentages"]:
-            print("🧠 Emotion:", emotion_result["all_percentages"])
-        if mwl_result["all_percentages"]:
-            print("💼 MWL:", mwl_result["all_percentages"])
-
-        return jsonify(latest_reading), 200
+            samples = np.asarray(data['samples'], dtype=float)
+            fs = float(data['fs']) if 'fs' in data else stream.fs
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Samples and fs must be numeric"}), 400
+        if fs != stream.fs:
+            return jsonify({"status": "error", "message": f"PPG must be sampled at {stream.fs} Hz"}), 400
+        if samples.ndim != 1 or not np.isfinite(samples).all():
+            return jsonify({"status": "error", "message": "Samples must be a flat list of finite numbers"}), 400
+
+        device_id = data.get('device_id', 'default')
+        timestamp = data.get('timestamp') or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        state = stream.push(device_id, samples)
+        heart_rate = state["heart_rate"]
+        emotion_future = heartbeat_batcher.submit_async((heart_rate, timestamp)) if heart_rate else None
+        ppg_future = ppg_batcher.submit_async((state["recording"], timestamp)) if state["recording"] is not None else None
+        heartbeat_emotion = emotion_future.result(timeout=SUBMIT_TIMEOUT_S) if emotion_future else None
+        ppg_mwl = ppg_future.result(timeout=SUBMIT_TIMEOUT_S) if ppg_future else None
+
+        # ---------- Save Latest ----------
+        updates = {}
+        if heartbeat_emotion:
+            updates.update(heart_rate=round(heart_rate, 1), heartbeat_emotion=heartbeat_emotion)
+        if ppg_mwl:
+            updates["ppg_mwl"] = ppg_mwl
+        if updates:
+            record_readings([(device_id, updates)])
+            publish_result(device_id, {"device_id": device_id, **updates})
+
+            # ---------- Send to n8n (queued, non-blocking) ----------
+            payload = {"device_id": device_id, "timestamp": timestamp}
+            if heartbeat_emotion:
+                payload.update(heart_rate=round(heart_rate, 1),
+                               heartbeat_emotion_prediction=heartbeat_emotion["prediction"],
+                               heartbeat_emotion_confidence=heartbeat_emotion["confidence"])
+            if ppg_mwl:
+                payload.update(ppg_mwl_prediction=ppg_mwl["prediction"], ppg_mwl_confidence=ppg_mwl["confidence"])
+            if not n8n_forwarder.send(payload):
+                log.warning("n8n queue full, payload spooled/dropped", extra={"data": {"device_id": device_id}})
+
+        log_sampled(log, "PPG burst", device_id=device_id, samples=len(samples), buffered=state["buffered"],
+                    heart_rate=round(heart_rate, 1) if heart_rate else None,
+                    ppg_mwl=ppg_mwl["prediction"] if ppg_mwl else None)
+
+        return jsonify({
+            "status": "success",
+            "device_id": device_id,
+            "buffered": state["buffered"],
+            "ppg_progress": stream.progress(device_id),
+            "heart_rate": round(heart_rate, 1) if heart_rate else None,
+            "heartbeat_emotion": heartbeat_emotion,
+            "ppg_mwl": ppg_mwl
+        }), 200
 
     except Exception as e:
-        print("⚠️ Server Error:\n", traceback.format_exc())
+        log.exception("Server error", extra={"data": {"path": request.path}})
         return jsonify({"status": "error", "message": str(e)}), 500
 
 
-# ---------------- Latest Endpoint ----------------
+# ---------------- Request Metrics ----------------
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+
+@app.after_request
+def count_request(response):
+    # The route pattern (not the raw path) keeps the label set bounded
+    endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+    if response.status_code >= 500:
+        REQUEST_ERRORS.inc(endpoint=endpoint)
+    start = g.get("request_start")
+    if start is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - start, endpoint=endpoint)
+    return response
+
+
+# ---------------- Models ----------------
+@app.before_request
+def refresh_models():
+    # A changed models.json is picked up by every worker within registry.check_interval
+    registry.maybe_reload()
+
+
+@app.route('/models', methods=['GET'])
+def list_models():
+    return jsonify(registry.describe()), 200
+
+
+@app.route('/models/reload', methods=['POST'])
+def reload_models():
+    """Re-read the manifest now; unchanged pickles are reused."""
+    served = registry.load()
+    return jsonify({"status": "success", "models": served, "errors": registry.errors}), 200
+
+
+@app.route('/predict/<name>', methods=['POST'])
+@app.route('/predict/<name>/<version>', methods=['POST'])
+def predict_model(name, version=None):
+    """
+    Run one registered model (default version unless given) over raw inputs:
+    {"inputs": [1.23, 1.25]}            emotion / mwl: GSR readings
+    {"inputs": [72, 80]}                heartbeat: heart rates (bpm)
+    {"inputs": [[512.0, ...], ...]}     ppg: whole recordings
+    """
+    try:
+        entry = registry.get(name, version)
+        if entry is None:
+            return jsonify({"status": "error", "message": f"Unknown model {name}" + (f" v{version}" if version else "")}), 404
+
+        data = request.get_json()
+        if not data or not isinstance(data.get('inputs'), list) or not data['inputs']:
+            return jsonify({"status": "error", "message": "Invalid or missing inputs"}), 400
+        try:
+            inputs = np.asarray(data['inputs'], dtype=float)
+        except (TypeError, ValueError):
+            return jsonify({"status": "error", "message": "Inputs must be numeric"}), 400
+        error = entry.input_error(inputs)
+        if error:
+            return jsonify({"status": "error", "message": error}), 400
+
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        predictions = entry.predict(inputs, use_lut=USE_LUT and entry.kind in ("emotion", "mwl"))
+        return jsonify({
+            "status": "success",
+            "model": entry.name,
+            "version": entry.version,
+            "results": [to_result(p, timestamp) for p in predictions]
+        }), 200
+
+    except Exception as e:
+        log.exception("Server error", extra={"data": {"path": request.path}})
+        return jsonify({"status": "error", "message": str(e)}), 500
+
+
+# ---------------- Readiness ----------------
+@app.route('/ready', methods=['GET'])
+def get_ready():
+    missing = [name for name in READY_MODELS if registry.get(name) is None]
+    if missing or shutting_down.is_set():
+        return jsonify({"status": "not ready", "missing_models": missing,
+                        "shutting_down": shutting_down.is_set()}), 503
+    return jsonify({"status": "ready", "pid": os.getpid(),
+                    "models": {name: registry.get(name).version for name in registry.names()}}), 200
+
+
+# ---------------- Latest / History ----------------
 @app.route('/latest', methods=['GET'])
 def get_latest():
-    if latest_reading["gsr_value"] is None:
+    """Latest reading of ?device=<id> (default: the device that posted last)."""
+    latest = latest_for(request.args.get('device'))
+    if latest is None:
         return jsonify({"status": "error", "message": "No data yet"}), 404
-    return jsonify(latest_reading), 200
+    return jsonify(latest), 200
+
+
+@app.route('/history', methods=['GET'])
+def get_history():
+    """
+    Readings of ?device=<id> newer than ?since= (epoch seconds or
+    "YYYY-MM-DD HH:MM:SS"; default: everything kept), at most ?limit=, as columns.
+    """
+    device_id = request.args.get('device')
+    if not device_id:
+        return jsonify({"status": "error", "message": "device is required"}), 400
+    try:
+        since = parse_since(request.args.get('since'))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid since or limit"}), 400
+    history = state_store.history(device_id, since, limit)
+    if history is None:
+        return jsonify({"status": "error", "message": f"No data for device {device_id}"}), 404
+    return jsonify(history), 200
+
+
+@app.route('/archive', methods=['GET'])
+def get_archive():
+    """
+    Stored readings of ?device=<id> between ?start= and ?end= (epoch seconds
+    or "YYYY-MM-DD HH:MM:SS"), at most the newest ?limit=, as columns.
+    Unlike /history this reads the time-series store, so it survives restarts.
+    """
+    if timeseries is None:
+        return jsonify({"status": "error", "message": "Time-series store disabled"}), 404
+    device_id = request.args.get('device')
+    if not device_id:
+        return jsonify({"status": "error", "message": "device is required"}), 400
+    try:
+        start = parse_since(request.args.get('start'))
+        end = parse_since(request.args.get('end'))
+        limit = int(request.args['limit']) if request.args.get('limit') else None
+    except ValueError:
+        return jsonify({"status": "error", "message": "Invalid start, end or limit"}), 400
+    records = timeseries.query(device_id, start, end, limit)
+    return jsonify({"device_id": device_id, "count": len(records), "columns": to_columns(records)}), 200
+
+
+@app.route('/metrics/state', methods=['GET'])
+def get_state_metrics():
+    stats = state_store.stats()
+    stats["ppg_buffers"] = ppg_stream.buffers.stats()
+    if timeseries is not None:
+        stats["timeseries"] = timeseries.stats()
+    return jsonify(stats), 200
+
+
+# ---------------- Live Stream ----------------
+@app.route('/stream', methods=['GET'])
+def stream():
+    """
+    Server-sent events: one "reading" event per new result, optionally only
+    for ?device=<id>. The stream starts with the latest reading (of that
+    device). Each event carries the changed reading keys plus device_id.
+    Answers 503 once SSE_MAX_STREAMS streams hold this process's threads.
+    """
+    device_id = request.args.get('device')
+    if broadcaster.stats()["subscribers"] >= SSE_MAX_STREAMS:
+        message = "Too many open streams; use the async server's /stream"
+        return jsonify({"status": "error", "message": message}), 503, {"Retry-After": str(int(SSE_KEEPALIVE_S))}
+    if feed_relay is not None:
+        feed_relay.ensure_running()
+    subscription = broadcaster.subscribe(device_id)
+
+    def events():
+        try:
+            yield b"retry: 3000\n\n"
+            latest = latest_for(device_id)
+            if latest is not None:
+                yield sse_frame(latest, "reading")
+            while True:
+                frame = subscription.get(SSE_KEEPALIVE_S)
+                if frame is CLOSED:
+                    break  # too slow; the client reconnects
+                yield frame if frame is not None else b": keepalive\n\n"
+        finally:
+            broadcaster.unsubscribe(subscription)
+
+    return Response(events(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/metrics/stream', methods=['GET'])
+def get_stream_metrics():
+    stats = broadcaster.stats()
+    if feed_relay is not None:
+        stats.update(feed_relay.stats())
+    return jsonify({**stats, "max_streams": SSE_MAX_STREAMS}), 200
+
+
+# ---------------- Batcher / Forwarder Metrics ----------------
+@app.route('/metrics/batcher', methods=['GET'])
+def get_batcher_metrics():
+    """GSR batcher stats at the top level (as before), heartbeat and PPG batchers by name."""
+    stats = inference_batcher.stats()
+    stats["heartbeat"] = heartbeat_batcher.stats()
+    stats["ppg"] = ppg_batcher.stats()
+    return jsonify(stats), 200
+
+
+@app.route('/metrics/n8n', methods=['GET'])
+def get_n8n_metrics():
+    return jsonify(n8n_forwarder.stats()), 200
+
+
+@app.route('/metrics/logging', methods=['GET'])
+def get_logging_metrics():
+    return jsonify(logging_stats()), 200
+
+
+# ---------------- Prometheus ----------------
+# Queue depths and the running totals the components already keep are read
+# at scrape time; only the request/stage/model timings are recorded inline.
+BATCHERS = {"inference": inference_batcher, "heartbeat": heartbeat_batcher, "ppg": ppg_batcher}
+
+
+def queue_depths():
+    depths = [({"queue": f"{name}_batcher"}, b.queue_depth()) for name, b in BATCHERS.items()]
+    depths.append(({"queue": "n8n"}, n8n_forwarder.queue_depth()))
+    depths.append(({"queue": "log"}, logging_stats()["queue_depth"]))
+    if timeseries is not None:
+        depths.append(({"queue": "timeseries"}, timeseries.stats()["queue_depth"]))
+    return depths
+
+
+metrics.gauge("queue_depth", "Items waiting in each background queue", ["queue"], queue_depths)
+metrics.gauge("batcher_batches_total", "Batches run per micro-batcher", ["batcher"],
+              lambda: [({"batcher": name}, b.batches) for name, b in BATCHERS.items()], kind="counter")
+metrics.gauge("batcher_items_total", "Items predicted per micro-batcher", ["batcher"],
+              lambda: [({"batcher": name}, b.items) for name, b in BATCHERS.items()], kind="counter")
+metrics.gauge("n8n_payloads_total", "n8n payloads by outcome", ["outcome"],
+              lambda: [({"outcome": k}, v) for k, v in n8n_forwarder.stats().items()
+                       if k in ("sent", "dropped", "spooled", "replayed")], kind="counter")
+metrics.gauge("n8n_failed_attempts_total", "Failed n8n POST attempts", (),
+              lambda: n8n_forwarder.failed_attempts, kind="counter")
+metrics.gauge("sse_subscribers", "Open /stream subscriptions", (), lambda: broadcaster.stats()["subscribers"])
+metrics.gauge("log_records_skipped_total", "Log records not written, by reason", ["reason"],
+              lambda: [({"reason": k}, logging_stats()[k]) for k in ("dropped", "rate_limited", "sampled_out")],
+              kind="counter")
+if timeseries is not None:
+    metrics.gauge("timeseries_records_total", "Time-series records by outcome", ["outcome"],
+                  lambda: [({"outcome": k}, timeseries.stats()[k]) for k in ("written", "dropped")], kind="counter")
+    metrics.gauge("timeseries_fsyncs_total", "fsync() calls by the time-series writer", (),
+                  lambda: timeseries.fsyncs, kind="counter")
+
+
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    return Response(metrics.render(), content_type=CONTENT_TYPE)
+
+
+# ---------------- Profiling (opt-in) ----------------
+# PROFILING_ENABLED=1 adds the /admin/profile routes: a time-bounded sampling
+# profile of every thread, and cProfile on every Nth request (PROFILE_EVERY_N
+# or POST /admin/profile/requests). Both write collapsed stacks for flamegraphs.
+request_profiler = RequestProfiler()
+
+if PROFILING_ENABLED:
+    @app.before_request
+    def start_request_profile():
+        g.profile = request_profiler.start()
+
+    @app.teardown_request
+    def finish_request_profile(exc):
+        profile = g.pop("profile", None)
+        if profile is not None:
+            request_profiler.finish(profile)
+
+    @app.route('/admin/profile', methods=['POST'])
+    def sample_profile():
+        """
+        Sample all threads for ?seconds= (default PROFILE_SECONDS) every
+        ?interval_ms=; ?idle=0 leaves out threads parked on a lock or socket.
+        Blocks until done.
+        """
+        try:
+            seconds = float(request.args.get('seconds', PROFILE_SECONDS))
+            interval_ms = float(request.args.get('interval_ms', PROFILE_INTERVAL_MS))
+        except ValueError:
+            return jsonify({"status": "error", "message": "seconds and interval_ms must be numeric"}), 400
+        try:
+            result = profile_to_file(seconds, interval_ms, request.args.get('idle', '1') != '0')
+        except RuntimeError as e:
+            return jsonify({"status": "error", "message": str(e)}), 409
+        log.info("Sampling profile written", extra={"data": {"path": result["path"], "samples": result["samples"]}})
+        return jsonify({"status": "success", "pid": os.getpid(), **result}), 200
+
+    @app.route('/admin/profile/requests', methods=['GET', 'POST'])
+    def request_profile_settings():
+        """GET: status. POST {"every": N}: cProfile every Nth request from now on (0 = off)."""
+        if request.method == 'POST':
+            data = request.get_json(silent=True) or {}
+            try:
+                request_profiler.set_every(data.get('every', 0))
+            except (TypeError, ValueError):
+                return jsonify({"status": "error", "message": "every must be an integer"}), 400
+        return jsonify({"pid": os.getpid(), **request_profiler.stats()}), 200
+
+    @app.route('/admin/profile/requests/dump', methods=['POST'])
+    def dump_request_profile():
+        """Write the requests profiled so far (.prof and .folded) and start a new aggregate."""
+        result = request_profiler.dump()
+        if result is None:
+            return jsonify({"status": "error", "message": "No requests profiled yet"}), 404
+        return jsonify({"status": "success", "pid": os.getpid(), **result}), 200
 
 
 # ---------------- Run Server ----------------
+# Development server only; in production run the gunicorn workers instead:
+#     gunicorn -c gunicorn.conf.py wsgi:app
 if __name__ == '__main__':
     print("🚀 Flask server running on http://localhost:5000/data")
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    if PROFILING_ENABLED:
+        install_signal_handler(log=log)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG", "0") == "1")
@@ -0,0 +1,195 @@
+"""
+In-process metrics in the Prometheus text exposition format (GET /metrics).
+
+Counters and histograms are plain dicts of per-label-set values behind one
+lock per metric; timing uses time.perf_counter() (monotonic), so an
+observation costs about a microsecond and can stay on in production.
+Gauges are callbacks evaluated at scrape time, which is how the queue depths
+of the batchers, the n8n forwarder, the time-series writer and the log queue
+are read without touching their hot paths.
+
+    REQUESTS.inc(endpoint="/data", method="POST", status=200)
+    stages = StageTimer("/data"); ...; stages.mark("parse"); ...; stages.mark("inference")
+    with MODEL_SECONDS.time(model="mwl", version="1", stage="predict"):
+        ...
+    metrics.gauge("queue_depth", "Items waiting", ["queue"], lambda: [({"queue": "n8n"}, q.qsize())])
+
+Every process keeps its own values: under gunicorn a scrape is answered by
+whichever worker takes it, so scrape each worker (or run one) for exact totals.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; fine-grained at the low end, where the hot-path stages live
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(n, "") for n in self.labelnames)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            row = self._values.get(key)
+            if row is None:
+                row = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            row[i] += 1
+            row[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = {key: list(row) for key, row in self._values.items()}
+        for key, row in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), row):
+                cumulative += count
+                yield f"{self.name}_bucket{_labels(self.labelnames, key, [('le', _number(bound))])} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {_number(row[-1])}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {cumulative}"
+
+
+class Gauge:
+    """
+    Read at scrape time: fn() returns a number, or a list of ({label: value}, number).
+    kind="counter" exposes a running total another object already keeps.
+    """
+
+    def __init__(self, name, help, labelnames, fn, kind="gauge"):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+        self.kind = kind
+
+    def samples(self):
+        values = self.fn()
+        if not isinstance(values, list):
+            values = [({}, values)]
+        for labels, value in values:
+            if value is not None:
+                key = tuple(labels.get(n, "") for n in self.labelnames)
+                yield f"{self.name}{_labels(self.labelnames, key)} {_number(value)}"
+
+
+class StageTimer:
+    """Split one request into consecutive stages: mark("parse") observes the time since the previous mark."""
+
+    def __init__(self, endpoint, histogram=None):
+        self.endpoint = endpoint
+        self.histogram = histogram or STAGE_SECONDS
+        self.last = time.perf_counter()
+
+    def mark(self, stage):
+        now = time.perf_counter()
+        self.histogram.observe(now - self.last, endpoint=self.endpoint, stage=stage)
+        self.last = now
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None and not isinstance(metric, Gauge):
+                return existing  # module re-imported (e.g. __main__ and main)
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name, help, labelnames=(), fn=None, kind="gauge"):
+        return self._add(Gauge(name, help, labelnames, fn, kind))
+
+    def render(self):
+        """All metrics in the Prometheus text format (version 0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            try:
+                lines.extend(metric.samples())
+            except Exception:
+                pass  # a failing gauge callback must not break the scrape
+        return "\n".join(lines) + "\n"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+metrics = MetricsRegistry()
+
+# ---------------- Shared Metrics ----------------
+REQUESTS = metrics.counter("http_requests_total", "Requests by endpoint, method and status", ["endpoint", "method", "status"])
+REQUEST_ERRORS = metrics.counter("http_request_errors_total", "Requests that ended in a server error", ["endpoint"])
+REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "Request handling time", ["endpoint"])
+STAGE_SECONDS = metrics.histogram("stage_duration_seconds", "Time per request stage", ["endpoint", "stage"])
+MODEL_SECONDS = metrics.histogram("model_stage_duration_seconds", "Time per model batch and stage (transform, predict)",
+                                  ["model", "version", "stage"])
+MODEL_ROWS = metrics.counter("model_predictions_total", "Rows predicted", ["model", "version"])
+MODEL_ERRORS = metrics.counter("model_errors_total", "Failed model batches", ["model", "version"])
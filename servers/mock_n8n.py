@@ -0,0 +1,58 @@
+"""
+Local stand-in for the n8n webhook, for exercising the forwarder without n8n.
+
+    python mock_n8n.py                      # accept everything on :5678
+    FAIL_RATE=0.5 DELAY_S=1 python mock_n8n.py
+
+Then point main.py at it (the default N8N_WEBHOOK_URL already targets
+localhost:5678) and watch GET /status here and GET /metrics/n8n on main.py.
+"""
+from flask import Flask, request, jsonify
+import os
+import random
+import threading
+import time
+
+app = Flask(__name__)
+
+FAIL_RATE = float(os.environ.get("FAIL_RATE", 0))  # share of requests answered with 503
+DELAY_S = float(os.environ.get("DELAY_S", 0))      # simulated slow workflow
+
+lock = threading.Lock()
+received = {
+    "requests": 0,
+    "payloads": 0,
+    "failed": 0,
+    "last_batch": None
+}
+
+
+@app.route("/webhook/<hook_id>", methods=["POST"])
+def webhook(hook_id):
+    if DELAY_S:
+        time.sleep(DELAY_S)
+
+    if random.random() < FAIL_RATE:
+        with lock:
+            received["failed"] += 1
+        return jsonify({"status": "error", "message": "simulated failure"}), 503
+
+    body = request.get_json(silent=True)
+    batch = body if isinstance(body, list) else [body]
+    with lock:
+        received["requests"] += 1
+        received["payloads"] += len(batch)
+        received["last_batch"] = batch
+    print(f"📥 {hook_id}: {len(batch)} payload(s)")
+    return jsonify({"status": "success", "received": len(batch)}), 200
+
+
+@app.route("/status", methods=["GET"])
+def status():
+    with lock:
+        return jsonify(received)
+
+
+if __name__ == "__main__":
+    print(f"🚀 Mock n8n webhook on http://localhost:5678/webhook/<id> (fail rate {FAIL_RATE}, delay {DELAY_S}s)")
+    app.run(host="0.0.0.0", port=5678, threaded=True)
@@ -1,47 +1,33 @@
 # MWL SERVER
-from flask import Flask, request, jsonify
+# Thin wrapper over the shared model registry: main.py mounts this route at
+# /mwl (one process, one copy of the model); run this file directly for the
+# old standalone server on port 5000.
+from flask import Flask, Blueprint, request, jsonify
 from datetime import datetime
-import joblib
-import numpy as np
 from flask_cors import CORS
+from registry import registry
+from server_log import setup_logging, get_logger, log_sampled
 
-app = Flask(__name__)
-CORS(app)
-# Load saved model and scaler
-try:
-    model = joblib.load("../datasets/gsr/best_gsr_model.pkl")
-    print("✅ Loaded trained GSR model successfully.")
-except Exception as e:
-    print(f"❌ Failed to load model: {e}")
-    model = None
+mwl_api = Blueprint("mwl", __name__)
+log = get_logger("mwl")
 
-@app.route('/data', methods=['POST'])
+@mwl_api.route('/data', methods=['POST'])
 def receive_data():
     data = request.get_json()
     if data and 'gsr_value' in data:
         gsr_value = float(data['gsr_value'])
         timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
 
-        if model is not None:
-            # Expand the single GSR voltage to match the number of features
-            input_data = np.array([[gsr_value] * model.n_features_in_])
+        entry = registry.get("mwl", request.args.get("version"))
+        if entry is not None:
             try:
-                # Predict
-                prediction = model.predict(input_data)[0]
-                pred_label = "High MWL" if prediction == 1 else "Low MWL"
-
-                # Get probability/confidence
-                if hasattr(model, "predict_proba"):
-                    proba = model.predict_proba(input_data)[0]
-                    confidence = proba[prediction] * 100
-                else:
-                    confidence = None
+                # Predict label + confidence from a single predict_proba pass
+                result = entry.predict([gsr_value])[0]
+                pred_label = result["prediction"]
+                confidence = result["confidence"]
 
-                # Print nicely
-                if confidence:
-                    print(f"[{timestamp}] 📡 GSR: {gsr_value:.3f} V → 🧠 {pred_label} ({confidence:.1f}%)")
-                else:
-                    print(f"[{timestamp}] 📡 GSR: {gsr_value:.3f} V → 🧠 {pred_label}")
+                # Log (sampled)
+                log_sampled(log, "GSR reading", gsr_value=gsr_value, prediction=pred_label, confidence=confidence)
 
                 return jsonify({
                     "status": "success",
@@ -50,15 +36,20 @@ def receive_data():
                     "gsr_value": gsr_value
                 }), 200
             except Exception as e:
-                print(f"⚠️ Prediction error: {e}")
+                log.exception("Prediction error")
                 return jsonify({"status": "error", "message": str(e)}), 500
         else:
-            print(f"[{timestamp}] GSR Value: {gsr_value:.3f} (Model not loaded)")
+            log.error("Model not loaded", extra={"data": {"gsr_value": gsr_value}})
             return jsonify({"status": "error", "message": "Model not loaded"}), 500
     else:
         return jsonify({"status": "error", "message": "Invalid or missing data"}), 400
 
 if __name__ == '__main__':
+    app = Flask(__name__)
+    CORS(app)
+    app.register_blueprint(mwl_api)
+    setup_logging()
+    registry.load()
     print("🚀 Flask server running... waiting for ESP32 data every 5s.")
     app.run(host='0.0.0.0', port=5000)
     
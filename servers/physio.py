@@ -0,0 +1,79 @@
+"""
+Streaming PPG path: per-device buffers, heart-rate estimation and the
+recording windows the PPG MWL model needs.
+
+Devices post PPG bursts (256 Hz, the rate the models were trained at).
+Every burst is appended to the device's ring buffer; once HR_WINDOW_S
+seconds are buffered the heart rate is estimated with the same peak
+detection the compact PPG features use (datasets/ppg/ppg_features.py), so it
+can feed the heartbeat emotion model. The shipped PPG MWL model was trained
+on whole flattened recordings (n_features_in_ samples, i.e. two 5-minute
+trials; a compact model's manifest entry gives its recording_samples), so it
+only runs once that much signal is buffered, and then at most
+once every PREDICT_EVERY_S seconds of new signal per device. Buffers grow
+with the signal actually received and are kept for at most max_devices
+devices (idle ones are dropped after idle_s seconds).
+"""
+import os
+import sys
+import numpy as np
+from signal_buffers import DeviceBuffers
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets", "ppg"))
+from ppg_features import FS as PPG_FS, MIN_SECONDS, detect_beats
+
+
+def estimate_heart_rate(samples, fs=PPG_FS):
+    """Mean heart rate (bpm) of a PPG trace, or None if no regular beats were found."""
+    samples = np.asarray(samples, dtype=np.float64)
+    if len(samples) < fs * MIN_SECONDS or samples.std() == 0:
+        return None
+    _, _, ibi, _ = detect_beats(samples, fs)
+    return float(np.mean(60 / ibi)) if len(ibi) >= 2 else None
+
+
+class PPGStream:
+    """Per-device PPG buffers with heart-rate and recording-window readiness."""
+
+    def __init__(self, recording_samples=None, hr_window_s=10, predict_every_s=10, fs=PPG_FS,
+                 max_devices=1000, idle_s=600):
+        self.fs = fs
+        self.hr_window = int(hr_window_s * fs)
+        self.recording_samples = recording_samples
+        self.predict_every = int(predict_every_s * fs)
+        self.last_prediction = {}  # device_id -> buffer.total at the last PPG model run
+        self.buffers = DeviceBuffers(max(recording_samples or 0, self.hr_window), max_devices, idle_s,
+                                     on_evict=lambda device_id: self.last_prediction.pop(device_id, None))
+
+    def push(self, device_id, samples):
+        """
+        Append one burst. Returns a dict with the buffered count, the estimated
+        heart_rate (or None) and `recording`: the latest recording_samples
+        samples when a PPG model prediction is due, else None.
+        """
+        buffer = self.buffers.get(device_id)
+        with buffer.lock:
+            buffer.extend(samples)
+            heart_rate = None
+            if len(buffer) >= self.hr_window:
+                heart_rate = estimate_heart_rate(buffer.latest(self.hr_window), self.fs)
+
+            recording = None
+            if self.recording_samples and len(buffer) >= self.recording_samples:
+                last = self.last_prediction.get(device_id)
+                if last is None or buffer.total - last >= self.predict_every:
+                    recording = buffer.latest(self.recording_samples)
+                    self.last_prediction[device_id] = buffer.total
+
+            return {
+                "buffered": len(buffer),
+                "heart_rate": heart_rate,
+                "recording": recording
+            }
+
+    def progress(self, device_id):
+        """Share of the PPG model's recording window that is buffered (0-1)."""
+        if not self.recording_samples:
+            return None
+        buffer = self.buffers.peek(device_id)
+        return min(len(buffer) / self.recording_samples, 1.0) if buffer is not None else 0.0
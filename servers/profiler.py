@@ -0,0 +1,249 @@
+"""
+Opt-in CPU profiling of a live server process.
+
+Two tools, both writing flamegraph-ready "collapsed stack" files
+(root;caller;callee <count>), which flamegraph.pl, speedscope and
+inferno read directly:
+
+    sampling    sample_stacks(seconds) walks sys._current_frames() every
+                interval_ms on a background thread, across every thread of
+                the process (request threads, batchers, n8n forwarder), and
+                counts each stack. Cost is independent of the request rate.
+                Threads parked in queue.get()/accept() show up as idle stacks.
+    per-request RequestProfiler runs cProfile around every Nth request
+                (PROFILE_EVERY_N, 0 = off) and aggregates the results. dump()
+                writes the aggregate as .prof (pstats: snakeviz, python -m
+                pstats) and as collapsed stacks rebuilt from the caller graph.
+                cProfile only sees the request's own thread: /data waits on
+                the inference batcher, whose work shows up in the sampling
+                profile instead; /data/batch and /predict run inline.
+                One request is profiled at a time (Python 3.12+ allows a
+                single active cProfile per interpreter); a due request that
+                arrives while another is being profiled is skipped.
+
+main.py serves both under /admin/profile when PROFILING_ENABLED=1, and a
+SIGUSR2 sent to one gunicorn worker profiles that worker for PROFILE_SECONDS.
+Files go to PROFILE_DIR.
+"""
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+
+PROFILING_ENABLED = os.environ.get("PROFILING_ENABLED", "0") == "1"
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "profiles"))
+PROFILE_SECONDS = float(os.environ.get("PROFILE_SECONDS", 10))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_EVERY_N = int(os.environ.get("PROFILE_EVERY_N", 0))
+MAX_PROFILE_SECONDS = 120
+
+
+def _frame_label(code, lineno=None):
+    # ";" separates frames in the collapsed format
+    name = f"{code.co_name} ({os.path.basename(code.co_filename)}:{lineno or code.co_firstlineno})"
+    return name.replace(";", ",")
+
+
+def _output_path(kind, suffix):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.abspath(os.path.join(PROFILE_DIR, f"{kind}-{os.getpid()}-{stamp}{suffix}"))
+
+
+def write_collapsed(stacks, path):
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in sorted(stacks.items(), key=lambda item: -item[1]):
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def top_frames(stacks, n=15, unit="samples"):
+    """Leaf frames with the most self time (in `unit`), for a quick look without a flamegraph."""
+    leaves = {}
+    for stack, count in stacks.items():
+        leaf = stack.rsplit(";", 1)[-1]
+        leaves[leaf] = leaves.get(leaf, 0) + count
+    total = sum(leaves.values()) or 1
+    return [{"frame": leaf, unit: count, "percent": round(100 * count / total, 1)}
+            for leaf, count in sorted(leaves.items(), key=lambda item: -item[1])[:n]]
+
+
+# ---------------- Sampling ----------------
+_sampling = threading.Lock()  # one sampling profile per process at a time
+
+
+def sample_stacks(seconds=PROFILE_SECONDS, interval_ms=PROFILE_INTERVAL_MS, include_idle=True):
+    """
+    Sample every thread's stack for `seconds`; returns {collapsed stack: samples}.
+    Raises RuntimeError if another sampling profile is already running.
+    """
+    if not _sampling.acquire(blocking=False):
+        raise RuntimeError("A sampling profile is already running")
+    try:
+        seconds = min(float(seconds), MAX_PROFILE_SECONDS)
+        interval = max(float(interval_ms), 0.5) / 1000.0
+        me = threading.get_ident()
+        stacks = {}
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    frames.append(_frame_label(frame.f_code, frame.f_lineno))
+                    frame = frame.f_back
+                if not include_idle and frames and frames[0].startswith(("wait ", "select ", "accept ")):
+                    continue
+                stack = ";".join([names.get(ident, str(ident))] + frames[::-1])
+                stacks[stack] = stacks.get(stack, 0) + 1
+            time.sleep(interval)
+        return stacks
+    finally:
+        _sampling.release()
+
+
+def profile_to_file(seconds=PROFILE_SECONDS, interval_ms=PROFILE_INTERVAL_MS, include_idle=True):
+    """Run a sampling profile and write it; returns a summary with the file path."""
+    stacks = sample_stacks(seconds, interval_ms, include_idle)
+    path = write_collapsed(stacks, _output_path("sample", ".folded"))
+    return {"path": path, "seconds": min(float(seconds), MAX_PROFILE_SECONDS), "interval_ms": interval_ms,
+            "samples": sum(stacks.values()), "stacks": len(stacks), "top": top_frames(stacks)}
+
+
+# ---------------- Per-request cProfile ----------------
+def pstats_to_collapsed(stats, max_depth=64):
+    """
+    Collapsed stacks from a pstats caller graph, as flameprof does: walk down
+    from the root functions and split each function's self time across its
+    callers in proportion to the cumulative time each call edge carries.
+    Values are microseconds.
+    """
+    raw = stats.stats  # func -> (cc, nc, tt, ct, callers{caller: (cc, nc, tt, ct)})
+    callees = {}
+    for func, (_, _, _, _, callers) in raw.items():
+        for caller, edge in callers.items():
+            callees.setdefault(caller, []).append((func, edge[3]))
+
+    def label(func):
+        filename, lineno, name = func
+        return f"{name} ({os.path.basename(filename)}:{lineno})".replace(";", ",")
+
+    stacks = {}
+
+    def visit(func, path, scale):
+        cc, nc, tt, ct, _ = raw[func]
+        path = path + [label(func)]
+        weight = int(round(tt * scale * 1e6))
+        if weight > 0:
+            key = ";".join(path)
+            stacks[key] = stacks.get(key, 0) + weight
+        if len(path) >= max_depth:
+            return
+        for callee, edge_ct in callees.get(func, ()):
+            callee_ct = raw[callee][3]
+            if callee_ct > 0 and label(callee) not in path:
+                visit(callee, path, scale * edge_ct / callee_ct)
+
+    for func, (_, _, _, _, callers) in raw.items():
+        if not callers:
+            visit(func, [], 1.0)
+    return stacks
+
+
+class RequestProfiler:
+    """cProfile every Nth request and aggregate; every_n=0 turns it off."""
+
+    def __init__(self, every_n=PROFILE_EVERY_N):
+        self.every_n = int(every_n)
+        self._count = 0
+        self._stats = None
+        self._lock = threading.Lock()
+        self._active = threading.Lock()  # held from start() to finish() of the request being profiled
+        self.profiled = 0
+        self.skipped = 0
+
+    def set_every(self, every_n):
+        with self._lock:
+            self.every_n = max(0, int(every_n))
+            self._count = 0
+
+    def start(self):
+        """A running cProfile.Profile if this request is one of every Nth, else None."""
+        if self.every_n <= 0:
+            return None
+        with self._lock:
+            self._count += 1
+            if self._count % self.every_n:
+                return None
+        if not self._active.acquire(blocking=False):
+            with self._lock:
+                self.skipped += 1
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler (not ours) is active in this interpreter
+            self._active.release()
+            with self._lock:
+                self.skipped += 1
+            return None
+        return profile
+
+    def finish(self, profile):
+        try:
+            profile.disable()
+        finally:
+            self._active.release()
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profile)
+            else:
+                self._stats.add(profile)
+            self.profiled += 1
+
+    def dump(self, reset=True):
+        """Write the aggregate (.prof and .folded); returns a summary, or None if nothing was profiled."""
+        with self._lock:
+            stats, profiled = self._stats, self.profiled
+            if reset:
+                self._stats, self.profiled = None, 0
+        if stats is None:
+            return None
+        prof_path = _output_path("requests", ".prof")
+        stats.dump_stats(prof_path)
+        stacks = pstats_to_collapsed(stats)
+        folded_path = write_collapsed(stacks, prof_path[:-5] + ".folded")
+        return {"requests": profiled, "prof": prof_path, "folded": folded_path,
+                "top": top_frames(stacks, unit="us")}
+
+    def stats(self):
+        return {"every_n": self.every_n, "profiled": self.profiled, "skipped": self.skipped}
+
+
+# ---------------- Signal Trigger ----------------
+def install_signal_handler(signum=None, seconds=PROFILE_SECONDS, log=None):
+    """
+    Profile this process for `seconds` on SIGUSR2 (POSIX only), e.g.
+    kill -USR2 <worker pid>. The profile runs on its own thread.
+    """
+    import signal
+    signum = signum or getattr(signal, "SIGUSR2", None)
+    if signum is None or threading.current_thread() is not threading.main_thread():
+        return False
+
+    def run():
+        try:
+            result = profile_to_file(seconds)
+            if log:
+                log.info("Sampling profile written", extra={"data": {k: result[k] for k in ("path", "samples")}})
+        except RuntimeError:
+            pass
+
+    signal.signal(signum, lambda *_: threading.Thread(target=run, name="profiler", daemon=True).start())
+    return True
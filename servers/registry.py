@@ -0,0 +1,342 @@
+"""
+Model registry: every served artifact is loaded once per process and looked
+up by model name and version.
+
+The manifest (servers/models.json, or MODEL_MANIFEST) lists the versions of
+each model and which one is the default; without a manifest the shipped
+artifacts are served as version "1":
+
+    {
+      "mwl": {
+        "default": "2",
+        "versions": {
+          "1": {"kind": "mwl", "model": "../datasets/gsr/best_gsr_model.pkl", "lut": "../datasets/gsr/mwl_lut.npz"},
+          "2": {"kind": "mwl", "model": "../datasets/gsr/best_gsr_model_windowed.pkl"}
+        }
+      }
+    }
+
+A PPG model trained with PPG_REPRESENTATION=compact is served as kind
+"ppg_compact": its input is the compact feature vector of the buffered trace,
+and "recording_samples" says how much raw signal that trace is (default two
+whole trials, 153,600 samples; 2 x PPG_WINDOW for a windowed model):
+
+    "ppg": {"default": "2", "versions": {
+      "1": {"kind": "ppg", "model": "../datasets/ppg/best_ppg_model.pkl"},
+      "2": {"kind": "ppg_compact", "model": "../datasets/ppg/best_ppg_compact_window7680_model.pkl",
+            "recording_samples": 15360}
+    }}
+
+Paths are relative to the manifest's folder. Rolling out a model means
+dropping the pickle in place and editing the manifest: maybe_reload() notices
+the manifest's mtime change (checked at most every check_interval seconds)
+and every process swaps to the new set on its next request; pickles whose
+path and mtime did not change are reused, not re-read. Loading builds a new
+table first and swaps it in one assignment, so requests never see a
+half-loaded registry.
+
+For prefork servers, load in the parent and call freeze(): gc.freeze() moves
+the loaded models out of the collector's generations, so collections in the
+workers do not write to (and copy) the pages holding them.
+"""
+import gc
+import json
+import os
+import threading
+import time
+import zipfile
+import joblib
+import numpy as np
+from inference import (MWL_LABELS, PPG_TRIAL_COLUMNS, PPG_TRIAL_SAMPLES, predict_single_pass, emotion_input,
+                       mwl_input, encoder_labels, heartbeat_input, ppg_input, ppg_compact_input)
+from lut import LookupModel, emotion_proba_fn, mwl_proba_fn
+from server_log import get_logger
+from metrics import metrics, MODEL_SECONDS, MODEL_ROWS, MODEL_ERRORS
+
+SERVERS_DIR = os.path.dirname(os.path.abspath(__file__))
+MANIFEST_PATH = os.environ.get("MODEL_MANIFEST", os.path.join(SERVERS_DIR, "models.json"))
+
+log = get_logger("registry")
+
+DEFAULT_MANIFEST = {
+    "emotion": {"default": "1", "versions": {"1": {
+        "kind": "emotion",
+        "model": "../datasets/emotion/best_model_emotion.pkl",
+        "scaler": "../datasets/emotion/scaler_emotion.pkl",
+        "lut": "../datasets/emotion/emotion_lut.npz"
+    }}},
+    "mwl": {"default": "1", "versions": {"1": {
+        "kind": "mwl",
+        "model": "../datasets/gsr/best_gsr_model.pkl",
+        "lut": "../datasets/gsr/mwl_lut.npz"
+    }}},
+    "heartbeat": {"default": "1", "versions": {"1": {
+        "kind": "heartbeat",
+        "model": "../datasets/heartbeat/best_heartbeat_model.pkl",
+        "scaler": "../datasets/heartbeat/heartbeat_scaler.pkl",
+        "label_encoder": "../datasets/heartbeat/heartbeat_label_encoder.pkl"
+    }}},
+    "ppg": {"default": "1", "versions": {"1": {
+        "kind": "ppg",
+        "model": "../datasets/ppg/best_ppg_model.pkl"
+    }}}
+}
+
+# kind -> raw inputs to the model's feature matrix
+INPUT_BUILDERS = {
+    "emotion": lambda entry, values: emotion_input(entry.scaler, values),
+    "mwl": lambda entry, values: mwl_input(entry.model, values),
+    "heartbeat": lambda entry, values: heartbeat_input(entry.scaler, values),
+    "ppg": lambda entry, values: ppg_input(entry.model, values),
+    "ppg_compact": lambda entry, values: ppg_compact_input(entry.model, values, entry.recording_samples)
+}
+
+
+def version_key(version):
+    """Sort key that orders "2" before "10" and "1.9" before "1.10"; non-numeric parts sort as text."""
+    return tuple((0, int(part), "") if part.isdigit() else (1, 0, part) for part in str(version).split("."))
+
+
+class ModelEntry:
+    """One loaded model version with its scaler, labels and optional lookup table."""
+
+    def __init__(self, name, version, kind, model, scaler=None, labels=None, lut=None, artifacts=None):
+        self.name = name
+        self.version = version
+        self.kind = kind
+        self.model = model
+        self.scaler = scaler
+        self.labels = labels
+        self.lut = lut
+        self.artifacts = artifacts or {}
+        self.loaded_at = time.strftime("%Y-%m-%d %H:%M:%S")
+        self.load_seconds = 0.0
+
+    @property
+    def recording_samples(self):
+        """
+        Raw PPG samples one prediction needs: a flat model's n_features_in_, or
+        a compact model's "recording_samples" (default two whole trials); None
+        for the other kinds.
+        """
+        if self.kind == "ppg":
+            return int(self.model.n_features_in_)
+        if self.kind == "ppg_compact":
+            return int(self.artifacts.get("recording_samples", PPG_TRIAL_COLUMNS * PPG_TRIAL_SAMPLES))
+        return None
+
+    def input_error(self, inputs):
+        """Why an array of raw inputs cannot be fed to this model, or None."""
+        if self.recording_samples is not None:
+            if inputs.ndim != 2 or inputs.shape[1] != self.recording_samples:
+                return f"Inputs must be recordings of {self.recording_samples} samples each"
+        elif inputs.ndim != 1:
+            return "Inputs must be a flat list of numbers"
+        if not np.isfinite(inputs).all():
+            return "Inputs must be finite numbers"
+        return None
+
+    def build_input(self, values):
+        return INPUT_BUILDERS[self.kind](self, values)
+
+    def predict(self, values, use_lut=False):
+        """predict_single_pass over a batch of raw inputs (readings, heart rates or PPG recordings)."""
+        try:
+            start = time.perf_counter()
+            if use_lut and self.lut is not None:
+                model, X = self.lut, np.asarray(values, dtype=float).reshape(-1, 1)
+            else:
+                model, X = self.model, self.build_input(values)
+            built = time.perf_counter()
+            predictions = predict_single_pass(model, X, self.labels)
+        except Exception:
+            MODEL_ERRORS.inc(model=self.name, version=self.version)
+            raise
+        self.observe(start, built, len(predictions))
+        return predictions
+
+    def observe(self, start, built, rows):
+        """Record one batch: input build (scaler transform / features) from start to built, then predict."""
+        MODEL_SECONDS.observe(built - start, model=self.name, version=self.version, stage="transform")
+        MODEL_SECONDS.observe(time.perf_counter() - built, model=self.name, version=self.version, stage="predict")
+        MODEL_ROWS.inc(rows, model=self.name, version=self.version)
+
+    def describe(self):
+        return {
+            "name": self.name,
+            "version": self.version,
+            "kind": self.kind,
+            "model": type(self.model).__name__,
+            "n_features": int(getattr(self.model, "n_features_in_", 0)),
+            "classes": [self.labels.get(c, str(c)) if self.labels else str(c) for c in self.model.classes_],
+            "lut": self.lut is not None,
+            "loaded_at": self.loaded_at,
+            "load_seconds": round(self.load_seconds, 4),
+            "artifacts": self.artifacts
+        }
+
+
+class ModelRegistry:
+    def __init__(self, manifest_path=MANIFEST_PATH, check_interval=5.0):
+        self.manifest_path = manifest_path
+        self.check_interval = check_interval
+        self._models = {}     # name -> {"default": version, "versions": {version: ModelEntry}}
+        self._artifacts = {}  # (abs path, mtime_ns, *depends on) -> loaded object, shared across versions
+        self._used = set()
+        self._manifest_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.errors = {}
+
+    # ---------------- Loading ----------------
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                return json.load(f), os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            return DEFAULT_MANIFEST, None
+
+    def _resolve(self, path):
+        base = os.path.dirname(os.path.abspath(self.manifest_path))
+        return os.path.normpath(os.path.join(base, path))
+
+    def _key(self, path):
+        path = self._resolve(path)
+        return path, os.stat(path).st_mtime_ns
+
+    def _artifact(self, path, loader=joblib.load, depends_on=()):
+        """
+        Load (or reuse) an artifact. depends_on holds the keys of the artifacts
+        it is built around, so e.g. a lookup table is reloaded with its model.
+        """
+        path, mtime = self._key(path)
+        key = (path, mtime) + tuple(depends_on)
+        if key not in self._artifacts:
+            self._artifacts[key] = loader(path)
+        self._used.add(key)
+        return self._artifacts[key]
+
+    def _load_entry(self, name, version, spec):
+        kind = spec.get("kind", name)
+        model = self._artifact(spec["model"])
+        scaler = self._artifact(spec["scaler"]) if spec.get("scaler") else None
+        if spec.get("label_encoder"):
+            labels = encoder_labels(self._artifact(spec["label_encoder"]))
+        else:
+            labels = MWL_LABELS if kind in ("mwl", "ppg", "ppg_compact") else None
+
+        lut = None
+        if spec.get("lut") and os.path.exists(self._resolve(spec["lut"])):
+            # The table's fallback is bound to this model (and scaler), so they are part of its key
+            fallback = emotion_proba_fn(model, scaler) if kind == "emotion" else mwl_proba_fn(model)
+            depends_on = (kind, self._key(spec["model"]), self._key(spec["scaler"]) if spec.get("scaler") else None)
+            sources = {"model": self._resolve(spec["model"]),
+                       "scaler": self._resolve(spec["scaler"]) if spec.get("scaler") else None}
+            try:
+                lut = self._artifact(spec["lut"], lambda path: LookupModel.load(path, fallback, sources), depends_on)
+            except (ValueError, OSError, zipfile.BadZipFile, KeyError) as e:
+                # Compiled from other files, truncated or corrupt: serve this version from the model
+                log.warning("Lookup table rejected",
+                            extra={"data": {"model": name, "version": version, "error": str(e)}})
+
+        artifacts = {k: v for k, v in spec.items() if k != "kind"}
+        return ModelEntry(name, version, kind, model, scaler, labels, lut, artifacts)
+
+    def load(self):
+        """(Re)load everything in the manifest; returns {name: [versions]} of what is now served."""
+        with self._lock:
+            manifest, mtime = self._read_manifest()
+            models, errors = {}, {}
+            self._used = set()
+            for name, spec in manifest.items():
+                versions = {}
+                for version, version_spec in spec.get("versions", {}).items():
+                    try:
+                        start = time.perf_counter()
+                        entry = self._load_entry(name, str(version), version_spec)
+                        entry.load_seconds = time.perf_counter() - start
+                        versions[str(version)] = entry
+                    except Exception as e:
+                        errors[f"{name}:{version}"] = str(e)
+                        log.error("Failed to load model", extra={"data": {"model": name, "version": str(version),
+                                                                          "error": str(e)}})
+                        # A broken rollout keeps serving the copy that is already loaded
+                        previous = self._models.get(name, {}).get("versions", {}).get(str(version))
+                        if previous is not None:
+                            versions[str(version)] = previous
+                if versions:
+                    latest = max(versions, key=version_key)
+                    default = str(spec.get("default", latest))
+                    models[name] = {"default": default if default in versions else latest,
+                                    "versions": versions}
+
+            # Drop artifacts no version references any more, then swap the table in one assignment
+            self._artifacts = {key: self._artifacts[key] for key in self._used}
+            self._models = models
+            self.errors = errors
+            self._manifest_mtime = mtime
+            self._next_check = time.monotonic() + self.check_interval
+            self.loaded = True
+        for name, spec in models.items():
+            log.info("Model loaded", extra={"data": {"model": name, "default": spec["default"],
+                                                     "versions": sorted(spec["versions"], key=version_key)}})
+        return {name: sorted(spec["versions"], key=version_key) for name, spec in models.items()}
+
+    def maybe_reload(self):
+        """Reload if the manifest changed on disk; cheap enough to call on every request."""
+        if not self.loaded:
+            self.load()
+            return True
+        now = time.monotonic()
+        if now < self._next_check:
+            return False
+        self._next_check = now + self.check_interval
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime != self._manifest_mtime:
+            self.load()
+            return True
+        return False
+
+    def freeze(self):
+        """Call after loading in a prefork parent: keeps the models' pages shared copy-on-write."""
+        gc.collect()
+        if hasattr(gc, "freeze"):
+            gc.freeze()
+
+    # ---------------- Lookup ----------------
+    def get(self, name, version=None):
+        """ModelEntry for name (default version unless given), or None."""
+        if not self.loaded:
+            self.load()
+        spec = self._models.get(name)
+        if spec is None:
+            return None
+        return spec["versions"].get(str(version) if version is not None else spec["default"])
+
+    def names(self):
+        return list(self._models)
+
+    def entries(self):
+        return [entry for spec in self._models.values() for entry in spec["versions"].values()]
+
+    def describe(self):
+        return {
+            name: {
+                "default": spec["default"],
+                "versions": {v: spec["versions"][v].describe() for v in sorted(spec["versions"], key=version_key)}
+            }
+            for name, spec in self._models.items()
+        } | ({"errors": self.errors} if self.errors else {})
+
+
+# Process-wide registry shared by main.py and the per-model wrappers
+registry = ModelRegistry()
+
+metrics.gauge("model_load_seconds", "Time the last (re)load of each served model version took",
+              ["model", "version"], lambda: [({"model": e.name, "version": e.version}, e.load_seconds)
+                                             for e in registry.entries()])
+metrics.gauge("model_load_errors", "Manifest versions that failed to load", (), lambda: len(registry.errors))
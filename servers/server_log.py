@@ -0,0 +1,200 @@
+"""
+Structured, queue-backed logging for the servers.
+
+Request threads never write to stdout: a bounded QueueHandler hands records
+to a QueueListener thread that formats and writes them. When the queue is
+full the record is dropped and counted instead of blocking the request, so
+logging cost stays bounded whatever the ingest rate.
+
+    per-request lines   log_sampled(log, "reading", gsr_value=...) keeps
+                        LOG_SAMPLE_RATE of them (decided before the record
+                        is even built)
+    warnings / errors   at most LOG_ERROR_BURST per call site per
+                        LOG_ERROR_INTERVAL_S; the next one that gets
+                        through carries a "suppressed" count
+    output              LOG_FORMAT=json (one object per line) or text
+
+Fields passed as keyword arguments to log_sampled(), or as
+extra={"data": {...}}, become JSON keys. Message formatting and tracebacks
+are rendered on the listener thread.
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json")  # "json" or "text"
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_SAMPLE_RATE = float(os.environ.get("LOG_SAMPLE_RATE", 0.01))
+LOG_QUEUE = int(os.environ.get("LOG_QUEUE", 10000))
+LOG_ERROR_BURST = int(os.environ.get("LOG_ERROR_BURST", 5))
+LOG_ERROR_INTERVAL_S = float(os.environ.get("LOG_ERROR_INTERVAL_S", 60))
+
+ROOT_LOGGER = "servers"
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        entry.update(getattr(record, "data", None) or {})
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str, separators=(",", ":"))
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s", "%Y-%m-%d %H:%M:%S")
+
+    def formatMessage(self, record):
+        line = super().formatMessage(record)
+        data = getattr(record, "data", None)
+        if data:
+            line += " " + " ".join(f"{k}={json.dumps(v, default=str)}" for k, v in data.items())
+        return line
+
+
+class ErrorRateLimit(logging.Filter):
+    """Let at most `burst` WARNING+ records per call site through per `interval` seconds."""
+
+    def __init__(self, burst=LOG_ERROR_BURST, interval=LOG_ERROR_INTERVAL_S):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self._windows = {}  # key -> [window start, passed, suppressed]
+        self._lock = threading.Lock()
+        self.suppressed = 0
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING:
+            return True
+        key = (record.pathname, record.lineno, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window else 0
+                window = self._windows[key] = [now, 0, 0]
+                if suppressed:
+                    record.data = {**(getattr(record, "data", None) or {}), "suppressed": suppressed}
+            if window[1] >= self.burst:
+                window[2] += 1
+                self.suppressed += 1
+                return False
+            window[1] += 1
+            return True
+
+
+class _Listener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # Wait (briefly) for room so a full queue still drains on shutdown
+        try:
+            self.queue.put(self._sentinel, timeout=5.0)
+        except queue.Full:
+            pass
+
+
+class BoundedQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) instead of blocking, with one listener per process."""
+
+    def __init__(self, target, maxsize=LOG_QUEUE):
+        super().__init__(queue.Queue(maxsize))
+        self.target = target
+        self.maxsize = maxsize
+        self.dropped = 0
+        self._listener = None
+        self._listener_pid = None
+        self._start_lock = threading.Lock()
+
+    def prepare(self, record):
+        # Only bind the arguments here; formatting happens on the listener thread
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        self._ensure_listener()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_listener(self):
+        # Threads do not survive fork(); a forked worker starts its own listener.
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._start_lock:
+            if self._listener_pid != pid:
+                if self._listener_pid is not None:
+                    self.queue = queue.Queue(self.maxsize)
+                self._listener = _Listener(self.queue, self.target, respect_handler_level=True)
+                self._listener.start()
+                self._listener_pid = pid
+
+    def stop(self):
+        if self._listener is not None and self._listener_pid == os.getpid():
+            self._listener.stop()
+            self._listener_pid = None
+
+
+_handler = None
+_rate_limit = None
+sample_rate = LOG_SAMPLE_RATE
+sampled_out = 0
+
+
+def setup_logging(fmt=LOG_FORMAT, level=LOG_LEVEL, stream=None):
+    """Route the "servers" loggers through the bounded queue; safe to call more than once."""
+    global _handler, _rate_limit
+    root = logging.getLogger(ROOT_LOGGER)
+    if _handler is not None:
+        return root
+    target = logging.StreamHandler(stream or sys.stdout)
+    target.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    _rate_limit = ErrorRateLimit()
+    _handler = BoundedQueueHandler(target)
+    _handler.addFilter(_rate_limit)
+    root.addHandler(_handler)
+    root.setLevel(level)
+    root.propagate = False
+    atexit.register(_handler.stop)
+    return root
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def log_sampled(logger, msg, **data):
+    """Per-request info line, kept with probability sample_rate."""
+    global sampled_out
+    if random.random() >= sample_rate:
+        sampled_out += 1
+        return
+    logger.info(msg, extra={"data": data})
+
+
+def logging_stats():
+    return {
+        "format": LOG_FORMAT,
+        "sample_rate": sample_rate,
+        "sampled_out": sampled_out,
+        "queue_depth": _handler.queue.qsize() if _handler else 0,
+        "queue_size": _handler.maxsize if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+        "rate_limited": _rate_limit.suppressed if _rate_limit else 0
+    }
@@ -0,0 +1,149 @@
+"""
+Per-device sample buffers for streamed signals (PPG bursts, heart rate).
+
+RingBuffer keeps the last `capacity` samples in an array (float64 by
+default, or any dtype such as a structured record): extend() is at most two
+slice copies however long the burst, and latest(n) returns the newest n
+samples in order. The array starts small and doubles until it reaches
+`capacity`, so a device that sends a few samples does not cost a full
+window. DeviceMap keeps one object per device id for at most max_devices
+devices, evicting idle (idle_s) and then least recently used ones first;
+DeviceBuffers is a DeviceMap of RingBuffers (one buffer and lock per device).
+"""
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+INITIAL_CAPACITY = 1024
+
+
+class RingBuffer:
+    """Fixed-capacity ring buffer, allocated lazily up to capacity."""
+
+    def __init__(self, capacity, dtype=np.float64, initial=INITIAL_CAPACITY):
+        self.capacity = int(capacity)
+        self.data = np.zeros(min(self.capacity, int(initial)), dtype=dtype)
+        self.pos = 0      # next write index
+        self.size = 0     # valid samples, <= capacity
+        self.total = 0    # samples ever written
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self, needed):
+        # Only before the first wrap, while the samples are data[:size] in order
+        allocated = len(self.data)
+        if needed <= allocated or allocated >= self.capacity:
+            return
+        data = np.zeros(min(self.capacity, max(needed, 2 * allocated)), dtype=self.data.dtype)
+        data[:self.size] = self.data[:self.size]
+        self.data = data
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def extend(self, values):
+        values = np.asarray(values, dtype=self.data.dtype).ravel()
+        n = len(values)
+        self.total += n
+        self._grow(self.size + n)
+        if n >= self.capacity:
+            self.data[:] = values[n - self.capacity:]
+            self.pos = 0
+            self.size = self.capacity
+            return
+        end = self.pos + n
+        if end <= self.capacity:
+            self.data[self.pos:end] = values
+        else:
+            split = self.capacity - self.pos
+            self.data[self.pos:] = values[:split]
+            self.data[:n - split] = values[split:]
+        self.pos = end % self.capacity
+        self.size = min(self.size + n, self.capacity)
+
+    def latest(self, n=None):
+        """Copy of the newest n samples (default: all buffered), oldest first."""
+        n = self.size if n is None else min(int(n), self.size)
+        start = (self.pos - n) % self.capacity
+        if start + n <= self.capacity:
+            return self.data[start:start + n].copy()
+        return np.concatenate((self.data[start:], self.data[:self.pos]))
+
+    def segments(self):
+        """(older, newer) views of the buffered samples, oldest first; no copy."""
+        if self.size < self.capacity:
+            return self.data[:0], self.data[:self.size]
+        return self.data[self.pos:], self.data[:self.pos]
+
+
+class DeviceMap:
+    """
+    One object per device id, made by factory() on first use, for at most
+    max_devices devices (0 = no limit). Objects unused for idle_s seconds,
+    then the least recently used, are dropped; on_evict(device_id) lets the
+    owner drop its own per-device state too.
+    """
+
+    def __init__(self, factory, max_devices=0, idle_s=0, on_evict=None):
+        self.factory = factory
+        self.max_devices = int(max_devices)
+        self.idle_s = float(idle_s)
+        self.on_evict = on_evict
+        self.devices = OrderedDict()  # device_id -> object, least recently used first
+        self.last_used = {}
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.devices)
+
+    def get(self, device_id):
+        now = time.monotonic()
+        with self.lock:
+            value = self.devices.get(device_id)
+            if value is None:
+                self._evict(now)
+                value = self.devices[device_id] = self.factory()
+            else:
+                self.devices.move_to_end(device_id)
+            self.last_used[device_id] = now
+            return value
+
+    def peek(self, device_id):
+        """The device's object if it has one; does not create or refresh it."""
+        return self.devices.get(device_id)
+
+    def _evict(self, now):
+        while self.devices:
+            oldest = next(iter(self.devices))
+            idle = self.idle_s > 0 and now - self.last_used[oldest] >= self.idle_s
+            full = self.max_devices > 0 and len(self.devices) >= self.max_devices
+            if not (idle or full):
+                break
+            del self.devices[oldest]
+            del self.last_used[oldest]
+            self.evicted += 1
+            if self.on_evict is not None:
+                self.on_evict(oldest)
+
+    def stats(self):
+        with self.lock:
+            return {"devices": len(self.devices), "max_devices": self.max_devices, "evicted": self.evicted}
+
+
+class DeviceBuffers(DeviceMap):
+    """One RingBuffer per device id (see DeviceMap for the device limit)."""
+
+    def __init__(self, capacity, max_devices=0, idle_s=0, on_evict=None):
+        self.capacity = int(capacity)
+        super().__init__(lambda: RingBuffer(self.capacity), max_devices, idle_s, on_evict)
+
+    def stats(self):
+        stats = super().stats()
+        with self.lock:
+            stats["bytes"] = sum(b.nbytes for b in self.devices.values())
+        return stats
@@ -0,0 +1,336 @@
+"""
+Per-device state: the latest result of every device plus a bounded history.
+
+Each device has one record holding its latest merged result (the
+latest_reading layout) and a RingBuffer of compact structured rows: epoch
+time, GSR value, heart rate, and for each model a one-byte label code plus a
+float32 confidence, about 40 bytes per reading. latest(device) is a dict
+lookup; history(device, since) binary-searches the ring's two time-ordered
+segments and copies only the k newer rows.
+
+The shared store also keeps a short change feed (the last STATE_FEED
+updates, numbered): changes(after, timeout) long-polls it, which is how
+every server process relays every other process's results to its /stream
+subscribers.
+
+Backends (STATE_BACKEND):
+    local    in-process store (default; one worker, or per-worker state)
+    manager  one store served over a local socket (STATE_ADDRESS, a Unix
+             socket path or host:port; default a socket in $XDG_RUNTIME_DIR,
+             else in a private /tmp/prototype-state-<uid> folder) by a
+             multiprocessing manager. The
+             first process that finds nothing listening starts the server
+             (under gunicorn --preload that is the master); every worker
+             then talks to the same store.
+
+The manager protocol is pickle, so whoever can connect can run code in the
+store process, and whoever answers on the socket can run code in its
+clients. A Unix socket is created owner-only (mode 0700) in a folder only
+this user can write to, and a socket owned by another user is refused
+before connecting; a host:port address needs an explicit STATE_AUTHKEY
+shared by every process.
+
+At most STATE_MAX_DEVICES devices are kept (the least recently updated is
+dropped first), and each device's history ring grows with its readings up
+to STATE_HISTORY rows.
+"""
+import os
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from multiprocessing import AuthenticationError
+from multiprocessing.managers import BaseManager
+import numpy as np
+from signal_buffers import RingBuffer
+from server_log import get_logger
+
+# Private default socket folder: $XDG_RUNTIME_DIR (per user, mode 0700) or one created here
+PRIVATE_DIR = os.environ.get("XDG_RUNTIME_DIR") or os.path.join(
+    tempfile.gettempdir(), f"prototype-state-{os.getuid() if hasattr(os, 'getuid') else 0}")
+STATE_BACKEND = os.environ.get("STATE_BACKEND", "local")
+STATE_ADDRESS = os.environ.get("STATE_ADDRESS", os.path.join(PRIVATE_DIR, "prototype-state.sock"))
+STATE_AUTHKEY = os.environ.get("STATE_AUTHKEY", "").encode()  # required for a host:port address
+STATE_HISTORY = int(os.environ.get("STATE_HISTORY", 4096))  # rows kept per device
+STATE_MAX_DEVICES = int(os.environ.get("STATE_MAX_DEVICES", 10000))
+STATE_FEED = int(os.environ.get("STATE_FEED", 1024))  # updates kept for /stream relays (shared backend)
+
+MODEL_FIELDS = ("emotion", "mwl", "heartbeat_emotion", "ppg_mwl")
+HISTORY_DTYPE = np.dtype(
+    [("t", "f8"), ("gsr_value", "f8"), ("heart_rate", "f4")]
+    + [f for name in MODEL_FIELDS for f in ((name, "i1"), (f"{name}_confidence", "f4"))]
+)
+
+log = get_logger("state_store")
+
+
+def parse_since(value):
+    """Epoch seconds, or a "%Y-%m-%d %H:%M:%S" timestamp as the servers write them."""
+    if value is None or value == "":
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d %H:%M:%S").timestamp()
+
+
+class LocalStateStore:
+    """Thread-safe per-device latest result + history ring."""
+
+    def __init__(self, history=STATE_HISTORY, feed=0, max_devices=STATE_MAX_DEVICES):
+        self.history_size = int(history)
+        self.max_devices = int(max_devices)
+        self.evicted = 0
+        self._latest = OrderedDict()  # device_id -> merged latest result, least recently updated first
+        self._history = {}   # device_id -> RingBuffer(HISTORY_DTYPE)
+        self._labels = []    # label code -> label
+        self._codes = {}     # label -> code
+        self._last_device = None
+        self._lock = threading.Lock()
+        self._feed = deque(maxlen=int(feed)) if feed > 0 else None  # (seq, device_id, update)
+        self._seq = 0
+        self._changed = threading.Condition(self._lock)
+
+    def _code(self, label):
+        if label is None:
+            return -1
+        code = self._codes.get(label)
+        if code is None and len(self._labels) < 127:
+            code = self._codes[label] = len(self._labels)
+            self._labels.append(label)
+        return -1 if code is None else code
+
+    def _row(self, updates, t):
+        row = np.zeros(1, dtype=HISTORY_DTYPE)
+        row["t"] = t
+        for key in ("gsr_value", "heart_rate"):
+            row[key] = updates[key] if updates.get(key) is not None else np.nan
+        for name in MODEL_FIELDS:
+            result = updates.get(name) or {}
+            row[name] = self._code(result.get("prediction"))
+            confidence = result.get("confidence")
+            row[f"{name}_confidence"] = confidence if confidence is not None else np.nan
+        return row
+
+    def update(self, device_id, updates, t=None):
+        """Merge `updates` (latest_reading keys) into the device's latest and append a history row."""
+        t = time.time() if t is None else t
+        with self._lock:
+            latest = self._latest.get(device_id)
+            if latest is None:
+                self._evict()
+            else:
+                self._latest.move_to_end(device_id)
+            self._latest[device_id] = {**(latest or {}), **updates, "device_id": device_id}
+            self._last_device = device_id
+            buffer = self._history.get(device_id)
+            if buffer is None and self.history_size > 0:
+                buffer = self._history[device_id] = RingBuffer(self.history_size, HISTORY_DTYPE, initial=64)
+            if buffer is not None:
+                buffer.extend(self._row(updates, t))
+            if self._feed is not None:
+                self._seq += 1
+                self._feed.append((self._seq, device_id, {**updates, "device_id": device_id}))
+                self._changed.notify_all()
+
+    def _evict(self):
+        # Called with the lock held, before a new device is added
+        while self.max_devices > 0 and len(self._latest) >= self.max_devices:
+            device_id, _ = self._latest.popitem(last=False)
+            self._history.pop(device_id, None)
+            self.evicted += 1
+
+    def update_many(self, items, t=None):
+        """update() for a list of (device_id, updates); one call (one round trip on the shared backend)."""
+        for device_id, updates in items:
+            self.update(device_id, updates, t)
+
+    def changes(self, after=None, timeout=0.0):
+        """
+        (seq, [(device_id, update), ...]): the updates numbered after `after`,
+        waiting up to `timeout` seconds for one. after=None starts from now.
+        Updates that fell out of the feed are skipped.
+        """
+        with self._changed:
+            if self._feed is None or after is None:
+                return self._seq, []
+            if after > self._seq:
+                after = 0  # the store was restarted
+            if self._seq == after and timeout > 0:
+                self._changed.wait(timeout)
+            events = []
+            for seq, device_id, update in reversed(self._feed):
+                if seq <= after:
+                    break
+                events.append((device_id, update))
+            return self._seq, events[::-1]
+
+    def latest(self, device_id=None):
+        """Latest result of device_id (default: the device that posted last), or None."""
+        with self._lock:
+            return self._latest.get(self._last_device if device_id is None else device_id)
+
+    def history(self, device_id, since=None, limit=None):
+        """Rows newer than `since` (epoch s), oldest first, as JSON-ready columns; None for unknown devices."""
+        with self._lock:
+            buffer = self._history.get(device_id)
+            if buffer is None:
+                return None
+            n = len(buffer)
+            if since is not None:
+                n = sum(len(seg) - int(np.searchsorted(seg["t"], since, side="right")) for seg in buffer.segments())
+            if limit is not None:
+                n = min(n, int(limit))
+            rows = buffer.latest(n)
+            labels = list(self._labels)
+
+        columns = {
+            "t": rows["t"].tolist(),
+            "gsr_value": [None if np.isnan(v) else v for v in rows["gsr_value"].tolist()],
+            "heart_rate": [None if np.isnan(v) else round(v, 1) for v in rows["heart_rate"].tolist()]
+        }
+        for name in MODEL_FIELDS:
+            columns[name] = [labels[c] if c >= 0 else None for c in rows[name].tolist()]
+            columns[f"{name}_confidence"] = [None if np.isnan(v) else round(v, 1)
+                                             for v in rows[f"{name}_confidence"].tolist()]
+        return {"device_id": device_id, "count": len(rows), "columns": columns}
+
+    def devices(self):
+        with self._lock:
+            return list(self._latest)
+
+    def stats(self):
+        with self._lock:
+            rows = sum(len(b) for b in self._history.values())
+            return {
+                "devices": len(self._latest),
+                "max_devices": self.max_devices,
+                "evicted_devices": self.evicted,
+                "history_rows": rows,
+                "history_bytes": rows * HISTORY_DTYPE.itemsize,
+                "history_allocated_bytes": sum(b.nbytes for b in self._history.values()),
+                "history_per_device": self.history_size,
+                "labels": list(self._labels)
+            }
+
+
+# ---------------- Shared Backend ----------------
+_store = None      # the store a manager server process serves
+_server = None     # manager started by this process, if any
+
+
+def _shared_store():
+    global _store
+    if _store is None:
+        _store = LocalStateStore(feed=STATE_FEED)
+    return _store
+
+
+class StateManager(BaseManager):
+    pass
+
+
+StateManager.register("state_store", callable=_shared_store)
+
+
+def _parse_address(address):
+    if ":" in address and not address.startswith("/"):
+        host, port = address.rsplit(":", 1)
+        return host, int(port)
+    return address
+
+
+def _authkey(address, authkey):
+    if authkey:
+        return authkey
+    if isinstance(address, tuple):
+        raise RuntimeError("STATE_AUTHKEY must be set when STATE_ADDRESS is host:port "
+                           "(the manager protocol is pickle; anyone who can connect can run code)")
+    return b"prototype-state"  # owner-only Unix socket: the file mode is the access control
+
+
+def _check_socket(address):
+    """
+    Refuse a Unix socket another local user could have bound first: the
+    private default folder must be ours with mode 0700 (it is created so),
+    and an existing socket must be owned by this user.
+    """
+    if not isinstance(address, str) or not hasattr(os, "getuid"):
+        return
+    folder = os.path.dirname(os.path.abspath(address))
+    if folder == os.path.abspath(PRIVATE_DIR):
+        os.makedirs(folder, mode=0o700, exist_ok=True)
+        st = os.lstat(folder)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+            raise RuntimeError(f"{folder} must be a directory owned by this user with mode 0700")
+    try:
+        st = os.lstat(address)
+    except FileNotFoundError:
+        return
+    if st.st_uid != os.getuid():
+        raise RuntimeError(f"The state store socket {address} belongs to another user; refusing to connect")
+
+
+def _clear_stale_socket(address):
+    if isinstance(address, str) and os.path.exists(address):
+        os.unlink(address)
+
+
+class _OwnerOnly:
+    """Bind Unix sockets owner-only (mode 0700); the umask is restored once the socket exists."""
+
+    def __enter__(self):
+        self.umask = os.umask(0o077)
+
+    def __exit__(self, *exc):
+        os.umask(self.umask)
+
+
+def connect_state_store(address=STATE_ADDRESS, authkey=STATE_AUTHKEY):
+    """Proxy to the store served at `address`; raises OSError if nothing is listening."""
+    address = _parse_address(address)
+    _check_socket(address)
+    manager = StateManager(address=address, authkey=_authkey(address, authkey))
+    manager.connect()
+    return manager.state_store()
+
+
+def serve_state_store(address=STATE_ADDRESS, authkey=STATE_AUTHKEY):
+    """Start the store server in a child process; returns the manager (shutdown() stops it)."""
+    address = _parse_address(address)
+    _check_socket(address)
+    _clear_stale_socket(address)
+    manager = StateManager(address=address, authkey=_authkey(address, authkey))
+    with _OwnerOnly():
+        manager.start()
+    return manager
+
+
+def make_state_store(backend=STATE_BACKEND, history=STATE_HISTORY):
+    """LocalStateStore, or a proxy to the shared one (started here if nothing is listening)."""
+    global _server
+    if backend != "manager":
+        return LocalStateStore(history)
+    try:
+        store = connect_state_store()
+        log.info("Connected to shared state store", extra={"data": {"address": STATE_ADDRESS}})
+    except AuthenticationError:
+        raise RuntimeError(f"The state store at {STATE_ADDRESS} rejected STATE_AUTHKEY")
+    except OSError:
+        _server = serve_state_store()
+        store = connect_state_store()
+        log.info("Started shared state store", extra={"data": {"address": STATE_ADDRESS}})
+    return store
+
+
+if __name__ == "__main__":
+    # Standalone store server for STATE_BACKEND=manager (otherwise the first server process starts one)
+    address = _parse_address(STATE_ADDRESS)
+    _check_socket(address)
+    _clear_stale_socket(address)
+    print(f"🚀 State store serving on {STATE_ADDRESS}")
+    with _OwnerOnly():
+        server = StateManager(address=address, authkey=_authkey(address, STATE_AUTHKEY)).get_server()
+    server.serve_forever()
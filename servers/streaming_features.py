@@ -0,0 +1,344 @@
+"""
+Per-device sliding-window GSR features for streaming MWL inference.
+
+The MWL model was trained on extract_gsr_features() (datasets/gsr/trainRF.py)
+over whole multi-column recordings. StreamingGSRFeatures keeps the last
+`window` readings of each channel and updates the same statistics as each
+reading arrives, so features() returns the vector extract_gsr_features would
+build for the current window without recomputing it:
+
+    per channel: mean, std, min, max, median, p25, p75, range,
+                 mean|diff|, std(diff), max|diff|
+    then:        pairwise correlations, pairwise mean differences
+
+Sums are kept shifted by the channel's first value (stable variance) and are
+rebuilt from the buffer once per `window` readings so rounding cannot drift.
+Order statistics come from a sorted list: a flat one (bisect; the O(n)
+insert/delete is one memmove, cheaper than any Python-level tree up to
+FLAT_SORTED_MAX values) or, for longer windows, SortedWindow, a blocked
+sorted list indexed by a Fenwick tree (O(log n) insert, remove and k-th
+value, plus a shift within one block of at most 2 * LOAD values). The
+running max |diff| comes from a monotonic deque (amortised O(1)). DeviceFeatureEngine keeps windows for at most
+max_devices devices and drops idle ones.
+
+Check against the batch implementation (run from the servers/ folder):
+    python streaming_features.py
+"""
+import bisect
+import math
+import os
+import sys
+import threading
+from collections import deque
+import numpy as np
+from signal_buffers import DeviceMap
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets"))
+from order_stats import sorted_percentile
+
+FEATURES_PER_CHANNEL = 11
+FLAT_SORTED_MAX = 16384  # measured crossover with SortedWindow is around 20k values
+
+
+def channels_for_features(n_features):
+    """Number of channels c with 11c + c(c-1) == n_features (24 -> 2), or None."""
+    for c in range(1, 64):
+        if FEATURES_PER_CHANNEL * c + c * (c - 1) == n_features:
+            return c
+    return None
+
+
+class SortedWindow:
+    """
+    Sorted multiset of floats as a list of sorted blocks (at most 2 * LOAD
+    values each) with a Fenwick tree over the block sizes. add(x), remove(x)
+    and window[k] (k-th smallest, negative k from the top) find their block
+    in O(log n) and shift at most one block, so a large window costs no more
+    per reading than a small one.
+    """
+
+    LOAD = 512
+
+    def __init__(self):
+        self.blocks = []
+        self.maxes = []   # last (largest) value of each block
+        self.tree = []    # Fenwick tree of len(block)
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def _reindex(self):
+        tree = [len(block) for block in self.blocks]
+        for i in range(len(tree)):
+            parent = i | (i + 1)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _tree_add(self, i, delta):
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i |= i + 1
+
+    def add(self, x):
+        if not self.blocks:
+            self.blocks, self.maxes = [[x]], [x]
+            self.tree = [1]
+            self.size = 1
+            return
+        i = min(bisect.bisect_left(self.maxes, x), len(self.blocks) - 1)
+        block = self.blocks[i]
+        bisect.insort(block, x)
+        self.maxes[i] = block[-1]
+        self.size += 1
+        if len(block) > 2 * self.LOAD:
+            self.blocks[i:i + 1] = [block[:self.LOAD], block[self.LOAD:]]
+            self.maxes[i:i + 1] = [block[self.LOAD - 1], block[-1]]
+            self._reindex()
+        else:
+            self._tree_add(i, 1)
+
+    def remove(self, x):
+        """Remove one occurrence of x, which must be present."""
+        i = bisect.bisect_left(self.maxes, x)
+        block = self.blocks[i]
+        del block[bisect.bisect_left(block, x)]
+        self.size -= 1
+        if len(block) >= self.LOAD // 2 or len(self.blocks) == 1:
+            if block:
+                self.maxes[i] = block[-1]
+                self._tree_add(i, -1)
+            else:
+                self.blocks, self.maxes, self.tree = [], [], []
+            return
+        # Merge a small block into a neighbour (and split again if that overflows)
+        j = i + 1 if i + 1 < len(self.blocks) else i - 1
+        lo, hi = min(i, j), max(i, j)
+        merged = self.blocks[lo] + self.blocks[hi]
+        parts = [merged] if len(merged) <= 2 * self.LOAD else [merged[:len(merged) // 2], merged[len(merged) // 2:]]
+        self.blocks[lo:hi + 1] = parts
+        self.maxes[lo:hi + 1] = [part[-1] for part in parts]
+        self._reindex()
+
+    def __getitem__(self, k):
+        if k < 0:
+            k += self.size
+        if not 0 <= k < self.size:
+            raise IndexError("SortedWindow index out of range")
+        blocks = self.blocks
+        if len(blocks) == 1:
+            return blocks[0][k]
+        # Fenwick descent: the block holding the k-th value and the offset in it
+        tree = self.tree
+        n = len(tree)
+        i, step = 0, 1 << (n.bit_length() - 1)
+        while step:
+            j = i + step
+            if j <= n and tree[j - 1] <= k:
+                i = j
+                k -= tree[j - 1]
+            step >>= 1
+        return blocks[i][k]
+
+
+class _Channel:
+    def __init__(self, window):
+        self.values = deque(maxlen=window)
+        if window > FLAT_SORTED_MAX:
+            self.sorted = SortedWindow()
+            self._add, self._remove = self.sorted.add, self.sorted.remove
+        else:
+            self.sorted = []
+            self._add, self._remove = self._flat_add, self._flat_remove
+        self.diffs = deque(maxlen=max(window - 1, 1))
+        self.max_abs_diff = deque()  # (seq, |d|), decreasing
+        self.seq = 0
+        self.shift = None
+        self.s1 = self.s2 = 0.0
+        self.d1 = self.d2 = self.dabs = 0.0
+
+    def push(self, x, window):
+        if self.shift is None:
+            self.shift = x
+
+        if len(self.values) == window:
+            old = self.values[0]
+            self._remove(old)
+            self.s1 -= old - self.shift
+            self.s2 -= (old - self.shift) ** 2
+            if len(self.diffs) == self.diffs.maxlen:
+                d = self.diffs[0]
+                self.d1 -= d
+                self.d2 -= d * d
+                self.dabs -= abs(d)
+
+        if self.values:
+            d = x - self.values[-1]
+            self.diffs.append(d)
+            self.d1 += d
+            self.d2 += d * d
+            self.dabs += abs(d)
+            while self.max_abs_diff and self.max_abs_diff[-1][1] <= abs(d):
+                self.max_abs_diff.pop()
+            self.max_abs_diff.append((self.seq, abs(d)))
+        while self.max_abs_diff and self.max_abs_diff[0][0] <= self.seq - len(self.diffs):
+            self.max_abs_diff.popleft()
+        self.seq += 1
+
+        self.values.append(x)
+        self._add(x)
+        self.s1 += x - self.shift
+        self.s2 += (x - self.shift) ** 2
+
+    def _flat_add(self, x):
+        bisect.insort(self.sorted, x)
+
+    def _flat_remove(self, x):
+        del self.sorted[bisect.bisect_left(self.sorted, x)]
+
+    def rebuild(self):
+        self.shift = self.values[0]
+        centred = [v - self.shift for v in self.values]
+        self.s1 = math.fsum(centred)
+        self.s2 = math.fsum(c * c for c in centred)
+        self.d1 = math.fsum(self.diffs)
+        self.d2 = math.fsum(d * d for d in self.diffs)
+        self.dabs = math.fsum(abs(d) for d in self.diffs)
+
+    def mean(self):
+        return self.shift + self.s1 / len(self.values)
+
+    def std(self):
+        n = len(self.values)
+        return math.sqrt(max(self.s2 / n - (self.s1 / n) ** 2, 0.0))
+
+    def features(self):
+        s = self.sorted
+        feats = [self.mean(), self.std(), s[0], s[-1], sorted_percentile(s, 50),
+                 sorted_percentile(s, 25), sorted_percentile(s, 75), s[-1] - s[0]]
+        m = len(self.diffs)
+        if len(self.values) > 1 and m:
+            feats.extend([self.dabs / m,
+                          math.sqrt(max(self.d2 / m - (self.d1 / m) ** 2, 0.0)),
+                          self.max_abs_diff[0][1]])
+        else:
+            feats.extend([0, 0, 0])
+        return feats
+
+
+class StreamingGSRFeatures:
+    """Sliding-window extract_gsr_features for one device."""
+
+    def __init__(self, n_channels=2, window=256):
+        self.n_channels = n_channels
+        self.window = window
+        self.channels = [_Channel(window) for _ in range(n_channels)]
+        self.pairs = [(i, j) for i in range(n_channels) for j in range(i + 1, n_channels)]
+        self.cross = {pair: 0.0 for pair in self.pairs}  # shifted sum of x_i * x_j
+        self.since_rebuild = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.channels[0].values)
+
+    def push(self, values):
+        """Add one reading: a scalar (copied to every channel) or one value per channel."""
+        if np.ndim(values) == 0:
+            values = [float(values)] * self.n_channels
+        values = [float(v) for v in values]
+        if len(values) != self.n_channels:
+            raise ValueError(f"Expected {self.n_channels} channel values, got {len(values)}")
+        if not all(math.isfinite(v) for v in values):
+            raise ValueError("Channel values must be finite numbers")
+
+        full = len(self) == self.window
+        for i, j in self.pairs:
+            ci, cj = self.channels[i], self.channels[j]
+            if full:
+                self.cross[(i, j)] -= (ci.values[0] - ci.shift) * (cj.values[0] - cj.shift)
+        for channel, x in zip(self.channels, values):
+            channel.push(x, self.window)
+        for i, j in self.pairs:
+            ci, cj = self.channels[i], self.channels[j]
+            self.cross[(i, j)] += (values[i] - ci.shift) * (values[j] - cj.shift)
+
+        self.since_rebuild += 1
+        if self.since_rebuild >= self.window:
+            self._rebuild()
+
+    def _rebuild(self):
+        for channel in self.channels:
+            channel.rebuild()
+        for i, j in self.pairs:
+            ci, cj = self.channels[i], self.channels[j]
+            self.cross[(i, j)] = math.fsum((a - ci.shift) * (b - cj.shift) for a, b in zip(ci.values, cj.values))
+        self.since_rebuild = 0
+
+    def features(self):
+        """Feature vector for the current window (same layout as extract_gsr_features)."""
+        n = len(self)
+        if n == 0:
+            return None
+        features = []
+        for channel in self.channels:
+            features.extend(channel.features())
+        if self.n_channels > 1:
+            for i, j in self.pairs:
+                ci, cj = self.channels[i], self.channels[j]
+                cov = self.cross[(i, j)] / n - (ci.s1 / n) * (cj.s1 / n)
+                denom = ci.std() * cj.std()
+                features.append(cov / denom if n > 1 and denom > 0 else float("nan"))
+            means = [c.mean() for c in self.channels]
+            features.extend(means[i] - means[j] for i, j in self.pairs)
+        return np.array(features, dtype=float)
+
+
+class DeviceFeatureEngine:
+    """One StreamingGSRFeatures per device id, for at most max_devices devices (idle ones dropped after idle_s)."""
+
+    def __init__(self, n_channels=2, window=256, min_readings=30, max_devices=1000, idle_s=600):
+        self.n_channels = n_channels
+        self.window = window
+        self.min_readings = min(min_readings, window)
+        self.devices = DeviceMap(lambda: StreamingGSRFeatures(self.n_channels, self.window), max_devices, idle_s)
+
+    def get(self, device_id):
+        return self.devices.get(device_id)
+
+    def update(self, device_id, values):
+        """Push one reading; returns the window feature vector, or None until min_readings are buffered."""
+        stream = self.get(device_id)
+        with stream.lock:
+            stream.push(values)
+            if len(stream) < self.min_readings:
+                return None
+            return stream.features()
+
+
+# ---------------- Self-check against extract_gsr_features ----------------
+if __name__ == "__main__":
+    import time
+    import pandas as pd
+    sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "datasets", "gsr"))
+    from trainRF import extract_gsr_features
+
+    df = pd.read_csv("../datasets/gsr/High_MWL/p10h.csv", header=None)
+    data = df.apply(pd.to_numeric, errors='coerce').dropna().values
+    window = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+    stream = StreamingGSRFeatures(n_channels=data.shape[1], window=window)
+
+    worst = 0.0
+    checked = 0
+    start = time.perf_counter()
+    for t, row in enumerate(data[:20000]):
+        stream.push(row)
+        if t >= 1 and t % 997 == 0:
+            ref = np.array(extract_gsr_features(pd.DataFrame(data[max(0, t + 1 - window):t + 1])), dtype=float)
+            got = stream.features()
+            worst = max(worst, float(np.nanmax(np.abs(ref - got) / np.maximum(np.abs(ref), 1.0))))
+            checked += 1
+    elapsed = time.perf_counter() - start
+
+    print(f"Window {window}: {checked} checkpoints, worst relative error {worst:.2e}")
+    print(f"{20000 / elapsed:,.0f} readings/s including checkpoints")
@@ -1,3 +1,5 @@
+# Single simulated ESP32 posting random GSR values; for fleet-scale load
+# (thousands of devices replaying recorded traces) use loadgen.py.
 from flask import Flask, jsonify
 import requests
 import random
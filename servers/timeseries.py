@@ -0,0 +1,371 @@
+"""
+Append-only, time-partitioned store for every ingested reading and its
+model outputs, so history survives restarts and can be exported for
+retraining.
+
+Layout (UTC hour partitions, one file pair per writer process so gunicorn
+workers never interleave writes):
+
+    <root>/2026-10-18/14-<pid>.jsonl   records, one JSON object per line
+    <root>/2026-10-18/14-<pid>.idx     time index, one line per device per commit:
+                                       {"device_id", "t0", "t1", "offset", "length", "n"}
+
+append() only puts the record on a queue; a background thread group-commits
+whatever arrived within TIMESERIES_FLUSH_S: per partition, the batch is
+sorted by device and time, written with one write() and one fsync(), and
+only then indexed, so an index line never points past durable data. A
+crash mid-write can still leave a line without its newline; the first
+commit of a process to a file pair cuts it off (it was never committed),
+and readers skip any line that does not decode. A per-device range query
+reads the index of the partitions that overlap the range and seeks straight
+to that device's blocks; with a limit it walks them newest first and stops
+once it has enough. export() writes the selected records as columns to a
+compressed .npz.
+
+Run from the servers/ folder:
+    python timeseries.py export out.npz [--device esp32-1] [--start ...] [--end ...]
+"""
+import heapq
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+import numpy as np
+from state_store import MODEL_FIELDS, parse_since
+from server_log import get_logger
+
+TIMESERIES_DIR = os.environ.get("TIMESERIES_DIR", os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "data", "timeseries"))  # "" disables persistence
+TIMESERIES_FLUSH_S = float(os.environ.get("TIMESERIES_FLUSH_S", 1.0))
+TIMESERIES_FSYNC = os.environ.get("TIMESERIES_FSYNC", "1") == "1"
+
+log = get_logger("timeseries")
+
+
+def flatten_reading(device_id, reading, t):
+    """One storable record from a reading dict (gsr_value, heart_rate and model results)."""
+    record = {"t": t, "device_id": device_id}
+    for key in ("gsr_value", "gsr_values", "heart_rate"):
+        if reading.get(key) is not None:
+            record[key] = reading[key]
+    for name in MODEL_FIELDS:
+        result = reading.get(name)
+        if result and result.get("prediction") is not None:
+            record[name] = result["prediction"]
+            record[f"{name}_confidence"] = result["confidence"]
+            record.setdefault("timestamp", result.get("timestamp"))
+    return record
+
+
+def to_columns(records):
+    """Records -> {column: list}; keys missing from a record become None."""
+    keys = []
+    for record in records:
+        keys.extend(k for k in record if k not in keys)
+    return {key: [record.get(key) for record in records] for key in keys}
+
+
+def _partition(t):
+    dt = datetime.fromtimestamp(t, timezone.utc)
+    return dt.strftime("%Y-%m-%d"), dt.hour
+
+
+class TimeSeriesStore:
+    def __init__(self, root=TIMESERIES_DIR, flush_interval=TIMESERIES_FLUSH_S, fsync=TIMESERIES_FSYNC,
+                 max_queue=100000, batch_size=10000):
+        self.root = os.path.abspath(root)
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._idle = threading.Event()
+        self._worker = None
+        self._worker_pid = None
+        self._repaired = set()  # file pairs this process has checked for a torn last line
+
+        # ---------- Metrics ----------
+        self.appended = 0
+        self.written = 0
+        self.dropped = 0
+        self.commits = 0
+        self.fsyncs = 0
+        self.last_commit_ms = 0.0
+
+    # ---------------- Writing ----------------
+    def append(self, record):
+        """Queue one record (needs "t" and "device_id"); never blocks. False if the queue is full."""
+        self._ensure_worker()
+        self._idle.clear()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.appended += 1
+        return True
+
+    def flush(self, timeout=10.0):
+        """Wait until everything queued so far is committed."""
+        if self._worker is not None and self._worker_pid == os.getpid():
+            deadline = time.monotonic() + timeout
+            while not (self._queue.empty() and self._idle.is_set()) and time.monotonic() < deadline:
+                time.sleep(0.01)
+
+    def close(self, timeout=10.0):
+        self.flush(timeout)
+        self._stop.set()
+        if self._worker is not None and self._worker_pid == os.getpid():
+            self._worker.join(timeout)
+
+    def _ensure_worker(self):
+        # Threads do not survive fork(); each process gets its own writer and files.
+        pid = os.getpid()
+        if self._worker is not None and self._worker_pid == pid and self._worker.is_alive():
+            return
+        with self._lock:
+            if self._worker is None or self._worker_pid != pid or not self._worker.is_alive():
+                if self._worker_pid != pid:
+                    self._queue = queue.Queue(maxsize=self.max_queue)
+                self._stop.clear()
+                self._worker_pid = pid
+                self._worker = threading.Thread(target=self._run, name="timeseries-writer", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self._idle.set()
+                continue
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            try:
+                self._commit(batch)
+            except Exception:
+                log.exception("Time-series commit failed", extra={"data": {"records": len(batch)}})
+            if self._queue.empty():
+                self._idle.set()
+
+    def _commit(self, batch):
+        start = time.perf_counter()
+        partitions = {}
+        for record in batch:
+            partitions.setdefault(_partition(record["t"]), []).append(record)
+
+        for (day, hour), records in partitions.items():
+            records.sort(key=lambda r: (str(r["device_id"]), r["t"]))
+            folder = os.path.join(self.root, day)
+            os.makedirs(folder, exist_ok=True)
+            base = os.path.join(folder, f"{hour:02d}-{os.getpid()}")
+            if base not in self._repaired:
+                # A previous process with the same pid may have crashed mid-write
+                _truncate_torn_line(base + ".jsonl")
+                _truncate_torn_line(base + ".idx")
+                self._repaired.add(base)
+
+            chunks, index = [], []
+            with open(base + ".jsonl", "ab") as data:
+                position = data.tell()
+                for device_id, group in _by_device(records):
+                    block = b"".join(json.dumps(r, separators=(",", ":")).encode() + b"\n" for r in group)
+                    chunks.append(block)
+                    index.append({"device_id": device_id, "t0": group[0]["t"], "t1": group[-1]["t"],
+                                  "offset": position, "length": len(block), "n": len(group)})
+                    position += len(block)
+                data.write(b"".join(chunks))
+                data.flush()
+                if self.fsync:
+                    os.fsync(data.fileno())
+                    self.fsyncs += 1
+
+            # Index only what is durable
+            with open(base + ".idx", "ab") as idx:
+                idx.write(b"".join(json.dumps(e, separators=(",", ":")).encode() + b"\n" for e in index))
+                idx.flush()
+                if self.fsync:
+                    os.fsync(idx.fileno())
+                    self.fsyncs += 1
+
+        self.commits += 1
+        self.written += len(batch)
+        self.last_commit_ms = (time.perf_counter() - start) * 1000
+
+    # ---------------- Reading ----------------
+    def _partition_hours(self, start=None, end=None):
+        """[(index path, data path), ...] per hour partition overlapping [start, end], oldest first."""
+        hours = []
+        if not os.path.isdir(self.root):
+            return hours
+        first = _partition(start) if start is not None else None
+        last = _partition(end) if end is not None else None
+        for day in sorted(os.listdir(self.root)):
+            if (first and day < first[0]) or (last and day > last[0]):
+                continue
+            folder = os.path.join(self.root, day)
+            files = {}
+            for name in sorted(os.listdir(folder)):
+                if not name.endswith(".idx"):
+                    continue
+                hour = int(name.split("-")[0])
+                if (first and (day, hour) < first) or (last and (day, hour) > last):
+                    continue
+                path = os.path.join(folder, name)
+                files.setdefault(hour, []).append((path, path[:-4] + ".jsonl"))
+            hours.extend(files[hour] for hour in sorted(files))
+        return hours
+
+    def _entries(self, files, device_id=None, start=None, end=None):
+        """(data path, index entry) of the blocks in one hour's files that may hold matching records."""
+        entries = []
+        for idx_path, data_path in files:
+            with open(idx_path, "rb") as idx:
+                for entry in _decode_lines(idx):
+                    if ((device_id is None or entry["device_id"] == device_id)
+                            and (start is None or entry["t1"] >= start) and (end is None or entry["t0"] <= end)):
+                        entries.append((data_path, entry))
+        return entries
+
+    def query(self, device_id=None, start=None, end=None, limit=None):
+        """Records of device_id (default: all devices) with start <= t <= end, ordered by time; the last `limit`."""
+        hours = self._partition_hours(start, end)
+        if not limit:
+            records = []
+            for files in hours:
+                for data_path, entry in self._entries(files, device_id, start, end):
+                    records.extend(_read_block(data_path, entry, start, end))
+            records.sort(key=lambda r: r["t"])
+            return records
+
+        # Newest blocks first: hours are disjoint in time, so sorting each hour's blocks by t1 orders them
+        # all. Once `limit` records are held, a block that ends before the oldest of them cannot contribute.
+        newest, seq = [], 0  # min-heap of (t, seq, record), at most `limit` long
+        for files in reversed(hours):
+            entries = sorted(self._entries(files, device_id, start, end), key=lambda e: e[1]["t1"], reverse=True)
+            for data_path, entry in entries:
+                if len(newest) >= limit and entry["t1"] < newest[0][0]:
+                    return [record for _, _, record in sorted(newest)]
+                for record in _read_block(data_path, entry, start, end):
+                    seq += 1
+                    if len(newest) < limit:
+                        heapq.heappush(newest, (record["t"], seq, record))
+                    elif record["t"] >= newest[0][0]:
+                        heapq.heapreplace(newest, (record["t"], seq, record))
+        return [record for _, _, record in sorted(newest)]
+
+    def export(self, path, device_id=None, start=None, end=None):
+        """Write the selected records to a compressed .npz, one array per column; returns the row count."""
+        columns = to_columns(self.query(device_id, start, end))
+        arrays = {}
+        for key, values in columns.items():
+            if key == "gsr_values":
+                arrays[key] = np.array([json.dumps(v) if v is not None else "" for v in values])
+            elif all(v is None or isinstance(v, (int, float)) for v in values):
+                arrays[key] = np.array([np.nan if v is None else v for v in values], dtype=np.float64)
+            else:
+                arrays[key] = np.array(["" if v is None else str(v) for v in values])
+        np.savez_compressed(path, **arrays)
+        return len(columns.get("t", []))
+
+    def stats(self):
+        return {
+            "root": self.root,
+            "queue_depth": self._queue.qsize(),
+            "appended": self.appended,
+            "written": self.written,
+            "dropped": self.dropped,
+            "commits": self.commits,
+            "fsyncs": self.fsyncs,
+            "avg_records_per_commit": round(self.written / self.commits, 1) if self.commits else 0,
+            "last_commit_ms": round(self.last_commit_ms, 2)
+        }
+
+
+def _decode_lines(f):
+    """JSON objects of a file's complete lines; a line torn by a crash mid-write is skipped."""
+    for line in f:
+        if not line.endswith(b"\n"):
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            log.warning("Skipping undecodable line", extra={"data": {"path": f.name}})
+
+
+def _read_block(data_path, entry, start=None, end=None):
+    """Records of one index entry's block with start <= t <= end."""
+    with open(data_path, "rb") as data:
+        data.seek(entry["offset"])
+        block = data.read(entry["length"])
+    records = []
+    for line in block.splitlines():
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if (start is None or record["t"] >= start) and (end is None or record["t"] <= end):
+            records.append(record)
+    return records
+
+
+def _truncate_torn_line(path):
+    """Cut a trailing line that has no newline (a crash mid-write; it was never committed)."""
+    try:
+        f = open(path, "r+b")
+    except FileNotFoundError:
+        return
+    with f:
+        position = f.seek(0, os.SEEK_END)
+        if position == 0:
+            return
+        f.seek(position - 1)
+        if f.read(1) == b"\n":
+            return
+        while position > 0:
+            step = min(65536, position)
+            position -= step
+            f.seek(position)
+            newline = f.read(step).rfind(b"\n")
+            if newline >= 0:
+                position += newline + 1
+                break
+        f.truncate(position)
+        log.warning("Truncated a torn last line", extra={"data": {"path": path, "size": position}})
+
+
+def _by_device(records):
+    group = [records[0]]
+    for record in records[1:]:
+        if record["device_id"] != group[0]["device_id"]:
+            yield group[0]["device_id"], group
+            group = []
+        group.append(record)
+    yield group[0]["device_id"], group
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Export stored readings as columns (.npz)")
+    parser.add_argument("command", choices=["export"])
+    parser.add_argument("path")
+    parser.add_argument("--device")
+    parser.add_argument("--start", help='epoch seconds or "YYYY-MM-DD HH:MM:SS"')
+    parser.add_argument("--end", help='epoch seconds or "YYYY-MM-DD HH:MM:SS"')
+    args = parser.parse_args()
+
+    store = TimeSeriesStore()
+    count = store.export(args.path, args.device, parse_since(args.start), parse_since(args.end))
+    print(f"✅ Exported {count} records from {store.root} to {args.path}")
@@ -0,0 +1,14 @@
+"""
+Production entry point (run from the servers folder):
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Importing main loads the model registry and freezes it. gunicorn.conf.py
+sets preload_app, so that happens once in the master and the forked workers
+share the models copy-on-write. Workers, threads and timeouts are set with
+WEB_* environment variables (see gunicorn.conf.py). GET /ready passes once
+the models are loaded and fails while a worker drains.
+"""
+from main import app, shutdown, start_draining
+
+application = app
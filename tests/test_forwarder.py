@@ -0,0 +1,133 @@
+"""
+WebhookForwarder against mock_n8n.py served on an ephemeral port.
+
+    python -m pytest tests
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+import pytest
+from werkzeug.serving import make_server
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "servers"))
+import mock_n8n
+from forwarder import WebhookForwarder
+
+
+@pytest.fixture
+def n8n(monkeypatch):
+    """Base webhook URL of a fresh mock_n8n; set mock_n8n.FAIL_RATE to make it fail."""
+    monkeypatch.setattr(mock_n8n, "FAIL_RATE", 0.0)
+    monkeypatch.setattr(mock_n8n, "DELAY_S", 0.0)
+    monkeypatch.setattr(mock_n8n, "received", {"requests": 0, "payloads": 0, "failed": 0, "last_batch": None})
+    server = make_server("127.0.0.1", 0, mock_n8n.app, threaded=True)
+    server.daemon_threads = False  # server_close() then waits for requests still in flight
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_port}/webhook/test"
+    server.shutdown()
+    server.server_close()  # a stalled request must not count towards the next test
+    thread.join(5)
+
+
+def make_forwarder(url, **kwargs):
+    options = dict(batch_size=10, flush_interval=0.05, timeout=2, max_retries=2,
+                   backoff_base=0.01, backoff_max=0.1)
+    options.update(kwargs)
+    return WebhookForwarder(url, **options)
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return condition()
+
+
+def test_delivers_in_batches(n8n):
+    forwarder = make_forwarder(n8n)
+    try:
+        assert forwarder.send_many([{"i": i} for i in range(25)])
+        assert wait_for(lambda: forwarder.sent == 25)  # mock_n8n counts before the client sees the 200
+        assert mock_n8n.received["payloads"] == 25
+        assert mock_n8n.received["requests"] < 25
+    finally:
+        forwarder.close()
+
+
+def test_retries_until_the_webhook_recovers(n8n):
+    mock_n8n.FAIL_RATE = 1.0
+    forwarder = make_forwarder(n8n, max_retries=50, backoff_max=0.05)
+    try:
+        forwarder.send({"reading": 1})
+        assert wait_for(lambda: forwarder.failed_attempts >= 2)
+        mock_n8n.FAIL_RATE = 0.0
+        assert wait_for(lambda: forwarder.sent == 1)
+        assert mock_n8n.received["payloads"] == 1
+        stats = forwarder.stats()
+        assert stats["sent"] == 1 and stats["spooled"] == 0 and stats["dropped"] == 0
+    finally:
+        forwarder.close()
+
+
+def test_send_never_blocks(n8n):
+    mock_n8n.DELAY_S = 1.0  # every POST stalls the worker
+    forwarder = make_forwarder(n8n, max_queue=5)
+    try:
+        start = time.perf_counter()
+        accepted = [forwarder.send({"i": i}) for i in range(500)]
+        elapsed = time.perf_counter() - start
+        assert elapsed < 0.5
+        assert not all(accepted)
+        assert forwarder.stats()["dropped"] == accepted.count(False)
+    finally:
+        forwarder.close(timeout=0)
+
+
+def test_spools_on_failure_and_replays(n8n, tmp_path):
+    spool = str(tmp_path / "n8n_spool.jsonl")
+    mock_n8n.FAIL_RATE = 1.0
+    forwarder = make_forwarder(n8n, max_retries=1, overflow_path=spool)
+    try:
+        forwarder.send_many([{"i": i} for i in range(5)])
+        assert wait_for(lambda: forwarder.spooled == 5)
+        with open(spool, "a", encoding="utf-8") as f:
+            f.write('{"truncated": \n')  # e.g. a crash mid-write
+
+        mock_n8n.FAIL_RATE = 0.0
+        assert wait_for(lambda: forwarder.replayed == 5)
+        assert mock_n8n.received["payloads"] == 5
+        assert wait_for(lambda: not glob.glob(spool + "*.replay"))
+        stats = forwarder.stats()
+        assert stats["replayed"] == 5 and stats["corrupt"] == 1
+        assert not os.path.exists(spool)
+        assert forwarder._worker.is_alive()
+    finally:
+        forwarder.close()
+
+
+def test_shared_spool_is_replayed_once(n8n, tmp_path):
+    spool = str(tmp_path / "n8n_spool.jsonl")
+    with open(spool, "w", encoding="utf-8") as f:
+        f.writelines(json.dumps({"i": i}) + "\n" for i in range(40))
+    # A replay file left by a worker that has since exited
+    with open(f"{spool}.999999999-0.replay", "w", encoding="utf-8") as f:
+        f.writelines(json.dumps({"stale": i}) + "\n" for i in range(3))
+
+    forwarders = [make_forwarder(n8n, overflow_path=spool) for _ in range(3)]
+    try:
+        for forwarder in forwarders:
+            forwarder.send({"live": True})
+        assert wait_for(lambda: sum(f.sent for f in forwarders) == 46)
+        time.sleep(0.3)
+        assert mock_n8n.received["payloads"] == 46
+        assert sum(f.replayed for f in forwarders) == 43
+        assert not glob.glob(spool + "*.replay")
+    finally:
+        for forwarder in forwarders:
+            forwarder.close()
@@ -0,0 +1,69 @@
+"""
+LocalStateStore: latest results, the history ring and device eviction.
+
+    python -m pytest tests
+"""
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "servers"))
+from state_store import LocalStateStore
+
+
+def reading(i):
+    return {"gsr_value": float(i), "mwl": {"prediction": "High MWL" if i % 2 else "Low MWL", "confidence": 50.0 + i}}
+
+
+@pytest.fixture
+def store():
+    """History of 8 rows per device; 20 updates wrap the ring twice."""
+    store = LocalStateStore(history=8)
+    for i in range(1, 21):
+        store.update("esp32-1", reading(i), t=1000.0 + i)
+    return store
+
+
+def test_history_keeps_the_newest_rows_of_a_wrapped_ring(store):
+    history = store.history("esp32-1")
+    assert history["count"] == 8
+    assert history["columns"]["t"] == [1000.0 + i for i in range(13, 21)]
+    assert history["columns"]["gsr_value"] == [float(i) for i in range(13, 21)]
+    assert history["columns"]["mwl"] == ["High MWL" if i % 2 else "Low MWL" for i in range(13, 21)]
+    assert history["columns"]["mwl_confidence"] == [50.0 + i for i in range(13, 21)]
+    assert history["columns"]["heart_rate"] == [None] * 8
+
+
+@pytest.mark.parametrize("since, limit, expected", [
+    (1014.5, None, range(15, 21)),  # strictly newer than since
+    (1015.0, None, range(16, 21)),
+    (None, 3, range(18, 21)),       # the newest `limit`, oldest first
+    (1014.5, 2, range(19, 21)),
+    (1014.5, 100, range(15, 21)),
+    (900.0, None, range(13, 21)),   # older than anything kept
+    (1020.0, None, range(0)),
+    (None, 0, range(0)),
+])
+def test_history_since_and_limit(store, since, limit, expected):
+    history = store.history("esp32-1", since=since, limit=limit)
+    assert history["columns"]["t"] == [1000.0 + i for i in expected]
+    assert history["count"] == len(expected)
+
+
+def test_unknown_device_and_latest(store):
+    assert store.history("esp32-2") is None
+    assert store.latest("esp32-2") is None
+    latest = store.latest()
+    assert latest["device_id"] == "esp32-1" and latest["gsr_value"] == 20.0
+
+
+def test_least_recently_updated_device_is_evicted():
+    store = LocalStateStore(history=4, max_devices=2)
+    store.update("a", reading(1), t=1.0)
+    store.update("b", reading(2), t=2.0)
+    store.update("a", reading(3), t=3.0)
+    store.update("c", reading(4), t=4.0)  # "b" is the least recently updated
+    assert sorted(store.devices()) == ["a", "c"]
+    assert store.history("b") is None
+    assert store.history("a")["columns"]["t"] == [1.0, 3.0]
+    assert store.stats()["evicted_devices"] == 1
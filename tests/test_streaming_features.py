@@ -0,0 +1,88 @@
+"""
+Streaming GSR features against the batch implementation they replace.
+
+    python -m pytest tests
+"""
+import os
+import random
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "servers"))
+sys.path.insert(0, os.path.join(ROOT, "datasets", "gsr"))
+sys.path.insert(0, os.path.join(ROOT, "datasets"))
+from mwl_loader import parse_csv
+from trainRF import extract_gsr_features
+from streaming_features import FLAT_SORTED_MAX, DeviceFeatureEngine, SortedWindow, StreamingGSRFeatures
+
+RECORDING = os.path.join(ROOT, "datasets", "gsr", "High_MWL", "p10h.csv")
+
+
+class SmallBlocks(SortedWindow):
+    LOAD = 4  # splits and merges after a handful of values
+
+
+@pytest.mark.parametrize("window_class", [SortedWindow, SmallBlocks])
+def test_sorted_window_matches_sorted(window_class):
+    rng = random.Random(0)
+    window, reference = window_class(), []
+    for step in range(6000):
+        if reference and (rng.random() < 0.45 or len(reference) > 1500):
+            x = rng.choice(reference)
+            reference.remove(x)
+            window.remove(x)
+        else:
+            x = float(rng.randint(0, 200)) if rng.random() < 0.5 else rng.uniform(-1e3, 1e3)  # with duplicates
+            reference.append(x)
+            window.add(x)
+        if step % 97 == 0:
+            reference.sort()
+            assert len(window) == len(reference)
+            assert [window[k] for k in range(len(reference))] == reference
+            if reference:
+                assert window[-1] == reference[-1] and window[-len(reference)] == reference[0]
+
+    reference.sort()
+    for x in list(reference):
+        window.remove(x)
+    assert len(window) == 0
+    with pytest.raises(IndexError):
+        window[0]
+
+
+@pytest.fixture(scope="module")
+def recording():
+    return parse_csv(RECORDING)
+
+
+@pytest.mark.parametrize("window", [256, FLAT_SORTED_MAX + 3616])
+def test_streaming_matches_extract_gsr_features(recording, window):
+    data = recording[:window + 5000]
+    stream = StreamingGSRFeatures(n_channels=data.shape[1], window=window)
+    checked = 0
+    for t, row in enumerate(data):
+        stream.push(row)
+        if t >= 1 and (t % 1499 == 0 or t == len(data) - 1):
+            expected = np.array(extract_gsr_features(pd.DataFrame(data[max(0, t + 1 - window):t + 1])), dtype=float)
+            np.testing.assert_allclose(stream.features(), expected, rtol=1e-9, atol=1e-9)
+            checked += 1
+    assert checked >= 4
+
+
+def test_device_engine_waits_for_min_readings_and_bounds_devices():
+    engine = DeviceFeatureEngine(n_channels=2, window=64, min_readings=10, max_devices=2)
+    for i in range(9):
+        assert engine.update("a", [1.0 + i, 2.0]) is None
+    features = engine.update("a", [10.0, 2.0])
+    assert features is not None and len(features) == 24
+
+    engine.update("b", [1.0, 1.0])
+    engine.update("c", [1.0, 1.0])  # evicts "a", the least recently used
+    assert engine.devices.peek("a") is None
+    assert engine.update("a", [1.0, 1.0]) is None  # starts over
+
+    with pytest.raises(ValueError):
+        engine.update("b", [float("nan"), 1.0])
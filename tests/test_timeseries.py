@@ -0,0 +1,132 @@
+"""
+TimeSeriesStore on a temporary folder: partitioned writes, range queries,
+torn-line recovery and export.
+
+    python -m pytest tests
+"""
+import glob
+import os
+import sys
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "servers"))
+from timeseries import TimeSeriesStore, flatten_reading
+
+HOUR = 1760000400.0  # 2025-10-09 09:00:00 UTC, the start of an hour partition
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path / "timeseries"), flush_interval=0.02, fsync=False)
+    yield store
+    store.close()
+
+
+def fill(store):
+    """Two devices, 30 readings each, half in HOUR's partition and half in the next one."""
+    records = []
+    for i in range(30):
+        t = HOUR + 1800 + i * 120  # i = 15 is the first reading of the next hour
+        for device_id in ("esp32-1", "esp32-2"):
+            record = {"t": t, "device_id": device_id, "gsr_value": float(i)}
+            records.append(record)
+            assert store.append(record)
+    store.flush()
+    return records
+
+
+def test_writes_one_file_pair_per_hour(store):
+    fill(store)
+    assert len(glob.glob(os.path.join(store.root, "*", "*.idx"))) == 2
+    assert len(glob.glob(os.path.join(store.root, "*", "*.jsonl"))) == 2
+    assert store.stats()["written"] == 60
+
+
+def test_query_by_device_and_range(store):
+    records = fill(store)
+    everything = store.query()
+    assert everything == sorted(records, key=lambda r: r["t"])
+
+    one = store.query("esp32-1")
+    assert len(one) == 30 and all(r["device_id"] == "esp32-1" for r in one)
+
+    # Only the first hour's partition overlaps this range
+    early = store.query("esp32-2", start=HOUR, end=HOUR + 3599)
+    assert [r["gsr_value"] for r in early] == [float(i) for i in range(15)]
+
+    # Spans both partitions, bounds inclusive
+    middle = store.query("esp32-2", start=HOUR + 1800 + 10 * 120, end=HOUR + 1800 + 20 * 120)
+    assert [r["gsr_value"] for r in middle] == [float(i) for i in range(10, 21)]
+
+    assert store.query("esp32-3") == []
+    assert store.query(start=HOUR + 86400) == []
+
+
+@pytest.mark.parametrize("limit", [1, 5, 15, 16, 31, 100])
+def test_limit_returns_the_newest_records(store, limit):
+    fill(store)
+    for device_id in (None, "esp32-1"):
+        for start, end in ((None, None), (HOUR + 2000, HOUR + 5000)):
+            expected = store.query(device_id, start, end)[-limit:]
+            assert store.query(device_id, start, end, limit=limit) == expected
+
+
+def test_torn_line_is_cut_on_the_next_commit(tmp_path):
+    root = str(tmp_path / "timeseries")
+    first = TimeSeriesStore(root, flush_interval=0.02, fsync=False)
+    first.append({"t": HOUR + 10, "device_id": "esp32-1", "gsr_value": 1.0})
+    first.close()
+    [idx_path] = glob.glob(os.path.join(root, "*", "*.idx"))
+    data_path = idx_path[:-4] + ".jsonl"
+    committed = os.path.getsize(idx_path)
+
+    # A crash mid-write: neither line got its newline
+    with open(idx_path, "ab") as f:
+        f.write(b'{"device_id":"esp32-1","t0":')
+    with open(data_path, "ab") as f:
+        f.write(b'{"t":')
+    assert [r["gsr_value"] for r in TimeSeriesStore(root).query()] == [1.0]
+
+    # Same pid, same file pair: the next process's first commit truncates, then appends
+    second = TimeSeriesStore(root, flush_interval=0.02, fsync=False)
+    second.append({"t": HOUR + 20, "device_id": "esp32-1", "gsr_value": 2.0})
+    second.close()
+    with open(idx_path, "rb") as f:
+        lines = f.read().split(b"\n")
+    assert lines[-1] == b"" and len(lines) == 3
+    assert os.path.getsize(idx_path) > committed
+    assert [r["gsr_value"] for r in second.query("esp32-1")] == [1.0, 2.0]
+
+
+def test_undecodable_index_lines_are_skipped(store):
+    fill(store)
+    for idx_path in glob.glob(os.path.join(store.root, "*", "*.idx")):
+        with open(idx_path, "ab") as f:
+            f.write(b'{"device_id": garbage\n')
+    assert len(store.query()) == 60
+    assert len(store.query(limit=3)) == 3
+
+
+def test_export_round_trips_columns(store, tmp_path):
+    reading = {
+        "gsr_value": 1.25,
+        "mwl": {"prediction": "High MWL", "confidence": 71.5, "timestamp": "2025-10-09 09:30:00"},
+    }
+    store.append(flatten_reading("esp32-1", reading, HOUR + 1))
+    store.append(flatten_reading("esp32-1", {"gsr_values": [[1.0, 2.0]]}, HOUR + 2))
+    store.append(flatten_reading("esp32-2", {"heart_rate": 72.0}, HOUR + 3))
+    store.flush()
+
+    path = str(tmp_path / "export.npz")
+    assert store.export(path) == 3
+    with np.load(path) as data:
+        assert list(data["t"]) == [HOUR + 1, HOUR + 2, HOUR + 3]
+        assert list(data["device_id"]) == ["esp32-1", "esp32-1", "esp32-2"]
+        assert data["gsr_value"][0] == 1.25 and np.isnan(data["gsr_value"][1:]).all()
+        assert list(data["gsr_values"]) == ["", "[[1.0, 2.0]]", ""]
+        assert list(data["mwl"]) == ["High MWL", "", ""]
+        assert data["mwl_confidence"][0] == 71.5
+        assert np.isnan(data["heart_rate"][:2]).all() and data["heart_rate"][2] == 72.0
+
+    assert store.export(str(tmp_path / "one.npz"), device_id="esp32-2") == 1